@@ -0,0 +1,71 @@
+"""
+Benchmark harness shared by the per-subsystem `bench_*` modules, which register their suite
+cases here. `python benchmark.py` runs them.
+"""
+import time
+import timeit
+import platform
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+
+CASES: Dict[str, Callable] = {}
+
+
+def case(name: str):
+    """Register a suite case: a generator that sets up, yields the callable to time, then cleans up."""
+    def register(func):
+        CASES[name] = contextmanager(func)
+        return func
+    return register
+
+
+def drive(coro):
+    """Run a coroutine that never suspends without an event loop, so loop overhead stays out of the numbers."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError("benchmarked coroutine suspended")
+
+
+def time_case(name: str, repeat: int = 5, min_time: float = 0.2) -> Dict:
+    """Best of `repeat` runs, each long enough to take at least `min_time` seconds."""
+    with CASES[name]() as func:
+        timer = timeit.Timer(func)
+        number = 1
+        while timer.timeit(number) < min_time:
+            number *= 10 if number < 1000 else 2
+        runs = timer.repeat(repeat, number)
+    return {'ns_per_op': min(runs) / number * 1e9, 'number': number, 'repeat': repeat}
+
+
+def run_suite(names: List[str] = None, repeat: int = 5, min_time: float = 0.2) -> Dict:
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'node': platform.node(),
+        'timestamp': time.time(),
+        'results': {name: time_case(name, repeat, min_time) for name in (names or CASES)},
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = 0.2) -> Dict[str, Dict]:
+    """Per-case change against the baseline; `regressed` when slower by more than `tolerance`."""
+    report = {}
+    for name, result in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            report[name] = {'ns_per_op': result['ns_per_op'], 'baseline': None, 'change': None, 'regressed': False}
+            continue
+        change = result['ns_per_op'] / base['ns_per_op'] - 1
+        report[name] = {'ns_per_op': result['ns_per_op'], 'baseline': base['ns_per_op'], 'change': change, 'regressed': change > tolerance}
+    return report
+
+
+def format_comparison(name: str, row: Dict) -> str:
+    if row['baseline'] is None:
+        return f"{name:<40} {row['ns_per_op']:>12,.0f} ns   (no baseline)"
+    flag = '  REGRESSION' if row['regressed'] else ''
+    return f"{name:<40} {row['ns_per_op']:>12,.0f} ns   baseline {row['baseline']:>12,.0f} ns   {row['change']:+7.1%}{flag}"
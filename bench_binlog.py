@@ -0,0 +1,31 @@
+"""
+Trade log report: spdlog f-strings against `BinaryLogger`.
+"""
+import time
+import tempfile
+from pathlib import Path
+
+
+from binlog import BinaryLogger
+from entity import log_register
+from bot import TRADE_LAYOUTS, TRADE_TICK
+
+
+def trade_log_performance_test(n=200000):
+    values = ('BTC/USDT', 0.00071, 0.00065, 60000.1, 60000.2, 60040.5, 60040.6)
+    text_log = log_register.get_logger('benchmark', level='INFO')
+    start_time = time.perf_counter()
+    for _ in range(n):
+        symbol, ratio, open_ratio, spot_bid, spot_ask, linear_bid, linear_ask = values
+        text_log.info(f"symbol: {symbol}, ratio: {ratio}, open_ratio: {open_ratio}, spot_bid: {spot_bid}, spot_ask: {spot_ask}, linear_bid: {linear_bid}, linear_ask: {linear_ask}")
+    elapsed = time.perf_counter() - start_time
+    print(f"spdlog f-string: {elapsed / n * 1e6:.3f} us per record")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary_log = BinaryLogger(Path(tmp) / 'trade.bin', TRADE_LAYOUTS, capacity=n + 16)
+        start_time = time.perf_counter()
+        for _ in range(n):
+            binary_log.info(TRADE_TICK, *values)
+        elapsed = time.perf_counter() - start_time
+        binary_log.close()
+    print(f"BinaryLogger: {elapsed / n * 1e6:.3f} us per record, dropped: {binary_log.dropped}")
@@ -0,0 +1,72 @@
+"""
+`Bot.on_ratio_changed` report on a recorded feed, with and without emission gating.
+"""
+import time
+import random
+import asyncio
+import tempfile
+from pathlib import Path
+
+
+from bot import Bot
+from entity import EventSystem, MarketDataStore, Context
+from scheduler import RUNNING
+
+
+def recorded_feed(n=100000, symbols=('BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'DOGE/USDT'), seed=0):
+    """bookTicker-like ticks: prices walk on a tick grid, most ticks only change the size or the other side."""
+    rng = random.Random(seed)
+    mids = {symbol: 100.0 * (i + 1) for i, symbol in enumerate(symbols)}
+    feed = []
+    for _ in range(n):
+        symbol = rng.choice(symbols)
+        if rng.random() < 0.2:
+            mids[symbol] += rng.choice((-0.01, 0.01))
+        basis = 1 + rng.choice((0.0005, 0.0006, 0.0007))
+        leg = rng.choice((symbol, f'{symbol}:USDT'))
+        mid = mids[symbol] * (basis if ':' in leg else 1)
+        feed.append({'s': leg, 'a': f'{mid + 0.01:.2f}', 'b': f'{mid:.2f}'})
+    return feed
+
+
+def ratio_gating_benchmark(feed=None, min_ratio_change=0.0001, min_emit_interval=0.0):
+    """Strategy CPU spent in Bot.on_ratio_changed on a recorded feed, with and without emission gating."""
+    feed = feed or recorded_feed()
+    tmp = tempfile.TemporaryDirectory()
+    # Bot会重置context里的openpx，不能用部署目录的.context
+    bot = Bot({'exchange_id': 'binance', 'apiKey': ''}, Context(Path(tmp.name)))
+    # 让所有symbol都处于执行中状态，只测on_ratio_changed本身的开销，不真正下单
+    bot.scheduler.states = {data['s'].split(':')[0]: RUNNING for data in feed}
+    handler = bot.on_ratio_changed
+    spent = [0.0]
+
+    async def timed(symbol, open_ratio, close_ratio):
+        start = time.perf_counter()
+        await handler(symbol, open_ratio, close_ratio)
+        spent[0] += time.perf_counter() - start
+    EventSystem._listeners['ratio_changed'].remove(handler)
+    EventSystem.on('ratio_changed', timed)
+
+    async def replay():
+        for data in feed:
+            await MarketDataStore.update(data, recv_ts=1000)
+
+    settings = (MarketDataStore.suppress_warmup, MarketDataStore.min_ratio_change, MarketDataStore.min_emit_interval)
+    results = {}
+    for label, gating in (('ungated', (False, 0.0, 0.0)), ('gated', (True, min_ratio_change, min_emit_interval))):
+        MarketDataStore.suppress_warmup, MarketDataStore.min_ratio_change, MarketDataStore.min_emit_interval = gating
+        for store in (MarketDataStore.quote, MarketDataStore.open_rolling_median, MarketDataStore.close_rolling_median,
+                      MarketDataStore.emitted, MarketDataStore.suppressed, MarketDataStore._last_emit):
+            store.clear()
+        spent[0] = 0.0
+        start_time = time.perf_counter()
+        asyncio.run(replay())
+        elapsed = time.perf_counter() - start_time
+        emitted, suppressed = sum(MarketDataStore.emitted.values()), sum(MarketDataStore.suppressed.values())
+        results[label] = spent[0]
+        print(f"ratio_changed {label}: {len(feed)} ticks in {elapsed:.3f} seconds, emitted: {emitted}, suppressed: {suppressed}, strategy time: {spent[0] * 1e3:.1f} ms")
+    MarketDataStore.suppress_warmup, MarketDataStore.min_ratio_change, MarketDataStore.min_emit_interval = settings
+    EventSystem._listeners['ratio_changed'].remove(timed)
+    tmp.cleanup()
+    saved = 1 - results['gated'] / results['ungated'] if results['ungated'] else 0.0
+    print(f"ratio_changed gating saved {saved:.1%} of strategy CPU")
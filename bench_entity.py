@@ -0,0 +1,176 @@
+"""
+Suite cases and reports for `entity`: rolling median, market data, events, positions and order responses.
+"""
+import time
+import random
+import timeit
+import asyncio
+import tempfile
+import itertools
+import tracemalloc
+import dataclasses
+from contextlib import contextmanager
+
+
+from bench import case, drive
+from entity import OrderedDispatcher, EventSystem, MarketDataStore, RollingMedian, Account, OrderResponse, Position, PositionDict
+
+
+@case('rolling_median.input')
+def _rolling_median_input():
+    rolling = RollingMedian(10)
+    values = itertools.cycle([random.Random(0).uniform(-0.003, 0.003) for _ in range(4096)])
+    yield lambda: rolling.input(next(values))
+
+
+@contextmanager
+def _bench_spread():
+    near, far = 'BENCH/USDT', 'BENCH/USDT:USDT'
+    suppress_warmup, MarketDataStore.suppress_warmup = MarketDataStore.suppress_warmup, False
+    listeners, EventSystem._listeners = EventSystem._listeners, {}
+    try:
+        MarketDataStore.spreads.add(near, near=near, far=far)
+        drive(MarketDataStore.update({'s': far, 'a': '1.0007', 'b': '1.0006'}, recv_ts=1000))
+        yield near, far
+    finally:
+        EventSystem._listeners = listeners
+        MarketDataStore.suppress_warmup = suppress_warmup
+        for store in (MarketDataStore.quote, MarketDataStore.open_ratio, MarketDataStore.close_ratio,
+                      MarketDataStore.open_rolling_median, MarketDataStore.close_rolling_median,
+                      MarketDataStore.emitted, MarketDataStore.suppressed, MarketDataStore._last_emit,
+                      MarketDataStore.history.histories):
+            store.pop(near, None)
+            store.pop(far, None)
+        MarketDataStore.spreads.remove(near)
+
+
+@case('market_data.update')
+def _market_data_update():
+    with _bench_spread() as (near, far):
+        ticks = itertools.cycle([{'s': near, 'a': str(1 + i % 7 * 1e-4), 'b': '1', 'u': 0} for i in range(64)])
+        update = MarketDataStore.update
+        yield lambda: drive(update(next(ticks), recv_ts=1000))
+
+
+@case('market_data.calculate_ratio')
+def _market_data_calculate_ratio():
+    with _bench_spread() as (near, far):
+        drive(MarketDataStore.update({'s': near, 'a': '1.0001', 'b': '1'}, recv_ts=1000))
+        calculate_ratio = MarketDataStore.calculate_ratio
+        yield lambda: drive(calculate_ratio(near))
+
+
+@case('event_system.emit')
+def _event_system_emit():
+    async def async_listener(symbol, open_ratio, close_ratio):
+        pass
+
+    def sync_listener(symbol, open_ratio, close_ratio):
+        pass
+
+    listeners, EventSystem._listeners = EventSystem._listeners, {}
+    try:
+        EventSystem.on('ratio_changed', async_listener)
+        EventSystem.on('ratio_changed', sync_listener)
+        EventSystem.on('ratio_changed', async_listener)
+        yield lambda: drive(EventSystem.emit('ratio_changed', 'BTC/USDT', 0.0007, 0.0006))
+    finally:
+        EventSystem._listeners = listeners
+
+
+@case('position_dict.update')
+def _position_dict_update():
+    with tempfile.TemporaryDirectory() as tmp:
+        positions = PositionDict(tmp)
+        for i in range(20):
+            positions.update(f'P{i}/USDT:USDT', 0.01, 100.0)
+        yield lambda: positions.update('BTC/USDT:USDT', 0.001, 60000.0)
+
+
+@case('account.save')
+def _account_save():
+    with tempfile.TemporaryDirectory() as tmp:
+        account = Account('bench', tmp)
+        amounts = itertools.cycle([1000.0 + i for i in range(64)])
+        yield lambda: setattr(account, 'USDT', next(amounts))
+
+
+ORDER_RESPONSE = OrderResponse('4000000001', 'BTC/USDT:USDT', 'partially_filled', 'sell', 0.01, 0.004, 0.004, 0.006, 'x-bench', 60040.5, 60040.5)
+
+
+@case('order_response.access')
+def _order_response_access():
+    order = ORDER_RESPONSE
+    yield lambda: (order['id'], order.get('average'), len(order))
+
+
+def dispatcher_performance_test(n_events=200000, n_lanes=100):
+    async def handler(key, seq):
+        pass
+
+    async def run():
+        dispatcher = OrderedDispatcher(handler)
+        start_time = time.perf_counter()
+        for seq in range(n_events):
+            dispatcher.submit(seq % n_lanes, seq % n_lanes, seq)
+            # 模拟websocket队列：每批消息之间让出一次事件循环
+            if seq % 100 == 0:
+                await asyncio.sleep(0)
+        while dispatcher.lanes:
+            await asyncio.sleep(0)
+        return time.perf_counter() - start_time
+
+    async def run_task_per_event():
+        tasks = set()
+        start_time = time.perf_counter()
+        for seq in range(n_events):
+            task = asyncio.create_task(handler(seq % n_lanes, seq))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            if seq % 100 == 0:
+                await asyncio.sleep(0)
+        while tasks:
+            await asyncio.sleep(0)
+        return time.perf_counter() - start_time
+
+    elapsed = asyncio.run(run())
+    print(f"OrderedDispatcher: {n_events} events over {n_lanes} lanes: {elapsed:.6f} seconds, {n_events / elapsed:,.0f} events/s")
+    elapsed = asyncio.run(run_task_per_event())
+    print(f"create_task per event: {n_events} events: {elapsed:.6f} seconds, {n_events / elapsed:,.0f} events/s")
+
+
+def entity_memory_benchmark(n=1000000):
+    """Memory and field access time for `n` OrderResponse/Position objects, against a Position with a per-instance __dict__."""
+    DictPosition = dataclasses.make_dataclass('DictPosition', [(f.name, f.type, f.default) for f in dataclasses.fields(Position)])
+    builders = (
+        ('OrderResponse', lambda i: OrderResponse(str(i), 'BTC/USDT:USDT', 'open', 'buy', 0.01, 0.0, 0.0, 0.01, 'x-bench', 0.0, 100.5 + i)),
+        ('Position', lambda i: Position('BTC/USDT:USDT', 0.01, 100.5 + i, 100.5, 1.005)),
+        ('Position (__dict__)', lambda i: DictPosition('BTC/USDT:USDT', 0.01, 100.5 + i, 100.5, 1.005)),
+    )
+    for name, build in builders:
+        tracemalloc.start()
+        objects = [build(i) for i in range(n)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del objects
+        # tracemalloc会拖慢分配，创建耗时单独再测一次
+        start = time.perf_counter()
+        objects = [build(i) for i in range(n)]
+        created = time.perf_counter() - start
+        start = time.perf_counter()
+        for obj in objects:
+            obj.amount
+        read = time.perf_counter() - start
+        print(f"{name}: {size / n:.0f} bytes/object, create {created / n * 1e9:.0f} ns, attribute read {read / n * 1e9:.0f} ns ({n:,} objects)")
+        del objects
+    order = ORDER_RESPONSE
+    cases = (
+        ("order['id']", lambda: order['id']),
+        ("order.get('average')", lambda: order.get('average')),
+        ('len(order)', lambda: len(order)),
+        ('order.keys()', lambda: order.keys()),
+    )
+    empty = timeit.timeit(lambda: None, number=n)
+    for name, case in cases:
+        elapsed = timeit.timeit(case, number=n) - empty
+        print(f"OrderResponse {name}: {elapsed / n * 1e9:.0f} ns")
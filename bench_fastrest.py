@@ -0,0 +1,49 @@
+"""
+`FastOrderClient` against ccxt on a local endpoint.
+"""
+import time
+import asyncio
+
+
+import ccxt.pro as ccxtpro
+
+
+from fastrest import FastOrderClient
+from mockexchange import MockExchange, local_market, route_ccxt
+
+
+def fast_order_benchmark(n=2000):
+    """Per-call create+cancel time through ccxt and through FastOrderClient against a local endpoint."""
+    markets = [local_market('BTC/USDT:USDT', 'BTCUSDT'), local_market('BTC/USDT', 'BTCUSDT')]
+
+    async def run():
+        # 本地不限频，只比较请求构建、签名和解析的开销
+        endpoint = MockExchange(limits={})
+        base = await endpoint.start()
+        api = ccxtpro.binance({'apiKey': 'key', 'secret': 'secret'})
+        # ccxt自带的节流由RateLimiter代替
+        api.enableRateLimit = False
+        route_ccxt(api, base)
+        api.set_markets(markets)
+        fast = FastOrderClient('key', 'secret', api.markets, base_urls={'spot': base, 'linear': base})
+        try:
+            for name, client in (('ccxt', api), ('FastOrderClient', fast)):
+                for symbol in ('BTC/USDT:USDT', 'BTC/USDT'):
+                    # 预热连接池
+                    order = await client.create_order(symbol, 'limit', 'buy', 0.01, 100.5, {'clientOrderId': 'x-bench'})
+                    await client.cancel_order(order['id'], symbol)
+                    create = cancel = 0.0
+                    for _ in range(n):
+                        start = time.perf_counter()
+                        order = await client.create_order(symbol, 'limit', 'buy', 0.01, 100.5, {'clientOrderId': 'x-bench'})
+                        middle = time.perf_counter()
+                        await client.cancel_order(order['id'], symbol)
+                        create += middle - start
+                        cancel += time.perf_counter() - middle
+                    print(f"{name} {symbol}: create_order {create / n * 1e6:.0f} us, cancel_order {cancel / n * 1e6:.0f} us per call")
+        finally:
+            await fast.close()
+            await api.close()
+            await endpoint.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,141 @@
+"""
+Suite cases and reports for `manager`: order update parsing, hedge aggregation and the order path against `MockExchange`.
+"""
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Dict
+
+
+import numpy as np
+
+
+from bench import case, drive
+from entity import EventSystem, MarketDataStore, Quote
+from manager import ExchangeManager, HedgeAggregator, OrderManager
+from mockexchange import MockExchange, local_market, route_ccxt
+
+
+ORDER_TRADE_UPDATE = {
+    'e': 'ORDER_TRADE_UPDATE', 'E': 1700000000000, 'T': 1700000000000,
+    'o': {'s': 'BTCUSDT', 'c': 'x-bench', 'S': 'SELL', 'o': 'LIMIT', 'f': 'GTC', 'q': '0.010', 'p': '60040.5',
+          'ap': '60040.5', 'x': 'TRADE', 'X': 'PARTIALLY_FILLED', 'i': 4000000001, 'l': '0.004', 'z': '0.004',
+          'L': '60040.5', 't': 1, 'T': 1700000000000},
+}
+EXECUTION_REPORT = {
+    'e': 'executionReport', 'E': 1700000000000, 's': 'BTCUSDT', 'c': 'x-bench', 'S': 'BUY', 'o': 'MARKET',
+    'q': '0.00400', 'p': '0.00', 'x': 'TRADE', 'X': 'FILLED', 'i': 30000000001, 'l': '0.00400', 'z': '0.00400',
+    'L': '60000.10', 't': 1, 'T': 1700000000000,
+}
+
+
+@contextmanager
+def _order_manager():
+    # 不经过__init__，避免在全局EventSystem上注册监听器；事件没有监听器，只测解析
+    manager = OrderManager.__new__(OrderManager)
+    listeners, EventSystem._listeners = EventSystem._listeners, {}
+    try:
+        yield manager
+    finally:
+        EventSystem._listeners = listeners
+
+
+@case('order_manager.on_order_update.linear')
+def _on_order_update_linear():
+    with _order_manager() as manager:
+        yield lambda: drive(manager._on_order_update(ORDER_TRADE_UPDATE, 'linear'))
+
+
+@case('order_manager.on_order_update.spot')
+def _on_order_update_spot():
+    with _order_manager() as manager:
+        yield lambda: drive(manager._on_order_update(EXECUTION_REPORT, 'spot'))
+
+
+def hedge_simulation(n_pieces=20, piece_interval=0.005, round_trip=0.02, window=0.05):
+    """A linear order filling in `n_pieces`: one market order per piece vs the HedgeAggregator."""
+    class SimulatedExchange:
+        def __init__(self):
+            self.orders = 0
+
+        async def place_market_order(self, symbol, side, amount, close_position=False, client_order_id=None):
+            self.orders += 1
+            await asyncio.sleep(round_trip)
+            return {'filled': amount, 'average': 100.0}
+
+    MarketDataStore.quote['SIM/USDT'] = Quote(ask=100, bid=99.9)
+
+    async def run_direct():
+        exchange = SimulatedExchange()
+        lags = []
+
+        # 旧逻辑：同一订单的成交事件串行处理，每次成交都等待一次市价单往返
+        async def on_fill(ts):
+            await exchange.place_market_order('SIM/USDT', 'buy', 0.01)
+            lags.append(time.perf_counter() - ts)
+
+        dispatcher = OrderedDispatcher(on_fill)
+        for _ in range(n_pieces):
+            dispatcher.submit('order', time.perf_counter())
+            await asyncio.sleep(piece_interval)
+        while dispatcher.lanes:
+            await asyncio.sleep(0.001)
+        return exchange.orders, lags
+
+    async def run_aggregated():
+        exchange = SimulatedExchange()
+        hedger = HedgeAggregator(exchange, window=window, max_notional=10000, min_notional=0)
+        lags = []
+        for i in range(n_pieces):
+            ts = time.perf_counter()
+            hedger.add('SIM/USDT', 'buy', 0.01, lambda filled, average, ts=ts: lags.append(time.perf_counter() - ts), final=i == n_pieces - 1)
+            await asyncio.sleep(piece_interval)
+        while len(lags) < n_pieces:
+            await asyncio.sleep(0.001)
+        return exchange.orders, lags
+
+    for name, run in (('direct', run_direct), ('aggregated', run_aggregated)):
+        orders, lags = asyncio.run(run())
+        print(f"{name}: {n_pieces} partial fills -> {orders} spot orders, hedge lag mean: {sum(lags) / len(lags) * 1000:.1f} ms, max: {max(lags) * 1000:.1f} ms")
+
+
+def mock_exchange_benchmark(n=500, latency=0.0):
+    """Order placement and fill notification through OrderManager and the user data stream against MockExchange."""
+    async def run():
+        mock = MockExchange(latency=latency, limits={})
+        await mock.start()
+        exchange = ExchangeManager({'exchange_id': 'binance', **mock.config(), 'fast_orders': True, 'event_suffix': '@bench', 'user_data_legs': 1})
+        route_ccxt(exchange.api, mock.base_url)
+        exchange.api.set_markets([local_market('BTC/USDT:USDT', 'BTCUSDT'), local_market('BTC/USDT', 'BTCUSDT')])
+        await exchange.load_markets()
+        order_manager = OrderManager(exchange)
+        waiters: Dict[str, asyncio.Future] = {}
+
+        def on_filled(order):
+            future = waiters.pop(order.client_order_id, None)
+            if future is not None:
+                future.set_result(time.perf_counter())
+
+        EventSystem.on('filled_order', on_filled)
+        await exchange.watch_user_data_stream()
+        while sum(len(streams) for streams in mock._streams.values()) < 2:
+            await asyncio.sleep(0.01)
+        mock.set_quote('linear', 'BTCUSDT', 99.9, 100)
+        placed, filled = [], []
+        try:
+            for i in range(n):
+                client_order_id = f'x-bench-{i}'
+                waiters[client_order_id] = asyncio.get_running_loop().create_future()
+                start = time.perf_counter()
+                await order_manager.place_limit_order('BTC/USDT:USDT', 'buy', 0.01, 100, client_order_id=client_order_id)
+                placed.append(time.perf_counter() - start)
+                filled.append(await waiters[client_order_id] - start)
+        finally:
+            EventSystem._listeners['filled_order'].remove(on_filled)
+            await exchange.close()
+            await mock.stop()
+        for name, values in (('place_limit_order', placed), ('fill event', filled)):
+            values = np.array(values) * 1000
+            print(f"mock exchange {name}: p50 {np.percentile(values, 50):.3f}ms p99 {np.percentile(values, 99):.3f}ms (latency {latency * 1000:.1f}ms)")
+
+    asyncio.run(run())
@@ -0,0 +1,25 @@
+"""
+`metrics` update cost report.
+"""
+import timeit
+
+
+from metrics import MetricRegister
+
+
+def metrics_performance_test(n=1000000):
+    register = MetricRegister()
+    counter = register.counter('bench_total', 'bench')
+    labeled = register.counter('bench_labeled_total', 'bench', ('subject',))
+    histogram = register.histogram('bench_seconds', 'bench')
+    child = labeled.labels('binance.spot.bookTicker.BTCUSDT')
+    cases = (
+        ('Counter.inc', lambda: counter.inc()),
+        ('labels(subject).inc', lambda: labeled.labels('binance.spot.bookTicker.BTCUSDT').inc()),
+        ('cached child.inc', lambda: child.inc()),
+        ('Histogram.observe', lambda: histogram.observe(0.003)),
+    )
+    empty = timeit.timeit(lambda: None, number=n)
+    for name, case in cases:
+        elapsed = timeit.timeit(case, number=n) - empty
+        print(f"metrics {name}: {elapsed / n * 1e9:.0f} ns")
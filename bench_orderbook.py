@@ -0,0 +1,38 @@
+"""
+`OrderBook` diff and vwap report.
+"""
+import time
+import random
+
+
+from orderbook import OrderBook
+
+
+def orderbook_performance_test(n=200000, levels=1000):
+    rng = random.Random(0)
+    book = OrderBook('BTC/USDT:USDT')
+    book.apply_snapshot(
+        0,
+        [(60000 - i * 0.1, 1.0) for i in range(1, levels + 1)],
+        [(60000 + i * 0.1, 1.0) for i in range(levels)],
+    )
+    updates = []
+    for update_id in range(1, n + 1):
+        offset = rng.randint(-levels, levels) * 0.1
+        size = rng.choice([0.0, 0.5, 1.0, 2.0])
+        side = 'b' if offset < 0 else 'a'
+        data = {'U': update_id, 'u': update_id, 'pu': update_id - 1, 'b': [], 'a': []}
+        data[side].append((60000 + offset, size))
+        updates.append(data)
+
+    start_time = time.perf_counter()
+    for data in updates:
+        book.apply_diff(data)
+    elapsed = time.perf_counter() - start_time
+    print(f"OrderBook: {n} diff updates with ~{levels} levels per side: {elapsed:.6f} seconds, {n / elapsed:,.0f} updates/s per symbol")
+
+    start_time = time.perf_counter()
+    for _ in range(10000):
+        book.vwap('buy', 50000)
+    elapsed = time.perf_counter() - start_time
+    print(f"OrderBook.vwap for 50000 USDT: {elapsed / 10000 * 1e6:.3f} us")
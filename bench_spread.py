@@ -0,0 +1,34 @@
+"""
+`SpreadGraph` fan-out report.
+"""
+import time
+import asyncio
+
+
+from entity import MarketDataStore, Quote
+from spread import SpreadGraph
+
+
+def spread_graph_performance_test(n=20000, fanouts=(1, 4, 16, 64), n_instruments=200):
+    """Per-tick recompute cost as the number of spreads depending on one instrument grows."""
+    store_spreads = MarketDataStore.spreads
+    for fanout in fanouts:
+        graph = MarketDataStore.spreads = SpreadGraph(auto_pair=False)
+        # 其它标的上的价差数量保持不变，只改变被测标的的扇出
+        for i in range(n_instruments):
+            graph.add(f'S{i}/USDT', near=f'S{i}/USDT', far=f'S{i}/USDT:USDT')
+        for i in range(fanout):
+            graph.add(f'HUB-{i}', near='HUB/USDT', far=f'LEG{i}/USDT')
+        for i in range(fanout):
+            MarketDataStore.quote[f'LEG{i}/USDT'] = Quote(ask=1.0, bid=1.0, recv_ts=1000)
+        ticks = [{'s': 'HUB/USDT', 'a': str(1 + i % 7 * 1e-4), 'b': '1'} for i in range(n)]
+
+        async def run():
+            for data in ticks:
+                await MarketDataStore.update(data, recv_ts=1000)
+
+        start_time = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - start_time
+        print(f"SpreadGraph: {fanout} spreads per instrument, {len(graph)} spreads total: {elapsed / n * 1e6:.3f} us per tick, {elapsed / n / fanout * 1e6:.3f} us per spread")
+    MarketDataStore.spreads = store_spreads
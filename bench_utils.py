@@ -0,0 +1,18 @@
+"""
+Suite cases for the `utils` precision helpers.
+"""
+from bench import case
+from utils import price_to_precision, amount_to_precision
+
+
+MARKET = {'BTC/USDT': {'precision': {'price': 0.01, 'amount': 0.00001}}}
+
+
+@case('utils.price_to_precision')
+def _price_to_precision():
+    yield lambda: price_to_precision('BTC/USDT', 60000.123456, 'round', MARKET)
+
+
+@case('utils.amount_to_precision')
+def _amount_to_precision():
+    yield lambda: amount_to_precision('BTC/USDT', 0.0123456789, 'floor', MARKET)
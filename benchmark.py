@@ -0,0 +1,91 @@
+"""
+Hot-path benchmark suite with a regression gate, plus the older printed reports. The cases and
+reports live next to their subsystem in `bench_<module>.py`; this is the entry point.
+
+    python benchmark.py                        # run the suite, compare with benchmark_baseline.json
+    python benchmark.py --json results.json    # also write the results
+    python benchmark.py --save-baseline        # accept the current numbers as the baseline
+    python benchmark.py --reports              # dispatcher/hedge/log/orderbook/... reports
+
+Exits with status 1 when a case is slower than the baseline by more than --tolerance.
+"""
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+
+
+from bench import CASES, compare, format_comparison, run_suite
+# 导入即注册各子系统的用例
+import bench_utils
+from bench_entity import dispatcher_performance_test, entity_memory_benchmark
+from bench_manager import hedge_simulation, mock_exchange_benchmark
+from bench_binlog import trade_log_performance_test
+from bench_orderbook import orderbook_performance_test
+from bench_spread import spread_graph_performance_test
+from bench_bot import ratio_gating_benchmark
+from bench_diagnostics import profiler_overhead_test
+from bench_metrics import metrics_performance_test
+from bench_fastrest import fast_order_benchmark
+
+
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+
+
+def reports():
+    random.seed(0)
+    dispatcher_performance_test()
+    hedge_simulation()
+    trade_log_performance_test()
+    orderbook_performance_test()
+    spread_graph_performance_test()
+    ratio_gating_benchmark()
+    profiler_overhead_test()
+    metrics_performance_test()
+    fast_order_benchmark()
+    mock_exchange_benchmark()
+    entity_memory_benchmark()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cases', nargs='*', help=f"cases to run, default all: {', '.join(CASES)}")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to --baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a case is flagged, 0.2 = 20%%')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', type=Path, help='write the results and the comparison as JSON')
+    parser.add_argument('--reports', action='store_true', help='run the printed component reports instead of the suite')
+    args = parser.parse_args(argv)
+
+    if args.reports:
+        reports()
+        return 0
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    results = run_suite(args.cases, args.repeat)
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + '\n')
+        for name, result in results['results'].items():
+            print(f"{name:<40} {result['ns_per_op']:>12,.0f} ns")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {'results': {}}
+    comparison = compare(results, baseline, args.tolerance)
+    for name, row in comparison.items():
+        print(format_comparison(name, row))
+    if args.json:
+        args.json.write_text(json.dumps(dict(results, tolerance=args.tolerance, comparison=comparison), indent=2) + '\n')
+    regressed = [name for name, row in comparison.items() if row['regressed']]
+    if regressed:
+        print(f"{len(regressed)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
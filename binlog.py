@@ -0,0 +1,181 @@
+import sys
+import json
+import time
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Tuple, Union
+
+
+DEBUG, INFO, WARNING, ERROR, CRITICAL = 10, 20, 30, 40, 50
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR', CRITICAL: 'CRITICAL'}
+
+MAGIC = b'TBLOG1\n'
+HEADER = struct.Struct('<HBd')
+STRING_LAYOUT = 0
+STRING_SIZE = 48
+
+
+class Layout:
+    """
+    A fixed record layout. `fields` is a struct format where `S` marks an interned string
+    (stored as a uint32 id), `text` is the str.format template used by the decoder.
+    """
+    __slots__ = ['id', 'fields', 'text', 'struct', 'strings']
+
+    def __init__(self, id: int, fields: str, text: str):
+        self.id = id
+        self.fields = fields
+        self.text = text
+        self.struct = struct.Struct('<' + fields.replace('S', 'I'))
+        self.strings = [i for i, code in enumerate(fields) if code == 'S']
+
+
+class BinaryLogger:
+    """
+    Append fixed-layout records to a preallocated ring buffer from the event loop; a background
+    thread writes the raw slots to `path`. Records are never formatted at log time, use
+    `decode()` to turn the file back into text. When the ring is full records are dropped
+    rather than blocking the caller.
+    """
+    def __init__(self, path: Path, layouts: Dict[int, Tuple[str, str]], level: int = INFO, capacity: int = 1 << 16, flush_interval: float = 0.05):
+        self.path = Path(path)
+        self.level = level
+        self.layouts = {STRING_LAYOUT: Layout(STRING_LAYOUT, f'I{STRING_SIZE}s', '{}={}')}
+        self.layouts.update({id: Layout(id, fields, text) for id, (fields, text) in layouts.items()})
+        self.slot_size = HEADER.size + max(layout.struct.size for layout in self.layouts.values())
+        self.capacity = capacity
+        self._buffer = bytearray(self.slot_size * capacity)
+        self._head = 0
+        self._tail = 0
+        self._strings: Dict[str, int] = {}
+        self._samples: Dict = {}
+        self.dropped = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open('ab')
+        meta = json.dumps({
+            'slot_size': self.slot_size,
+            'layouts': {id: [layout.fields, layout.text] for id, layout in self.layouts.items()},
+        }).encode()
+        self._file.write(MAGIC + struct.pack('<I', len(meta)) + meta)
+        self._flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'binlog-{self.path.stem}', daemon=True)
+        self._thread.start()
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def intern(self, value: str) -> Union[int, None]:
+        """Id of `value`, writing its string record on first use; None when the ring is full."""
+        sid = self._strings.get(value)
+        if sid is None:
+            sid = len(self._strings)
+            # 字符串记录写入后才缓存id，环满丢弃时下次引用会重新写入
+            if not self._write(STRING_LAYOUT, INFO, (sid, value.encode()[:STRING_SIZE])):
+                return None
+            self._strings[value] = sid
+        return sid
+
+    def log(self, level: int, layout_id: int, *values):
+        if level < self.level:
+            return
+        layout = self.layouts[layout_id]
+        if layout.strings:
+            values = list(values)
+            for i in layout.strings:
+                sid = self.intern(values[i])
+                if sid is None:
+                    # 字符串没有写入，引用它的记录无法解码，一并丢弃
+                    self.dropped += 1
+                    return
+                values[i] = sid
+        self._write(layout_id, level, values)
+
+    def debug(self, layout_id: int, *values):
+        self.log(DEBUG, layout_id, *values)
+
+    def info(self, layout_id: int, *values):
+        self.log(INFO, layout_id, *values)
+
+    def sample(self, key, every: int) -> int:
+        """Return how many times `key` was seen since it was last let through, or 0 to skip it."""
+        count = self._samples.get(key, 0) + 1
+        if count >= every:
+            self._samples[key] = 0
+            return count
+        self._samples[key] = count
+        return 0
+
+    def _write(self, layout_id: int, level: int, values) -> bool:
+        head = self._head
+        if head - self._tail >= self.capacity:
+            self.dropped += 1
+            return False
+        offset = (head % self.capacity) * self.slot_size
+        HEADER.pack_into(self._buffer, offset, layout_id, level, time.time())
+        self.layouts[layout_id].struct.pack_into(self._buffer, offset + HEADER.size, *values)
+        # 单生产者单消费者，写完slot之后再移动head
+        self._head = head + 1
+        return True
+
+    def _drain(self):
+        head, tail = self._head, self._tail
+        if head == tail:
+            return
+        start = (tail % self.capacity) * self.slot_size
+        end = (head % self.capacity) * self.slot_size
+        if start < end:
+            self._file.write(self._buffer[start:end])
+        else:
+            self._file.write(self._buffer[start:])
+            self._file.write(self._buffer[:end])
+        self._tail = head
+
+    def _run(self):
+        while not self._stop.wait(self._flush_interval):
+            self._drain()
+            self._file.flush()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+        self._file.close()
+
+
+def decode(path: Path) -> Iterator[str]:
+    with Path(path).open('rb') as file:
+        data = file.read()
+
+    pos = 0
+    while pos < len(data):
+        if data[pos:pos + len(MAGIC)] != MAGIC:
+            raise ValueError(f"Corrupted binary log {path} at offset {pos}")
+        pos += len(MAGIC)
+        (size,) = struct.unpack_from('<I', data, pos)
+        meta = json.loads(data[pos + 4:pos + 4 + size])
+        pos += 4 + size
+        slot_size = meta['slot_size']
+        layouts = {int(id): Layout(int(id), fields, text) for id, (fields, text) in meta['layouts'].items()}
+        strings = {}
+        # 每次启动写入一个新的头，直到遇到下一个MAGIC为止都是同一个session的记录
+        while pos < len(data) and data[pos:pos + len(MAGIC)] != MAGIC:
+            layout_id, level, ts = HEADER.unpack_from(data, pos)
+            layout = layouts[layout_id]
+            values = list(layout.struct.unpack_from(data, pos + HEADER.size))
+            pos += slot_size
+            if layout_id == STRING_LAYOUT:
+                strings[values[0]] = values[1].rstrip(b'\x00').decode()
+                continue
+            for i in layout.strings:
+                values[i] = strings.get(values[i], values[i])
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)) + f'.{int(ts % 1 * 1000):03d}'
+            yield f"[{stamp}] [{LEVEL_NAMES.get(level, level)}] {layout.text.format(*values)}"
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        for line in decode(path):
+            print(line)
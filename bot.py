@@ -1,146 +1,307 @@
 import time
 import asyncio
-from typing import List, Dict
+from functools import partial
 
 
 from collections import defaultdict
 
 
-from utils import spot_2_linear, linear_2_spot, is_linear, generate_client_order_id
+from utils import spot_2_linear, linear_2_spot, is_linear
 from entity import context, log_register
-from entity import EventSystem, MarketDataStore, OrderResponse
-from manager import NatsManager, OrderManager, ExchangeManager, AccountManager
+from entity import Context, EventSystem, MarketDataStore, OrderResponse
+from manager import NatsManager, OrderManager, ExchangeManager, AccountManager, HedgeAggregator
+from diagnostics import Diagnostics
+from ingest import IngestNatsManager
+from pool import AccountPool
+from runtime import Runtime
+from scheduler import ExecutionScheduler, PRIORITY_CLOSE, PRIORITY_OPEN
+from fills import fill_store
+from metrics import metric_register
+from registry import OrderRegistry, LiveOrder, INTENT_OPEN, INTENT_CLOSE, INTENT_HEDGE
+
+
+TRADE_TICK = 1
+TRADE_PRICE_UNCHANGED = 2
+TRADE_LAYOUTS = {
+    TRADE_TICK: ('Sdddddd', "symbol: {}, ratio: {}, open_ratio: {}, spot_bid: {}, spot_ask: {}, linear_bid: {}, linear_ask: {}"),
+    TRADE_PRICE_UNCHANGED: ('dSI', "Price: {} has not changed for {}. (x{})"),
+}
 
 class TradingBot:
     logger = log_register.get_logger('bot', level='INFO', flush=True)
     
-    def __init__(self, config):
+    def __init__(self, config, ctx: Context = None):
         self._config = config
-        self._exchange = ExchangeManager(config)
-        self._order = OrderManager(self._exchange)
-        self._account = AccountManager()
-        self._nats = NatsManager()
-        
-        
+        # 单账户的余额、持仓和openpx等状态，以及rolling窗口快照都保存在这个目录
+        self.context = ctx or context
+        self._rolling_path = self.context.directory / 'rolling.pkl'
+        if 'accounts' in config:
+            # 多个子账户分摊下单频率限制，行情和精度使用第一个账户的市场信息
+            self.pool = AccountPool(config, config['accounts'], min_headroom=config.get('pool_min_headroom', 0.2))
+            self._exchange = self.pool.primary.exchange
+            self._order = self.pool
+            self.positions = self.pool.positions
+        else:
+            self.pool = None
+            self._exchange = ExchangeManager(config)
+            self._order = OrderManager(self._exchange)
+            self._account = AccountManager(self.context)
+            self.positions = self.context.position
+        nats_urls = (config['nats_urls'],) if 'nats_urls' in config else ()
+        if config.get('ingest'):
+            # 行情在独立线程解码，事件循环只立即处理有持仓、有动作或接近开仓阈值的价差
+            self._nats = IngestNatsManager(
+                *nats_urls,
+                interest=self._interested,
+                near_open=self._near_open(),
+                # 非热点价差每个sweep_interval才计算一次，滚动中位数窗口随之拉长
+                sweep_interval=config.get('ingest_sweep_interval', 0.5),
+            )
+        else:
+            self._nats = NatsManager(*nats_urls)
+        self.registry = OrderRegistry()
+        self.diagnostics = Diagnostics(slow_threshold=config.get('slow_callback_threshold', 0.05))
+        self.runtime = Runtime(config.get('runtime_profile', 'default'), cpus=config.get('cpus'), nice=config.get('nice'))
+        MarketDataStore.min_ratio_change = config.get('ratio_min_change', MarketDataStore.min_ratio_change)
+        MarketDataStore.min_emit_interval = config.get('ratio_min_interval', MarketDataStore.min_emit_interval)
+        MarketDataStore.max_emit_interval = config.get('ratio_max_interval', MarketDataStore.max_emit_interval)
+
+
         EventSystem.on('new_order', self._on_new_order)
         EventSystem.on('filled_order', self._on_filled_order)
         EventSystem.on('partially_filled_order', self._on_partially_filled_order)
         EventSystem.on('canceled_order', self._on_canceled_order)
         
     async def run(self):
-        await self._exchange.load_markets()
+        self.runtime.apply()
+        fill_store.enable(self._config.get('fill_directory', '.fills'))
+        self.diagnostics.start()
+        try:
+            await metric_register.serve(port=self._config.get('metrics_port', 9108))
+        except OSError as e:
+            self.logger.error(f"Error starting metrics endpoint: {e}")
+        asyncio.create_task(self.diagnostics.run_report(self._config.get('diagnostics_report_interval', 60)))
+        accounts = self.pool or self._exchange
+        await accounts.load_markets()
+        # 先连user data stream，避免错过warm start期间的成交；行情在warm start之后订阅，REST快照不会覆盖更新的报价
+        asyncio.create_task(accounts.watch_user_data_stream())
+        await self.warm_start()
+        # 市场信息、快照和logger都已创建，之后的分配才是行情和订单的短命对象
+        self.runtime.freeze()
+        if self.runtime.profile.idle_collect:
+            asyncio.create_task(self.runtime.run_idle_collect(self._is_quiet))
+        asyncio.create_task(self.runtime.run_report(self._config.get('diagnostics_report_interval', 60)))
+        asyncio.create_task(MarketDataStore.history.run_export(self._config.get('history_export_interval', 300), logger=self.logger))
+        asyncio.create_task(fill_store.run_flush(self._config.get('fill_flush_interval', 60)))
+        asyncio.create_task(MarketDataStore.run_save_rolling(self._config.get('rolling_snapshot_interval', 60), self._rolling_path))
         asyncio.create_task(self._nats.subscribe())
-        asyncio.create_task(self._exchange.watch_user_data_stream())
+        asyncio.create_task(self._report_feeds(self._config.get('feed_report_interval', 300)))
         await self._wait()
     
+    def _interested(self, symbol: str) -> bool:
+        return symbol in self.positions
+
+    def _near_open(self) -> float:
+        return None
+
+    def _is_quiet(self) -> bool:
+        user_data = self.pool.queued() if self.pool else self._exchange._queue.qsize()
+        return not self._nats._queue.qsize() and not user_data
+    
+    async def _report_feeds(self, interval: float):
+        # 冗余行情各条腿的胜出次数和领先时间，用来选择托管位置
+        while True:
+            await asyncio.sleep(interval)
+            user_data = self.pool.report() if self.pool else self._exchange.user_data_arbiter.report()
+            self.logger.info(f"[FEEDS] nats: {self._nats.report()} user data: {user_data}")
+    
+    async def warm_start(self):
+        """
+        Get trading-ready within one round trip: restore the rolling windows locally, then fetch
+        all book tickers, balances and positions in parallel. Accounts are reconciled before the
+        quotes are seeded so the first ratio_changed already sees the real positions.
+        """
+        start_time = time.time()
+        max_age = self._config.get('warm_start_max_age', 300)
+        windows = MarketDataStore.load_rolling(self._rolling_path, max_age=max_age) or MarketDataStore.seed_rolling_from_history(max_age=max_age)
+        
+        if self.pool is None:
+            accounts = (
+                self._exchange.fetch_balance('spot'),
+                self._exchange.fetch_balance('linear'),
+                self._exchange.fetch_positions(),
+            )
+            names = ('spot balance', 'futures balance', 'positions')
+        else:
+            # 账户池中每个账户各自拉取并核对，同样与行情快照并行
+            accounts = (self.pool.reconcile(),)
+            names = ('accounts',)
+        results = await asyncio.gather(
+            self._exchange.fetch_bids_asks('spot'),
+            self._exchange.fetch_bids_asks('linear'),
+            *accounts,
+            return_exceptions=True,
+        )
+        for name, result in zip(('spot tickers', 'linear tickers') + names, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"[WARM START] Error fetching {name}: {result}")
+        spot_tickers, linear_tickers, *accounts = [
+            None if isinstance(result, Exception) else result for result in results
+        ]
+        
+        corrected = self._account.reconcile(*accounts) if self.pool is None else accounts[0] or 0
+        quotes = await MarketDataStore.seed_quotes(spot_tickers or {}) + await MarketDataStore.seed_quotes(linear_tickers or {})
+        self.logger.info(f"[WARM START] windows: {windows} quotes: {quotes} positions corrected: {corrected} in {time.time() - start_time:.3f}s")
+    
     async def _wait(self):
         await asyncio.Event().wait()
         
+    async def _route(self, order: OrderResponse, handler: str):
+        # 只处理本bot下的订单，按client id O(1)查找，终态订单处理完即从registry中移除
+        record = self.registry.on_update(order)
+        if record is None:
+            return
+        try:
+            if hasattr(self, handler):
+                await getattr(self, handler)(order, record)
+        finally:
+            self.registry.release(record)
+        
     async def _on_new_order(self, order):
-        if hasattr(self, 'on_new_order'):
-            await self.on_new_order(order)
+        await self._route(order, 'on_new_order')
     
     async def _on_filled_order(self, order):
-        if hasattr(self, 'on_filled_order'):
-            await self.on_filled_order(order)
+        await self._route(order, 'on_filled_order')
     
     async def _on_partially_filled_order(self, order):
-        if hasattr(self, 'on_partially_filled_order'):
-            await self.on_partially_filled_order(order)
+        await self._route(order, 'on_partially_filled_order')
     
     async def _on_canceled_order(self, order):
-        if hasattr(self, 'on_canceled_order'):
-            await self.on_canceled_order(order)
+        await self._route(order, 'on_canceled_order')
 
 class Bot(TradingBot):
-    def __init__(self, config):
-        super().__init__(config)
-        self.client_id = generate_client_order_id()
-        self.order_ids = {}
+    spread_ratio = 0.00065
+    time_ratio = 2
+    
+    def __init__(self, config, ctx: Context = None):
+        super().__init__(config, ctx)
+        self._hedger = HedgeAggregator(
+            self._order,
+            new_client_order_id=partial(self.registry.new_client_order_id, intent=INTENT_HEDGE),
+            on_rejected=self._release_hedge,
+        )
         self.trade_log = log_register.get_logger('trade', level='INFO')
-        context.openpx = defaultdict(float)
-        context.level_time = defaultdict(int)
-        self.pending_tasks: Dict[str, asyncio.Task] = {}
+        self.trade_blog = log_register.get_binary_logger('trade', TRADE_LAYOUTS, level='INFO')
+        self.context.openpx = defaultdict(float)
+        self.context.level_time = defaultdict(int)
+        self.scheduler = ExecutionScheduler(
+            max_concurrent=config.get('max_working_orders', 8),
+            max_queue_age=config.get('max_signal_age', 0.5),
+        )
         EventSystem.on('ratio_changed', self.on_ratio_changed)
 
-    async def on_new_order(self, order: OrderResponse):
-        if order.client_order_id == self.client_id and is_linear(order.symbol):
-        # if is_linear(order.symbol):
-            id = order.id
-            self.order_ids[id] = order.filled
-            self._order.logger.info(f'[NEW ORDER] id: {id} Symbol: {order.symbol} Amount: {order.amount} Side: {order.side}')
+    async def on_new_order(self, order: OrderResponse, record: LiveOrder):
+        if is_linear(order.symbol):
+            self._order.logger.info(f'[NEW ORDER] id: {order.id} Symbol: {order.symbol} Amount: {order.amount} Side: {order.side}')
 
-    async def on_partially_filled_order(self, order: OrderResponse):
-        if order.client_order_id == self.client_id and is_linear(order.symbol):
-        # if is_linear(order.symbol):
-            id = order.id
-            filled = order.filled
+    async def on_partially_filled_order(self, order: OrderResponse, record: LiveOrder):
+        if is_linear(order.symbol):
             symbol = linear_2_spot(order.symbol)
-            linear_average = order.average
-            amount = filled - self.order_ids[id]
-            res = await self.order_spot(order, symbol, amount)
-            spot_average = res['average']
-            context.openpx[symbol] = linear_average/spot_average - 1
-            self.order_ids[id] = filled - amount + res['filled']
-            self.logger.info(f'[PARTIALLY FILLED ORDER] id: {id} Symbol: {symbol} Amount: {res["filled"]} Basis: {context.openpx[symbol]} Already Filled: {self.order_ids[id]}')
+            amount = order.filled - record.hedged
+            # 先按已提交对冲记账，对冲成交不足的部分在回调中退回，由下一次成交补上
+            record.hedged = order.filled
+            self._hedger.add(
+                symbol,
+                self._hedge_side(order),
+                amount,
+                partial(self._on_hedged, order, record, symbol, amount, '[PARTIALLY FILLED ORDER]'),
+            )
             
         
-    async def on_filled_order(self, order: OrderResponse):
-        if order.client_order_id == self.client_id and is_linear(order.symbol):
-        # if is_linear(order.symbol):
-            id = order.id
+    async def on_filled_order(self, order: OrderResponse, record: LiveOrder):
+        if is_linear(order.symbol):
             symbol = linear_2_spot(order.symbol)
-            filled = order.filled
-            linear_average = order.average
-            if id in self.order_ids:
-                amount = filled - self.order_ids[id]
-                res = await self.order_spot(order, symbol, amount)
-                spot_average = res['average']
-                context.openpx[symbol] =  linear_average/spot_average - 1
-                self.logger.info(f'[FILLED ORDER] id: {id} Symbol: {symbol} Amount: {amount} Filled: {res["filled"]} Basis: {context.openpx[symbol]}')
-                self.order_ids.pop(id, None)
-            else:
-                self.logger.info(f'[SOCKET DELAY] Symbol: {symbol} already filled')
+            amount = order.filled - record.hedged
+            record.hedged = order.filled
+            self._hedger.add(
+                symbol,
+                self._hedge_side(order),
+                amount,
+                partial(self._on_hedged, order, record, symbol, amount, '[FILLED ORDER]'),
+                final=True,
+            )
+    
+    @staticmethod
+    def _hedge_side(order: OrderResponse):
+        # linear买入(平仓)对应现货卖出，linear卖出(开仓)对应现货买入
+        return 'sell' if order.side == 'buy' else 'buy'
+    
+    def _release_hedge(self, client_order_id: str):
+        self.registry.evict(self.registry.get(client_order_id=client_order_id))
+
+    def _on_hedged(self, order: OrderResponse, record: LiveOrder, symbol: str, amount: float, tag: str, filled: float, spot_average: float):
+        if filled < amount:
+            record.hedged -= amount - filled
+            # 永续单已终态，不会再有成交来补上不足的部分
+            if record.is_final:
+                self.logger.warn(f'{tag} [UNHEDGED] id: {order.id} Symbol: {symbol} Side: {self._hedge_side(order)} Amount: {amount - filled}')
+        if spot_average:
+            self.context.openpx[symbol] = order.average/spot_average - 1
+        fill_store.record_hedge(order, symbol, self._hedge_side(order), amount, filled, spot_average, self.context.openpx[symbol])
+        self.logger.info(f'{tag} id: {order.id} Symbol: {symbol} Amount: {amount} Filled: {filled} Basis: {self.context.openpx[symbol]} Already Filled: {record.hedged}')
                 
-    async def on_canceled_order(self, order: OrderResponse):
-        if order.client_order_id == self.client_id and is_linear(order.symbol):
-        # if is_linear(order.symbol):
-            id = order.id 
-            self.order_ids.pop(id, None)
-            self._order.logger.info(f'[CANCELED ORDER] id: {id} Symbol: {order.symbol} Amount: {order.amount} Side: {order.side}')
+    async def on_canceled_order(self, order: OrderResponse, record: LiveOrder):
+        if is_linear(order.symbol):
+            self._order.logger.info(f'[CANCELED ORDER] id: {order.id} Symbol: {order.symbol} Amount: {order.amount} Side: {order.side}')
         
     
+    def _interested(self, symbol: str) -> bool:
+        # 在ingest线程中调用，只做dict成员判断
+        return symbol in self.positions or symbol in self.scheduler.states
+
+    def _near_open(self) -> float:
+        return self.spread_ratio * self._config.get('ingest_near_fraction', 0.8)
+
+    def _should_open(self, symbol: str, open_ratio: float) -> bool:
+        return open_ratio > self.spread_ratio and symbol not in self.positions
+    
+    def _should_close(self, symbol: str, close_ratio: float) -> bool:
+        threshold = self.context.openpx[symbol] - self.spread_ratio * self.time_ratio ** self.context.level_time[symbol]
+        return close_ratio < threshold and symbol in self.positions
+    
     async def on_ratio_changed(self, symbol: str, open_ratio: float, close_ratio: float):
-        spread_ratio = 0.00065
-        time_ratio = 2
-        
-        mask_open = open_ratio > spread_ratio and symbol not in context.position
-        mask_diverge = close_ratio < context.openpx[symbol] - spread_ratio * time_ratio ** context.level_time[symbol] and symbol in context.position
-        
-        if symbol not in self.pending_tasks:
-            task = asyncio.create_task(self._process_symbol(symbol, mask_diverge, mask_open, open_ratio, close_ratio), name=symbol)
-            self.pending_tasks[symbol] = task
+        # 排队期间用最新的ratio重新判断，信号消失的动作不再执行
+        if self._should_close(symbol, close_ratio):
+            self.scheduler.submit(
+                symbol,
+                PRIORITY_CLOSE,
+                partial(self._close_position, symbol, close_ratio),
+                lambda: not self._should_close(symbol, MarketDataStore.close_ratio.get(symbol, close_ratio)),
+            )
+        elif self._should_open(symbol, open_ratio):
+            self.scheduler.submit(
+                symbol,
+                PRIORITY_OPEN,
+                partial(self._open_position, symbol, open_ratio),
+                lambda: not self._should_open(symbol, MarketDataStore.open_ratio.get(symbol, open_ratio)),
+            )
 
-    async def _process_symbol(self, symbol: str, mask_diverge: bool, mask_open: bool, open_ratio: float, close_ratio: float):
-        try:
-            if mask_diverge:
-                self.logger.info(f"Closing position for {symbol} at {close_ratio}")
-                await self.order_linear(
-                    symbol=symbol,
-                    amount=context.position[symbol].amount,
-                    close_position=True,
-                    open_ratio=close_ratio,
-                )
-            elif mask_open:
-                self.logger.info(f"Opening position for {symbol} at {open_ratio}")
-                await self.order_linear(
-                    symbol=symbol,
-                    notional=20,
-                    open_ratio=open_ratio,
-                )
-            self.pending_tasks.pop(symbol, None)
-        except Exception as e:
-            self.logger.error(f"Error processing {symbol}: {e}")
+    async def _close_position(self, symbol: str, close_ratio: float):
+        self.logger.info(f"Closing position for {symbol} at {close_ratio}")
+        await self.order_linear(
+            symbol=symbol,
+            amount=self.positions[symbol].amount,
+            close_position=True,
+            open_ratio=close_ratio,
+        )
+    
+    async def _open_position(self, symbol: str, open_ratio: float):
+        self.logger.info(f"Opening position for {symbol} at {open_ratio}")
+        await self.order_linear(
+            symbol=symbol,
+            notional=20,
+            open_ratio=open_ratio,
+        )
     
     
     async def order_linear_test(
@@ -157,17 +318,17 @@ class Bot(TradingBot):
         if close_position:
             spot_bid = MarketDataStore.quote[symbol].bid
             linear_bid = MarketDataStore.quote[linear_symbol].bid            
-            context.position.update(symbol, -amount, spot_bid)
-            context.position.update(linear_bid ,amount, linear_bid)
+            self.context.position.update(symbol, -amount, spot_bid)
+            self.context.position.update(linear_bid ,amount, linear_bid)
         else:
             spot_ask = MarketDataStore.quote[symbol].ask
             linear_ask = MarketDataStore.quote[linear_symbol].ask
             amount = notional / linear_ask
             
-            context.position.update(symbol, amount, spot_ask)
-            context.position.update(linear_symbol, -amount, linear_ask)
+            self.context.position.update(symbol, amount, spot_ask)
+            self.context.position.update(linear_symbol, -amount, linear_ask)
             
-        context.openpx[symbol] = open_ratio
+        self.context.openpx[symbol] = open_ratio
         self.logger.info(f'[FILLED ORDER]: {symbol} ratio: {open_ratio}')
             
     
@@ -199,6 +360,8 @@ class Bot(TradingBot):
         amount = float(self._exchange.amount_to_precision(linear_symbol, amount))
         
         remain_amount = 0
+        # 同一tick的开仓一起走批量接口；撤单后的改价只有这一单，直接下单不等批量窗口
+        place = self._order.place_limit_order_batched
         while True:
             if time.time() - start_time > wait:
                 self.trade_log.info(f"Operation for {symbol} timed out after {wait} seconds. Cancelling order if exists.")
@@ -216,33 +379,37 @@ class Bot(TradingBot):
             curr_linear_ask = MarketDataStore.quote[linear_symbol].ask
             
             ratio = curr_linear_bid / curr_spot_ask - 1 if not close_position else curr_linear_ask / curr_spot_bid - 1
-            self.trade_log.info(f"symbol: {symbol}, ratio: {ratio}, open_ratio: {open_ratio}, spot_bid: {curr_spot_bid}, spot_ask: {curr_spot_ask}, linear_bid: {curr_linear_bid}, linear_ask: {curr_linear_ask}")
+            self.trade_blog.info(TRADE_TICK, symbol, ratio, open_ratio, curr_spot_bid, curr_spot_ask, curr_linear_bid, curr_linear_ask)
             if not order_placed:
                 amount = remain_amount if remain_amount > 0 else amount
+                client_order_id = self.registry.new_client_order_id(linear_symbol, INTENT_CLOSE if close_position else INTENT_OPEN)
                 if close_position:
                     price = (open_ratio + 1) * curr_spot_bid
                     price = float(self._exchange.price_to_precision(linear_symbol, price, mode='floor'))
-                    res = await self._order.place_limit_order(
+                    res = await place(
                         symbol=linear_symbol,
                         side='buy',
                         amount=amount,
                         price=price,
                         close_position=True,
-                        client_order_id=self.client_id,
+                        client_order_id=client_order_id,
                     )
                 else:
                     price = (open_ratio + 1) * curr_spot_ask
                     price = float(self._exchange.price_to_precision(linear_symbol, price, mode='ceil'))
-                    res = await self._order.place_limit_order(
+                    res = await place(
                         symbol=linear_symbol,
                         side='sell',
                         amount=amount,
                         price=price,
-                        client_order_id=self.client_id,   
+                        client_order_id=client_order_id,
                     )
                 if res:
+                    self.registry.on_update(res)
                     order_placed = True
+                    place = self._order.place_limit_order
                 else:
+                    self.registry.evict(self.registry.get(client_order_id=client_order_id))
                     return False
             
             # if order_placed and res:
@@ -268,7 +435,10 @@ class Bot(TradingBot):
                         else:
                             return False
                     else:
-                        self.trade_log.info(f"Price: {curr_price} has not changed for {linear_symbol}.")
+                        # 每个挂单周期内重复的日志只采样记录
+                        repeats = self.trade_blog.sample(linear_symbol, 100)
+                        if repeats:
+                            self.trade_blog.info(TRADE_PRICE_UNCHANGED, curr_price, linear_symbol, repeats)
             else:
                 if order_placed and curr_spot_ask != spot_ask:
                     curr_price = (open_ratio + 1) * curr_spot_ask
@@ -283,33 +453,12 @@ class Bot(TradingBot):
                         else:
                             return False
                     else:
-                        self.trade_log.info(f"Price: {curr_price} has not changed for {linear_symbol}.")
+                        # 每个挂单周期内重复的日志只采样记录
+                        repeats = self.trade_blog.sample(linear_symbol, 100)
+                        if repeats:
+                            self.trade_blog.info(TRADE_PRICE_UNCHANGED, curr_price, linear_symbol, repeats)
             
             # if not res:
             #     return True
             
             await asyncio.sleep(time_interval)
-    
-    async def order_spot(self, order: OrderResponse, symbol: str, amount: float):
-        if order['side'] == 'buy': # close position of linear side
-            res = await self._order.place_market_order(
-                symbol=symbol,
-                side='sell',
-                amount=amount,
-                client_order_id=self.client_id,
-            )
-            # logging.info(f"Place Market Order for {res['symbol']}: {amount}")
-        elif order['side'] == 'sell':
-            res = await self._order.place_market_order(
-                symbol=symbol,
-                side='buy',
-                amount=amount,
-                client_order_id=self.client_id,
-            )
-            # logging.info(f"Place Market Order for {res['symbol']}: {amount}")
-        return res
-        
-
-
-
-        
\ No newline at end of file
@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import threading
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+from entity import EventSystem, log_register
+
+
+# 毫秒
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class LagHistogram:
+    """Fixed-bucket histogram of event loop lag in milliseconds."""
+    __slots__ = ['bounds', 'counts', 'count', 'sum', 'max']
+
+    def __init__(self, bounds: Tuple[float, ...] = LAG_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile, `max` for the overflow bucket."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _listener_name(callback) -> str:
+    return getattr(callback, '__qualname__', None) or repr(callback)
+
+
+EMIT_CODE = EventSystem.emit.__func__.__code__
+
+
+def emitting(frame) -> Tuple[str, str]:
+    """(event, listener) of the innermost `EventSystem.emit` on the stack of `frame`."""
+    # watchdog线程看不到事件循环中task的上下文，从采样的栈中找最内层的emit帧
+    while frame is not None:
+        if frame.f_code is EMIT_CODE:
+            local = frame.f_locals
+            callback = local.get('callback')
+            return local.get('event', ''), _listener_name(callback) if callback is not None else ''
+        frame = frame.f_back
+    return '', ''
+
+
+class LoopMonitor:
+    """
+    A loop task wakes every `interval` seconds and records how late it woke up. A watchdog
+    thread checks the task's heartbeat; when the loop has been stuck for `slow_threshold`
+    seconds it samples the loop thread's stack once and attributes the stall to the
+    `EventSystem` event and listener running at that moment.
+    """
+    def __init__(self, interval: float = 0.01, slow_threshold: float = 0.05, logger=None):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.logger = logger
+        self.lag = LagHistogram()
+        self.slow_callbacks: Counter = Counter()
+        self.stalls: List[Tuple[str, str, str, float]] = []
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        interval = self.interval
+        while True:
+            start = time.perf_counter()
+            self._heartbeat = start
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            self._heartbeat = now
+            self.lag.record((now - start - interval) * 1000)
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.slow_threshold / 4):
+            heartbeat = self._heartbeat
+            stalled = time.perf_counter() - heartbeat
+            # 每次卡顿只采样一次
+            if stalled < self.slow_threshold + self.interval or heartbeat == reported:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = collapse_stack(frame) if frame is not None else ''
+            event, listener = emitting(frame)
+            self.slow_callbacks[(event, listener)] += 1
+            self.stalls.append((event, listener, stack, stalled * 1000))
+            del self.stalls[:-100]
+            if self.logger is not None:
+                self.logger.error(f"[LOOP STALL] {stalled * 1000:.1f}ms event: {event or '-'} listener: {listener or '-'} stack: {stack}")
+
+
+class SamplingProfiler:
+    """
+    Samples the loop thread's stack every `interval` seconds from a background thread while
+    enabled and writes collapsed stacks (`frame;frame;frame count`) for flamegraph.pl or
+    speedscope. Toggle with `toggle()` or SIGUSR2 after `install_signal()`.
+    """
+    def __init__(self, interval: float = 0.005, directory: Path = Path('.logs'), logger=None):
+        self.interval = interval
+        self.directory = Path(directory)
+        self.logger = logger
+        self.samples: Counter = Counter()
+        self.enabled = False
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def install_signal(self, sig: int = signal.SIGUSR2):
+        self._thread_id = threading.get_ident()
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, self.toggle)
+        except RuntimeError:
+            signal.signal(sig, lambda signum, frame: self.toggle())
+
+    def toggle(self) -> Path:
+        if self.enabled:
+            return self.stop()
+        self.start()
+        return None
+
+    def start(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        if self.logger is not None:
+            self.logger.info(f"[PROFILER] started, interval {self.interval * 1000:.1f}ms")
+
+    def stop(self) -> Path:
+        if not self.enabled:
+            return None
+        self.enabled = False
+        self._stop.set()
+        self._thread.join()
+        path = self.dump()
+        if self.logger is not None:
+            self.logger.info(f"[PROFILER] {sum(self.samples.values())} samples written to {path}")
+        return path
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.samples[collapse_stack(frame)] += 1
+            del frame
+
+    def dump(self, path: Path = None) -> Path:
+        path = Path(path) if path else self.directory / f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class Diagnostics:
+    logger = log_register.get_logger('diagnostics', level='INFO', flush=True)
+
+    def __init__(self, lag_interval: float = 0.01, slow_threshold: float = 0.05, profile_interval: float = 0.005, profile_dir: Path = Path('.logs')):
+        self.monitor = LoopMonitor(lag_interval, slow_threshold, logger=self.logger)
+        self.profiler = SamplingProfiler(profile_interval, profile_dir, logger=self.logger)
+
+    def start(self):
+        """Call from the running loop's thread."""
+        self.monitor.start()
+        self.profiler.install_signal()
+
+    def stop(self):
+        self.monitor.stop()
+        self.profiler.stop()
+
+    def report(self) -> Dict:
+        return {
+            'loop_lag_ms': self.monitor.lag.summary(),
+            'slow_callbacks': {f'{event}/{listener}': count for (event, listener), count in self.monitor.slow_callbacks.most_common(10)},
+        }
+
+    async def run_report(self, interval: float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            self.logger.info(f"[DIAGNOSTICS] {self.report()}")
@@ -1,4 +1,5 @@
 import sys
+import atexit
 import pickle
 import asyncio
 import collections  
@@ -11,7 +12,16 @@ import spdlog as spd
 from pathlib import Path
 from collections import defaultdict, deque
 from dataclasses import dataclass, fields, field
-from typing import Dict, List, Callable, Any, Literal
+from typing import Dict, List, Callable, Any, Literal, Awaitable, Hashable
+
+
+from binlog import BinaryLogger
+from history import RatioHistoryStore, load_recent, PERSIST_FLUSH
+from spread import SpreadGraph
+from metrics import metric_register
+
+
+EVENT_EMITS = metric_register.counter('event_emits_total', 'EventSystem.emit calls per event', ('event',))
 
 
 @dataclass
@@ -31,57 +41,84 @@ class OrderResponse:
     price: float
     
     def __getitem__(self, key):
-        if hasattr(self, key):
+        if key in _ORDER_RESPONSE_KEYS:
             return getattr(self, key)
         raise KeyError(key)
 
     def __setitem__(self, key, value):
-        if hasattr(self, key):
+        if key in _ORDER_RESPONSE_KEYS:
             setattr(self, key, value)
         else:
             raise KeyError(key)
 
     def keys(self):
-        return [f.name for f in fields(self)]
+        return list(_ORDER_RESPONSE_FIELDS)
 
     def __iter__(self):
-        return iter(self.keys())
+        return iter(_ORDER_RESPONSE_FIELDS)
 
     def __len__(self):
-        return len(fields(self))
+        return len(_ORDER_RESPONSE_FIELDS)
     
     def get(self, key: str, default: Any = None) -> Any:
-        if hasattr(self, key):
+        if key in _ORDER_RESPONSE_KEYS:
             return getattr(self, key)
         return default
-    
+
+
+# 字段表只算一次，避免每次访问都调用dataclasses.fields()
+_ORDER_RESPONSE_FIELDS = tuple(f.name for f in fields(OrderResponse))
+_ORDER_RESPONSE_KEYS = frozenset(_ORDER_RESPONSE_FIELDS)
+
 class Quote:
-    __slots__ = ['ask', 'bid']
+    __slots__ = ['ask', 'bid', 'exchange_ts', 'recv_ts', 'update_id']
+    _keys = frozenset(__slots__)
 
-    def __init__(self, ask: float = 0, bid: float = 0):
+    def __init__(self, ask: float = 0, bid: float = 0, exchange_ts: float = 0, recv_ts: float = 0, update_id: int = 0):
         self.ask = ask
         self.bid = bid
+        # exchange_ts/recv_ts均为毫秒时间戳，现货bookTicker没有交易所时间时为0
+        self.exchange_ts = exchange_ts
+        self.recv_ts = recv_ts
+        self.update_id = update_id
 
     def __getitem__(self, key):
-        if key == 'ask':
-            return self.ask
-        elif key == 'bid':
-            return self.bid
+        if key in self._keys:
+            return getattr(self, key)
         else:
             raise KeyError(f"Invalid key: {key}")
 
     def __setitem__(self, key, value):
-        if key == 'ask':
-            self.ask = value
-        elif key == 'bid':
-            self.bid = value
+        if key in self._keys:
+            setattr(self, key, value)
         else:
             raise KeyError(f"Invalid key: {key}")
 
     def __repr__(self):
-        return f"Quote(ask={self.ask}, bid={self.bid})"   
+        return f"Quote(ask={self.ask}, bid={self.bid}, exchange_ts={self.exchange_ts}, recv_ts={self.recv_ts}, update_id={self.update_id})"   
     
 
+class FeedLag:
+    """Receive time minus exchange time, in milliseconds, for one feed subject."""
+    __slots__ = ['count', 'last', 'ewma', 'max']
+
+    def __init__(self):
+        self.count = 0
+        self.last = 0.0
+        self.ewma = 0.0
+        self.max = 0.0
+
+    def record(self, lag: float, alpha: float = 0.05):
+        self.count += 1
+        self.last = lag
+        self.ewma = lag if self.count == 1 else self.ewma + alpha * (lag - self.ewma)
+        if lag > self.max:
+            self.max = lag
+
+    def __repr__(self):
+        return f"FeedLag(count={self.count}, last={self.last:.1f}, ewma={self.ewma:.1f}, max={self.max:.1f})"
+
+
 class EventSystem:
     _listeners: Dict[str, List[Callable]] = {}
 
@@ -93,13 +130,61 @@ class EventSystem:
 
     @classmethod
     async def emit(cls, event: str, *args: Any, **kwargs: Any):
+        EVENT_EMITS.labels(event).inc()
         if event in cls._listeners:
+            # diagnostics从采样的栈中的emit帧读取event和callback定位卡住事件循环的监听器，改名时同步修改
             for callback in cls._listeners[event]:
                 if asyncio.iscoroutinefunction(callback):
                     await callback(*args, **kwargs)
                 else:
                     callback(*args, **kwargs)
 
+class OrderedDispatcher:
+    """
+    Run `handler` for submitted events in per-key lanes: events with the same key are
+    processed in submission order, different keys run concurrently.
+    """
+    def __init__(self, handler: Callable[..., Awaitable], logger=None):
+        self._handler = handler
+        self._logger = logger
+        self._lanes: Dict[Hashable, deque] = {}
+        self.processed = 0
+        self.max_lanes = 0
+
+    def submit(self, key: Hashable, *args: Any):
+        lane = self._lanes.get(key)
+        if lane is None:
+            # lane只在有积压时占用一个task，处理完即释放
+            lane = self._lanes[key] = deque()
+            lane.append(args)
+            asyncio.create_task(self._drain(key, lane))
+            if len(self._lanes) > self.max_lanes:
+                self.max_lanes = len(self._lanes)
+        else:
+            lane.append(args)
+
+    async def _drain(self, key: Hashable, lane: deque):
+        try:
+            while lane:
+                try:
+                    await self._handler(*lane[0])
+                except Exception as e:
+                    if self._logger:
+                        self._logger.error(f"Error dispatching {key}: {e}")
+                lane.popleft()
+                self.processed += 1
+        finally:
+            del self._lanes[key]
+
+    @property
+    def lanes(self) -> int:
+        return len(self._lanes)
+
+    @property
+    def backlog(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+
 @dataclass
 class Account:
     USDT: float = 0
@@ -109,8 +194,8 @@ class Account:
     ETH: float = 0
     USDC: float = 0
 
-    def __init__(self, account_type: str):
-        self.filepath = Path('.context') / f'{account_type}.pkl'
+    def __init__(self, account_type: str, directory: Path = Path('.context')):
+        self.filepath = Path(directory) / f'{account_type}.pkl'
         self.load_account()
 
     def __post_init__(self):
@@ -119,30 +204,32 @@ class Account:
 
     def __setattr__(self, key, value):
         object.__setattr__(self, key, value)
-        if key in self.keys():
+        if key in _ACCOUNT_KEYS:
             self.save_account()
 
     def __getitem__(self, key):
-        if key in self.keys():
+        if key in _ACCOUNT_KEYS:
             return getattr(self, key)
         else:
             raise KeyError(f"{key} is not a valid account field.")
 
     def __setitem__(self, key, value):
-        if key in self.keys():
+        if key in _ACCOUNT_KEYS:
             setattr(self, key, value)
         else:
             raise KeyError(f"{key} is not a valid account field.")
 
     def keys(self):
-        return [f.name for f in fields(self)]
+        return list(_ACCOUNT_FIELDS)
 
     def save_account(self):
         """Save account data to a pickle file."""
+        start = time.perf_counter()
         filepath = self.filepath
         filepath.parent.mkdir(parents=True, exist_ok=True)
         with filepath.open('wb') as file:
-            pickle.dump({field: getattr(self, field) for field in self.keys()}, file)
+            pickle.dump({field: getattr(self, field) for field in _ACCOUNT_FIELDS}, file)
+        PERSIST_FLUSH.labels('account').observe(time.perf_counter() - start)
 
     def load_account(self):
         """Load account data from a pickle file, if it exists."""
@@ -154,10 +241,15 @@ class Account:
                     setattr(self, key, value)
         else:
             # 如果文件不存在，则初始化所有货币为0
-            for field in self.keys():
+            for field in _ACCOUNT_FIELDS:
                 setattr(self, field, 0)
 
-@dataclass
+
+_ACCOUNT_FIELDS = tuple(f.name for f in fields(Account))
+_ACCOUNT_KEYS = frozenset(_ACCOUNT_FIELDS)
+
+
+@dataclass(slots=True)
 class Position:
     symbol: str = None
     amount: float = 0.0
@@ -171,10 +263,18 @@ class Position:
         self.avg_price = self.total_cost / self.amount if self.amount != 0 else 0
         self.last_price = order_price
 
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # 旧版本的Position带__dict__，positions.pkl里存的状态同样是字段字典
+        for name, value in state.items():
+            setattr(self, name, value)
+
 class PositionDict(Dict[str, Position]):
-    def __init__(self):
+    def __init__(self, directory: Path = Path('.context')):
         super().__init__()
-        self.file_path = Path(".context/positions.pkl")
+        self.file_path = Path(directory) / 'positions.pkl'
         self.file_path.parent.mkdir(parents=True, exist_ok=True)
         self.load_positions()
 
@@ -200,16 +300,20 @@ class PositionDict(Dict[str, Position]):
                     self[key] = value
 
     def save_positions(self):
+        start = time.perf_counter()
         with self.file_path.open('wb') as f:
             pickle.dump(dict(self), f)
+        PERSIST_FLUSH.labels('positions').observe(time.perf_counter() - start)
         
 
 class Context:
-    def __init__(self):
+    def __init__(self, directory: Path = Path('.context')):
+        # 多账户时每个账户一个目录，默认账户仍使用.context
+        self._directory = Path(directory)
         self._data = {}
-        self.spot_account = Account('spot_account')
-        self.futures_account = Account('futures_account')
-        self.position = PositionDict()
+        self.spot_account = Account('spot_account', self._directory)
+        self.futures_account = Account('futures_account', self._directory)
+        self.position = PositionDict(self._directory)
         self._load_data()
 
     def __repr__(self) -> str:
@@ -218,7 +322,7 @@ class Context:
         return base_repr + "\n" + "\n".join(attributes)
 
     def __setattr__(self, name, value):
-        if name in ['spot_account', 'futures_account', 'position', '_data']:
+        if name in ['spot_account', 'futures_account', 'position', '_data', '_directory']:
             super().__setattr__(name, value)
         else:
             self._data[name] = value
@@ -229,14 +333,20 @@ class Context:
             return self._data[name]
         raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
     def _get_data_path(self):
-        return Path('.context') / 'data.pkl'
+        return self._directory / 'data.pkl'
 
     def _save_data(self):
+        start = time.perf_counter()
         path = self._get_data_path()
         path.parent.mkdir(parents=True, exist_ok=True)
         with path.open('wb') as f:
             pickle.dump(self._data, f)
+        PERSIST_FLUSH.labels('context').observe(time.perf_counter() - start)
 
     def _load_data(self):
         path = self._get_data_path()
@@ -266,6 +376,14 @@ class RollingMedian:
             return (sorted_data[mid - 1] + sorted_data[mid]) / 2.0
         else:
             return sorted_data[mid]
+    
+    @property
+    def ready(self) -> bool:
+        return len(self.data) == self.n
+    
+    def seed(self, values):
+        for value in values:
+            self.input(value)
         
         
 class MarketDataStore:
@@ -274,37 +392,155 @@ class MarketDataStore:
     close_ratio = {}
     open_rolling_median = defaultdict(RollingMedian)
     close_rolling_median = defaultdict(RollingMedian)
+    # 两条腿的报价时间相差超过max_skew(毫秒)时不计算ratio
+    max_skew = 500
+    feed_lag: Dict[str, FeedLag] = defaultdict(FeedLag)
+    stale_skipped: Dict[str, int] = defaultdict(int)
+    out_of_order: Dict[str, int] = defaultdict(int)
+    history = RatioHistoryStore()
+    # 报价更新只重算依赖该标的的价差，默认按现货symbol自动配对永续
+    spreads = SpreadGraph()
+    # ratio_changed门控：窗口未填满、距上次发送不足min_emit_interval秒、或open/close变化都小于min_ratio_change时不发送，
+    # 但距上次发送超过max_emit_interval秒时照常发送，保证策略能在上一个任务结束后重新评估
+    suppress_warmup = True
+    min_ratio_change = 0.0
+    min_emit_interval = 0.0
+    max_emit_interval = 1.0
+    emitted: Dict[str, int] = defaultdict(int)
+    suppressed: Dict[str, int] = defaultdict(int)
+    _last_emit: Dict[str, tuple] = {}
     
     @classmethod
-    async def update(cls, data: Dict):
+    async def update(cls, data: Dict, recv_ts: float = None, subject: str = None):
         symbol = data['s']
-        cls.quote[symbol] = Quote(
-            ask=float(data['a']),
-            bid=float(data['b']),
-        )
-        spot_symbol = symbol.replace(':USDT', '') if ':' in symbol else symbol
-        await cls.calculate_ratio(spot_symbol)
-            
+        recv_ts = recv_ts or time.time() * 1000
+        exchange_ts = data.get('T') or data.get('E') or 0
+        update_id = data.get('u') or 0
+        
+        quote = cls.quote[symbol]
+        if update_id and update_id < quote.update_id:
+            cls.out_of_order[symbol] += 1
+            return
+        quote.ask = float(data['a'])
+        quote.bid = float(data['b'])
+        quote.exchange_ts = exchange_ts
+        quote.recv_ts = recv_ts
+        quote.update_id = update_id
+        if exchange_ts:
+            cls.feed_lag[subject or symbol].record(recv_ts - exchange_ts)
+        
+        for spread in cls.spreads.dependents(symbol):
+            await cls.calculate_ratio(spread.name)
     
     @classmethod
-    async def calculate_ratio(cls, spot_symbol: str):
-        linear_symbol = f'{spot_symbol}:USDT'
-        if spot_symbol in cls.quote and linear_symbol in cls.quote:
-            spot_bid = cls.quote[spot_symbol].bid
-            spot_ask = cls.quote[spot_symbol].ask
-            linear_bid = cls.quote[linear_symbol].bid
-            linear_ask = cls.quote[linear_symbol].ask
-            
-            # cls.close_ratio[spot_symbol] = linear_bid / spot_bid - 1
-            # cls.open_ratio[spot_symbol] = linear_ask / spot_ask - 1
+    def skew(cls, a: Quote, b: Quote) -> float:
+        if a.exchange_ts and b.exchange_ts:
+            return abs(a.exchange_ts - b.exchange_ts)
+        return abs(a.recv_ts - b.recv_ts)
             
-            # cls.open_ratio[spot_symbol] = linear_bid / spot_ask - 1
-            # cls.close_ratio[spot_symbol] = linear_ask / spot_bid - 1
-            
-            cls.open_ratio[spot_symbol] = cls.open_rolling_median[spot_symbol].input(linear_bid / spot_ask - 1)
-            cls.close_ratio[spot_symbol] = cls.close_rolling_median[spot_symbol].input(linear_ask / spot_bid - 1)
-            
-            await EventSystem.emit('ratio_changed', spot_symbol, cls.open_ratio[spot_symbol], cls.close_ratio[spot_symbol])
+    
+    @classmethod
+    async def calculate_ratio(cls, name: str):
+        spread = cls.spreads.spreads.get(name)
+        if spread is None or spread.near not in cls.quote or spread.far not in cls.quote:
+            return
+        near_quote = cls.quote[spread.near]
+        far_quote = cls.quote[spread.far]
+        if cls.skew(near_quote, far_quote) > cls.max_skew:
+            cls.stale_skipped[name] += 1
+            return
+        
+        # 默认价差中near为现货，far为永续
+        # cls.close_ratio[name] = far_quote.bid / near_quote.bid - 1
+        # cls.open_ratio[name] = far_quote.ask / near_quote.ask - 1
+        
+        open_raw = far_quote.bid / near_quote.ask - 1
+        close_raw = far_quote.ask / near_quote.bid - 1
+        cls.open_ratio[name] = cls.open_rolling_median[name].input(open_raw)
+        cls.close_ratio[name] = cls.close_rolling_median[name].input(close_raw)
+        cls.history.record(name, open_raw, close_raw, cls.open_ratio[name], cls.close_ratio[name])
+        
+        if cls.should_emit(name, cls.open_ratio[name], cls.close_ratio[name]):
+            await EventSystem.emit('ratio_changed', name, cls.open_ratio[name], cls.close_ratio[name])
+    
+    @classmethod
+    async def seed_quotes(cls, tickers: Dict[str, Dict], recv_ts: float = None) -> int:
+        """Seed quotes from a bulk REST book ticker (ccxt `fetch_bids_asks`), keeping symbols that already ticked."""
+        recv_ts = recv_ts or time.time() * 1000
+        seeded = 0
+        for symbol, ticker in tickers.items():
+            if symbol in cls.quote or not ticker.get('bid') or not ticker.get('ask'):
+                continue
+            await cls.update({'s': symbol, 'a': ticker['ask'], 'b': ticker['bid'], 'T': ticker.get('timestamp') or 0}, recv_ts)
+            seeded += 1
+        return seeded
+    
+    @classmethod
+    def seed_rolling(cls, name: str, open_values, close_values):
+        cls.open_rolling_median[name].seed(open_values)
+        cls.close_rolling_median[name].seed(close_values)
+    
+    @classmethod
+    def save_rolling(cls, path: Path = Path('.context') / 'rolling.pkl'):
+        start = time.perf_counter()
+        windows = {
+            name: (list(median.data), list(cls.close_rolling_median[name].data))
+            for name, median in list(cls.open_rolling_median.items())
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('wb') as f:
+            pickle.dump({'ts': time.time(), 'windows': windows}, f)
+        PERSIST_FLUSH.labels('rolling').observe(time.perf_counter() - start)
+    
+    @classmethod
+    def load_rolling(cls, path: Path = Path('.context') / 'rolling.pkl', max_age: float = 300) -> int:
+        """Restore rolling windows saved less than `max_age` seconds ago, returns the number of spreads seeded."""
+        if not path.exists():
+            return 0
+        with path.open('rb') as f:
+            snapshot = pickle.load(f)
+        if time.time() - snapshot['ts'] > max_age:
+            return 0
+        for name, (open_values, close_values) in snapshot['windows'].items():
+            cls.seed_rolling(name, open_values, close_values)
+        return len(snapshot['windows'])
+    
+    @classmethod
+    def seed_rolling_from_history(cls, directory: Path = Path('.history'), max_age: float = 300) -> int:
+        """Replay the most recent exported raw ratios into the rolling windows."""
+        recent = load_recent(directory, max_age)
+        for name, columns in recent.items():
+            # 只需要最后若干个值就能填满窗口，多取一些以应对重复值
+            tail = cls.open_rolling_median[name].n * 4
+            cls.seed_rolling(name, columns['open_raw'][-tail:].tolist(), columns['close_raw'][-tail:].tolist())
+        return len(recent)
+    
+    @classmethod
+    async def run_save_rolling(cls, interval: float = 60, path: Path = Path('.context') / 'rolling.pkl'):
+        while True:
+            await asyncio.sleep(interval)
+            cls.save_rolling(path)
+    
+    @classmethod
+    def should_emit(cls, name: str, open_ratio: float, close_ratio: float) -> bool:
+        if cls.suppress_warmup and not (cls.open_rolling_median[name].ready and cls.close_rolling_median[name].ready):
+            cls.suppressed[name] += 1
+            return False
+        now = time.monotonic()
+        last = cls._last_emit.get(name)
+        if last is not None:
+            last_ts, last_open, last_close = last
+            elapsed = now - last_ts
+            if elapsed < cls.min_emit_interval or (
+                elapsed < cls.max_emit_interval
+                and abs(open_ratio - last_open) < cls.min_ratio_change
+                and abs(close_ratio - last_close) < cls.min_ratio_change
+            ):
+                cls.suppressed[name] += 1
+                return False
+        cls._last_emit[name] = (now, open_ratio, close_ratio)
+        cls.emitted[name] += 1
+        return True
 
 
 class LogRegister:
@@ -316,8 +552,10 @@ class LogRegister:
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(parents=True, exist_ok=True)
         self.loggers = {}
+        self.binary_loggers = {}
         
         self.setup_error_handling()
+        atexit.register(self.close_binary_loggers)
     
     def setup_error_handling(self):
         self.error_logger = self.get_logger('error', level='ERROR', flush=True)
@@ -340,6 +578,27 @@ class LogRegister:
             self.loggers[name] = logger_instance
         return self.loggers[name]
     
+    def get_binary_logger(self, name, layouts: Dict, level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'] = 'INFO', capacity: int = 1 << 16):
+        """
+        Structured logger for hot paths, see `binlog.BinaryLogger`. Records go to
+        `{log_dir}/{name}-YYYYMMDD.bin`, decode them with `python binlog.py <file>`.
+        """
+        if name not in self.binary_loggers:
+            filename = self.log_dir / f"{name}-{time.strftime('%Y%m%d')}.bin"
+            self.binary_loggers[name] = BinaryLogger(filename, layouts, level=self.parse_binary_level(level), capacity=capacity)
+        return self.binary_loggers[name]
+    
+    def close_binary_loggers(self):
+        for logger_instance in self.binary_loggers.values():
+            logger_instance.close()
+        self.binary_loggers.clear()
+    
+    def is_enabled(self, logger_instance, level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']) -> bool:
+        return logger_instance.should_log(self.parse_level(level))
+    
+    def parse_binary_level(self, level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']):
+        return {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}[level]
+    
     def parse_level(self, level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']):
         levels = {
             'DEBUG': spd.LogLevel.DEBUG,
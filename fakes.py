@@ -0,0 +1,103 @@
+"""
+In-process stand-ins for the ccxt client and the market order side of `OrderManager`, shared
+by the unit tests.
+"""
+import asyncio
+import itertools
+
+
+import ccxt.pro as ccxtpro
+
+
+class MockExchangeApi:
+    """
+    ccxt client stand-in for one account: limit orders rest as `open` until cancelled, market
+    orders fill at once, orders for `reject_symbols` fail with -2019 and every order call raises
+    `error` when set. Balances, positions and tickers are fixed, each call is recorded in
+    `calls` and takes `latency` seconds.
+    """
+    # 订单id在所有实例间唯一，AccountPool按id找回下单的子账户
+    _ids = itertools.count(1)
+
+    def __init__(self, usdt=0.0, spot=None, positions=(), tickers=None, reject_symbols=(), error=None, latency=0.0):
+        self.usdt = usdt
+        self.spot = {'USDT': usdt} if spot is None else spot
+        self.positions = list(positions)
+        self.tickers = tickers or {}
+        self.reject_symbols = reject_symbols
+        self.error = error
+        self.latency = latency
+        self.orders = {}
+        self.calls = []
+
+    async def _call(self, *call):
+        self.calls.append(call)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _order(self, symbol, type, side, amount, price, params):
+        order_id = str(next(self._ids))
+        limit = type == 'limit'
+        self.orders[order_id] = order = {
+            'id': order_id, 'symbol': symbol, 'status': 'open' if limit else 'closed', 'side': side,
+            'amount': amount, 'filled': 0 if limit else amount, 'remaining': amount if limit else 0,
+            'clientOrderId': params.get('clientOrderId'), 'average': None if limit else price, 'price': price,
+        }
+        return dict(order)
+
+    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+        await self._call('create_order', symbol)
+        if self.error is not None:
+            raise self.error
+        if symbol in self.reject_symbols:
+            raise ccxtpro.InsufficientFunds('binance {"code":-2019,"msg":"Margin is insufficient."}')
+        return self._order(symbol, type, side, amount, price, params)
+
+    async def create_orders(self, orders, params={}):
+        await self._call('create_orders', len(orders))
+        if self.error is not None:
+            raise self.error
+        return [
+            {'id': None, 'info': {'code': -2019, 'msg': 'Margin is insufficient.'}} if order['symbol'] in self.reject_symbols
+            else self._order(order['symbol'], order['type'], order['side'], order['amount'], order['price'], order['params'])
+            for order in orders
+        ]
+
+    async def cancel_order(self, id, symbol=None, params={}):
+        await self._call('cancel_order', symbol)
+        order = self.orders.pop(str(id))
+        return dict(order, status='canceled')
+
+    async def fetch_bids_asks(self, symbols=None, params={}):
+        family = 'spot' if params['type'] == 'spot' else 'linear'
+        await self._call('fetch_bids_asks', family)
+        return self.tickers.get(family, {})
+
+    async def fetch_balance(self, params={}):
+        await self._call('fetch_balance', params['type'])
+        if params['type'] == 'spot':
+            return {
+                'info': {'balances': [{'asset': asset, 'free': str(free), 'locked': '0'} for asset, free in self.spot.items()]},
+                'total': dict(self.spot),
+            }
+        return {'info': {'assets': [{'asset': 'USDT', 'walletBalance': str(self.usdt)}]}}
+
+    async def fetch_positions(self, symbols=None, params={}):
+        await self._call('fetch_positions')
+        return self.positions
+
+
+class MockMarketOrders:
+    """`place_market_order` stand-in for `HedgeAggregator`, fills `fill_ratio` of each order at 100, or rejects every order with `fail`."""
+    def __init__(self, fill_ratio=1.0, fail=False):
+        self.orders = []
+        self.client_order_ids = []
+        self._fill_ratio = fill_ratio
+        self._fail = fail
+
+    async def place_market_order(self, symbol, side, amount, close_position=False, client_order_id=None):
+        self.orders.append((symbol, side, amount))
+        self.client_order_ids.append(client_order_id)
+        if self._fail:
+            return None
+        return {'filled': amount * self._fill_ratio, 'average': 100.0}
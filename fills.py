@@ -0,0 +1,251 @@
+"""
+Append-only fill history: every order update and hedge pairing as one row, kept in
+preallocated column blocks and written block by block to `.fills/YYYYMMDD/*.npz`.
+
+    python fills.py export fills.csv --start 20240101 --end 20240131
+    python fills.py export BTC.npz --symbol BTC/USDT
+"""
+import csv
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+import numpy as np
+
+
+from entity import OrderResponse, log_register
+from history import PERSIST_ERRORS, PERSIST_FLUSH
+from metrics import metric_register
+from utils import linear_2_spot, spot_2_linear
+
+
+KIND_ORDER = 0
+KIND_HEDGE = 1
+# 对冲行: symbol为现货, order_id/client_order_id为触发对冲的永续订单,
+# amount/filled为对冲数量, average为现货均价, price为永续均价, basis为开仓基差
+COLUMNS: Dict[str, str] = {
+    'ts': 'f8',
+    'kind': 'u1',
+    'symbol': 'S24',
+    'order_id': 'S24',
+    'client_order_id': 'S40',
+    'side': 'S4',
+    'status': 'S16',
+    'amount': 'f8',
+    'filled': 'f8',
+    'last_filled': 'f8',
+    'average': 'f8',
+    'price': 'f8',
+    'basis': 'f8',
+}
+VALUE_COLUMNS = tuple(COLUMNS)[1:]
+STRING_COLUMNS = tuple(name for name, dtype in COLUMNS.items() if dtype.startswith('S'))
+
+FILL_DROPPED = metric_register.counter('fill_rows_dropped_total', 'Fill rows dropped because every block was waiting to be written')
+
+
+def day_of(ts: float) -> str:
+    return time.strftime('%Y%m%d', time.gmtime(ts))
+
+
+class FillStore:
+    """
+    Rows are written into one of `blocks` preallocated column blocks of `block_size` rows. A
+    block is handed to the default executor when it is full, when the UTC day changes or on
+    `flush()`, and returns to the free list once written, so memory stays at
+    `blocks * block_size` rows however long the session runs. Each file holds a single day.
+    When every block is still being written new rows are dropped rather than allocated.
+    Recording is off until `enable()` is called.
+    """
+    logger = log_register.get_logger('fills', level='INFO', flush=True)
+
+    def __init__(self, directory: Path = None, block_size: int = 4096, blocks: int = 4):
+        self.directory = None if directory is None else Path(directory)
+        self.block_size = block_size
+        self._free: List[Dict[str, np.ndarray]] = [
+            {name: np.zeros(block_size, dtype) for name, dtype in COLUMNS.items()} for _ in range(blocks)
+        ]
+        self._block: Dict[str, np.ndarray] = self._free.pop()
+        self._rows = 0
+        self._day: str = None
+        self._pending: List[asyncio.Future] = []
+        self._seq = 0
+        self.written = 0
+        self.dropped = 0
+
+    def enable(self, directory: Path = Path('.fills')):
+        self.directory = Path(directory)
+
+    def record_order(self, order: OrderResponse, ts: float = None):
+        if self.directory is None:
+            return
+        self._append(
+            time.time() if ts is None else ts, KIND_ORDER, order.symbol, order.id, order.client_order_id, order.side, order.status,
+            order.amount, order.filled, order.last_filled, order.average, order.price, np.nan,
+        )
+
+    def record_hedge(self, order: OrderResponse, symbol: str, side: str, amount: float, filled: float, spot_average: float, basis: float, ts: float = None):
+        if self.directory is None:
+            return
+        self._append(
+            time.time() if ts is None else ts, KIND_HEDGE, symbol, order.id, order.client_order_id, side, 'hedged',
+            amount, filled, 0.0, spot_average, order.average, basis,
+        )
+
+    def _append(self, ts: float, *values):
+        day = day_of(ts)
+        if self._day != day and self._rows:
+            self._submit()
+        block = self._block
+        if block is None:
+            block = self._take()
+            if block is None:
+                self.dropped += 1
+                FILL_DROPPED.inc()
+                return
+        i = self._rows
+        block['ts'][i] = ts
+        for name, value in zip(VALUE_COLUMNS, values):
+            # None(如未成交订单的均价)存为NaN或空字符串
+            block[name][i] = (b'' if name in STRING_COLUMNS else np.nan) if value is None else value
+        self._day = day
+        self._rows = i + 1
+        if self._rows == self.block_size:
+            self._submit()
+
+    def _take(self) -> Dict[str, np.ndarray]:
+        if self._free:
+            self._block = self._free.pop()
+        return self._block
+
+    def _submit(self):
+        block, rows, day = self._block, self._rows, self._day
+        self._block, self._rows = None, 0
+        self._seq += 1
+        path = self.directory / day / f"fills-{time.strftime('%H%M%S', time.gmtime())}-{self._seq:06d}.npz"
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                PERSIST_FLUSH.labels('fills').observe(self._write(path, block, rows))
+            except Exception:
+                self._release(block, rows, False)
+                raise
+            self._release(block, rows)
+            return
+        # 写盘期间块不会被复用，直接传切片，不需要拷贝
+        future = loop.run_in_executor(None, self._write, path, block, rows)
+        future.add_done_callback(lambda future: self._written(block, rows, future))
+        self._pending.append(future)
+
+    def _written(self, block: Dict[str, np.ndarray], rows: int, future: asyncio.Future):
+        # done回调在事件循环中执行，耗时在这里记录，指标不在线程池中更新
+        written = not future.cancelled() and future.exception() is None
+        if written:
+            PERSIST_FLUSH.labels('fills').observe(future.result())
+        self._release(block, rows, written)
+
+    def _release(self, block: Dict[str, np.ndarray], rows: int, written: bool = True):
+        # 写盘失败的块同样归还，行数不计入written
+        if written:
+            self.written += rows
+        self._free.append(block)
+        self._pending = [future for future in self._pending if not future.done()]
+
+    @staticmethod
+    def _write(path: Path, block: Dict[str, np.ndarray], rows: int) -> float:
+        start = time.perf_counter()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, **{name: values[:rows] for name, values in block.items()})
+        return time.perf_counter() - start
+
+    async def flush(self):
+        """Write the partly filled block and wait for every block in flight."""
+        if self._rows:
+            self._submit()
+        if self._pending:
+            await asyncio.gather(*self._pending)
+
+    async def run_flush(self, interval: float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # 单次写盘失败不能结束循环，下一轮照常落盘
+                PERSIST_ERRORS.labels('fills').inc()
+                self.logger.error(f"Error flushing fills: {e}")
+
+
+def read_file(path: Path, pairs: Tuple[str, ...] = None) -> Dict[str, np.ndarray]:
+    # npz按列惰性加载，先只读symbol列过滤
+    with np.load(path) as data:
+        mask = None if pairs is None else np.isin(data['symbol'], [pair.encode() for pair in pairs])
+        return {name: data[name] if mask is None else data[name][mask] for name in COLUMNS}
+
+
+def day_range(directory: Path, start: str = None, end: str = None) -> List[Path]:
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return [
+        path for path in sorted(directory.iterdir())
+        if path.is_dir() and (start is None or path.name >= start) and (end is None or path.name <= end)
+    ]
+
+
+def load_fills(directory: Path = Path('.fills'), symbol: str = None, day: str = None, start: str = None, end: str = None) -> Dict[str, np.ndarray]:
+    """
+    Rows for one UTC `day` or the days `start`..`end` (YYYYMMDD, inclusive), ordered by ts.
+    `symbol` selects both legs of its pair, so hedge rows come with the linear order rows.
+    String columns are returned as str arrays.
+    """
+    if day is not None:
+        start = end = day
+    pairs = None if symbol is None else (linear_2_spot(symbol), spot_2_linear(symbol))
+    parts = [read_file(path, pairs) for folder in day_range(directory, start, end) for path in sorted(folder.glob('fills-*.npz'))]
+    if not parts:
+        return {name: np.zeros(0, dtype if name not in STRING_COLUMNS else 'U1') for name, dtype in COLUMNS.items()}
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+    order = np.argsort(columns['ts'], kind='stable')
+    return {name: values[order].astype('U') if name in STRING_COLUMNS else values[order] for name, values in columns.items()}
+
+
+def export_fills(path: Path, directory: Path = Path('.fills'), symbol: str = None, start: str = None, end: str = None) -> int:
+    """Write the selected rows to one `.npz` or `.csv` file; returns the row count."""
+    path = Path(path)
+    columns = load_fills(directory, symbol=symbol, start=start, end=end)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == '.csv':
+        with path.open('w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*(values.tolist() for values in columns.values())))
+    else:
+        np.savez_compressed(path, **columns)
+    return len(columns['ts'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help='write rows to a .csv or .npz file')
+    export.add_argument('path')
+    export.add_argument('--directory', default='.fills')
+    export.add_argument('--symbol')
+    export.add_argument('--start', help='first UTC day, YYYYMMDD')
+    export.add_argument('--end', help='last UTC day, YYYYMMDD')
+    args = parser.parse_args(argv)
+    rows = export_fills(args.path, args.directory, args.symbol, args.start, args.end)
+    print(f"{rows} rows written to {args.path}", file=sys.stderr)
+
+
+fill_store = FillStore()
+
+
+if __name__ == '__main__':
+    main()
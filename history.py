@@ -0,0 +1,191 @@
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, Literal
+
+
+import numpy as np
+
+
+from metrics import metric_register
+
+
+COLUMNS = ('ts', 'open_raw', 'close_raw', 'open', 'close')
+TS, OPEN_RAW, CLOSE_RAW, OPEN, CLOSE = range(len(COLUMNS))
+
+Column = Literal['ts', 'open_raw', 'close_raw', 'open', 'close']
+
+PERSIST_FLUSH = metric_register.histogram('persistence_flush_seconds', 'Time spent writing state to disk', ('target',))
+PERSIST_ERRORS = metric_register.counter('persistence_errors_total', 'Failed writes of state to disk', ('target',))
+HISTORY_LOST = metric_register.counter('history_rows_lost_total', 'Ratio rows overwritten in the ring buffer before they were exported')
+
+
+class RatioHistory:
+    """
+    Fixed-capacity ring buffer of timestamped raw and median-filtered open/close ratios.
+    Every row is written twice, at `i` and `i + capacity`, so the last n rows are always a
+    contiguous slice and `window()` can return a view instead of a copy.
+    """
+    __slots__ = ['capacity', 'count', '_data', '_head']
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.count = 0
+        self._data = np.zeros((len(COLUMNS), 2 * capacity))
+        self._head = 0
+
+    def append(self, ts: float, open_raw: float, close_raw: float, open_ratio: float, close_ratio: float):
+        i = self._head
+        row = (ts, open_raw, close_raw, open_ratio, close_ratio)
+        self._data[:, i] = row
+        self._data[:, i + self.capacity] = row
+        self._head = i + 1 if i + 1 < self.capacity else 0
+        self.count += 1
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def window(self, n: int = None, seconds: float = None) -> np.ndarray:
+        """Read-only view of shape (len(COLUMNS), n) over the newest rows, oldest first."""
+        size = len(self)
+        n = size if n is None else min(n, size)
+        end = self._head + self.capacity
+        view = self._data[:, end - n:end]
+        if seconds is not None and n:
+            start = np.searchsorted(view[TS], view[TS, -1] - seconds, side='left')
+            view = view[:, start:]
+        view = view.view()
+        view.flags.writeable = False
+        return view
+
+    def column(self, name: Column, n: int = None, seconds: float = None) -> np.ndarray:
+        return self.window(n, seconds)[COLUMNS.index(name)]
+
+    def percentile(self, name: Column, q: float, n: int = None, seconds: float = None) -> float:
+        values = self.column(name, n, seconds)
+        return float(np.percentile(values, q)) if len(values) else float('nan')
+
+    def zscore(self, name: Column, n: int = None, seconds: float = None) -> float:
+        """z-score of the newest value against the window."""
+        values = self.column(name, n, seconds)
+        if len(values) < 2:
+            return 0.0
+        std = values.std()
+        return float((values[-1] - values.mean()) / std) if std > 0 else 0.0
+
+    def time_above(self, name: Column, threshold: float, n: int = None, seconds: float = None) -> float:
+        """Seconds within the window during which the value stayed above `threshold`."""
+        window = self.window(n, seconds)
+        if window.shape[1] < 2:
+            return 0.0
+        # 每个值持续到下一条记录的时间
+        durations = np.diff(window[TS])
+        return float(durations[window[COLUMNS.index(name), :-1] > threshold].sum())
+
+
+class RatioHistoryStore:
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.histories: Dict[str, RatioHistory] = {}
+        self._exported: Dict[str, int] = {}
+        # 两次导出之间被环形缓冲覆盖、没能导出的行数
+        self.lost: Dict[str, int] = {}
+        self._seq = 0
+
+    def __getitem__(self, symbol: str) -> RatioHistory:
+        history = self.histories.get(symbol)
+        if history is None:
+            history = self.histories[symbol] = RatioHistory(self.capacity)
+        return history
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.histories
+
+    def record(self, symbol: str, open_raw: float, close_raw: float, open_ratio: float, close_ratio: float, ts: float = None):
+        self[symbol].append(time.time() if ts is None else ts, open_raw, close_raw, open_ratio, close_ratio)
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copy rows appended since the last snapshot, keyed `{symbol}/{column}`. Rows already overwritten are added to `lost`."""
+        arrays = {}
+        for symbol, history in self.histories.items():
+            new_rows = history.count - self._exported.get(symbol, 0)
+            if new_rows <= 0:
+                continue
+            if new_rows > len(history):
+                lost = new_rows - len(history)
+                self.lost[symbol] = self.lost.get(symbol, 0) + lost
+                HISTORY_LOST.inc(lost)
+                new_rows = len(history)
+            window = history.window(new_rows)
+            for i, name in enumerate(COLUMNS):
+                arrays[f'{symbol}/{name}'] = window[i].copy()
+            self._exported[symbol] = history.count
+        return arrays
+
+    async def export(self, directory: Path = Path('.history')) -> Path:
+        # 拷贝在事件循环中完成(很快)，压缩写盘放到线程池
+        arrays = self.snapshot()
+        if not arrays:
+            return None
+        # 同一秒内的两次导出(如写盘失败后的下一轮)靠序号区分，不会互相覆盖
+        self._seq += 1
+        path = Path(directory) / f"ratios-{time.strftime('%Y%m%d-%H%M%S')}-{self._seq:06d}.npz"
+        try:
+            elapsed = await asyncio.get_running_loop().run_in_executor(None, self._write, path, arrays)
+        except Exception:
+            # 快照已取走，写盘失败的行同样计入丢失
+            for key, values in arrays.items():
+                symbol, name = key.rsplit('/', 1)
+                if name == 'ts':
+                    self.lost[symbol] = self.lost.get(symbol, 0) + len(values)
+                    HISTORY_LOST.inc(len(values))
+            raise
+        # 写盘在线程池中执行，耗时回到事件循环再记录
+        PERSIST_FLUSH.labels('history').observe(elapsed)
+        return path
+
+    @staticmethod
+    def _write(path: Path, arrays: Dict[str, np.ndarray]) -> float:
+        start = time.perf_counter()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, **arrays)
+        return time.perf_counter() - start
+
+    async def run_export(self, interval: float = 300, directory: Path = Path('.history'), logger=None):
+        reported = sum(self.lost.values())
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.export(directory)
+            except Exception as e:
+                PERSIST_ERRORS.labels('history').inc()
+                if logger:
+                    logger.error(f"Error exporting ratio history: {e}")
+            lost = sum(self.lost.values())
+            if lost > reported and logger:
+                logger.warn(f"Ratio history lost {lost - reported} rows since the last export, export more often than every {interval}s or raise history capacity")
+            reported = lost
+
+def load_export(path: Path) -> Dict[str, Dict[str, np.ndarray]]:
+    """Read an exported file back as {symbol: {column: array}}."""
+    result: Dict[str, Dict[str, np.ndarray]] = {}
+    with np.load(path) as data:
+        for key in data.files:
+            symbol, name = key.rsplit('/', 1)
+            result.setdefault(symbol, {})[name] = data[key]
+    return result
+
+
+def load_recent(directory: Path = Path('.history'), max_age: float = 300) -> Dict[str, Dict[str, np.ndarray]]:
+    """Concatenate exports written within `max_age` seconds, oldest rows first."""
+    directory = Path(directory)
+    if not directory.exists():
+        return {}
+    now = time.time()
+    paths = [path for path in sorted(directory.glob('ratios-*.npz')) if now - path.stat().st_mtime <= max_age]
+    parts: Dict[str, Dict[str, list]] = {}
+    for path in paths:
+        for symbol, columns in load_export(path).items():
+            for name, values in columns.items():
+                parts.setdefault(symbol, {}).setdefault(name, []).append(values)
+    return {symbol: {name: np.concatenate(values) for name, values in columns.items()} for symbol, columns in parts.items()}
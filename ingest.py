@@ -0,0 +1,288 @@
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+
+import msgpack
+import numpy as np
+
+
+from entity import FeedLag, MarketDataStore, Quote
+from manager import NatsManager, NATS_MESSAGES, QUEUE_DEPTH
+from orderbook import OrderBookManager
+from redundancy import book_ticker_key
+from metrics import metric_register
+
+
+INGEST_SIGNALS = metric_register.counter('ingest_signals_total', 'Spreads handed from the ingest thread to the event loop', ('path',))
+
+ASK, BID, EXCHANGE_TS, RECV_TS, UPDATE_ID = range(5)
+
+
+class QuoteTable:
+    """
+    Preallocated quote rows, one per instrument, assigned on first sight. Only the ingest thread
+    writes; a row is written and read with a single numpy call, which holds the GIL throughout,
+    so the event loop never sees half of an update.
+    """
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.rows: Dict[str, int] = {}
+        self._data = np.zeros((capacity, 5))
+
+    def row(self, symbol: str) -> int:
+        row = self.rows.get(symbol)
+        if row is None:
+            if len(self.rows) >= self.capacity:
+                raise OverflowError(f"QuoteTable full ({self.capacity} instruments)")
+            row = self.rows[symbol] = len(self.rows)
+        return row
+
+    def write(self, row: int, ask: float, bid: float, exchange_ts: float, recv_ts: float, update_id: int):
+        self._data[row] = (ask, bid, exchange_ts, recv_ts, update_id)
+
+    def update_id(self, row: int) -> float:
+        return self._data[row, UPDATE_ID]
+
+    def get(self, symbol: str) -> Union[List[float], None]:
+        row = self.rows.get(symbol)
+        return None if row is None else self._data[row].tolist()
+
+    def copy_to(self, symbol: str, quote: Quote) -> bool:
+        values = self.get(symbol)
+        if values is None:
+            return False
+        quote.ask, quote.bid, quote.exchange_ts, quote.recv_ts, update_id = values
+        quote.update_id = int(update_id)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class IngestNatsManager(NatsManager):
+    """
+    NatsManager whose connections, msgpack decoding, dedup and quote writes run on a dedicated
+    thread with its own event loop, into a preallocated `QuoteTable`. The main loop only runs
+    the ratio pipeline: immediately for spreads `interest(name)` accepts (positions, working
+    orders) or whose raw open ratio reaches `near_open`, and every `sweep_interval` seconds
+    with the latest quotes for the rest, so a burst costs the main loop one update per spread.
+    The thread never touches the `SpreadGraph`: the main loop publishes an immutable
+    instrument -> spreads map and pairs instruments it has not seen yet.
+
+    Idle spreads reach `calculate_ratio` at most once per `sweep_interval`, not once per tick,
+    so their `RollingMedian` (n samples) covers at least n * `sweep_interval` seconds and needs
+    as long to warm up. A spread that turns hot gets per-tick samples again. Lower
+    `sweep_interval` (config `ingest_sweep_interval`) to shorten the idle window.
+    """
+    def __init__(
+        self,
+        nats_url: Union[str, List[str]] = "nats://104.194.152.27:4222",
+        cert_path = "./keys",
+        interest: Callable[[str], bool] = None,
+        near_open: float = None,
+        sweep_interval: float = 0.5,
+        capacity: int = 4096,
+    ):
+        super().__init__(nats_url, cert_path)
+        self.table = QuoteTable(capacity)
+        self.interest = interest or (lambda name: False)
+        self.near_open = near_open
+        self.sweep_interval = sweep_interval
+        self.loop: asyncio.AbstractEventLoop = None
+        # 以下四项只由ingest线程写，事件循环读取前先整体复制
+        self.out_of_order: Dict[str, int] = defaultdict(int)
+        self.feed_lag: Dict[str, FeedLag] = defaultdict(FeedLag)
+        self.messages: Dict[str, int] = defaultdict(int)
+        self._discovering: Set[str] = set()
+        # 已发布到NATS_MESSAGES的计数，只在事件循环中使用
+        self._published: Dict[str, int] = {}
+        # 主事件循环整体替换，ingest线程只读：instrument -> ((spread, near, far), ...)
+        self._routes: Dict[str, Tuple[Tuple[str, str, str], ...]] = {}
+        # 线程写入、事件循环取走，交换集合时加锁
+        self._lock = threading.Lock()
+        self._hot: Set[str] = set()
+        self._idle: Set[str] = set()
+        self._main: asyncio.AbstractEventLoop = None
+        self._signal: asyncio.Event = None
+        self._ready = threading.Event()
+        self._thread: threading.Thread = None
+        self._tasks: List[asyncio.Task] = []
+        QUEUE_DEPTH.labels('nats').set_function(self.pending)
+
+    def pending(self) -> int:
+        return len(self._hot) + len(self._idle)
+
+    async def subscribe(self):
+        self._main = asyncio.get_running_loop()
+        self._signal = asyncio.Event()
+        # warm start已经登记的价差先发布给ingest线程
+        self._route({leg for spread in MarketDataStore.spreads.spreads.values() for leg in (spread.near, spread.far)})
+        self._thread = threading.Thread(target=self._run_thread, name='ingest', daemon=True)
+        self._thread.start()
+        self._tasks = [asyncio.create_task(self._process_signals()), asyncio.create_task(self._run_sweep())]
+        # 任意一条腿连上即可开始
+        await asyncio.to_thread(self._ready.wait)
+
+    def _run_thread(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._start_legs())
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _start_legs(self):
+        # 连接事件属于ingest线程的事件循环
+        self._connected = asyncio.Event()
+        await self._subscribe('binance.spot.bookTicker.*', self._ingest)
+        await self._subscribe('binance.linear.bookTicker.*', self._ingest)
+        for url in self._nats_urls:
+            asyncio.create_task(self._run_leg(url))
+        await self._connected.wait()
+        self._ready.set()
+
+    async def _ingest(self, url, msg):
+        recv_ts = time.time() * 1000
+        # 指标只在事件循环中更新，线程内先计数，由_run_sweep发布
+        self.messages[msg.subject] += 1
+        res = msgpack.unpackb(msg.data)
+        if self.arbiter.legs > 1 and not self.arbiter.accept(book_ticker_key(res), url, recv_ts):
+            return
+        symbol = res['s']
+        table = self.table
+        row = table.row(symbol)
+        update_id = res.get('u') or 0
+        if update_id and update_id < table.update_id(row):
+            self.out_of_order[symbol] += 1
+            return
+        exchange_ts = res.get('T') or res.get('E') or 0
+        table.write(row, float(res['a']), float(res['b']), exchange_ts, recv_ts, update_id)
+        if exchange_ts:
+            self.feed_lag[msg.subject].record(recv_ts - exchange_ts)
+        routes = self._routes.get(symbol)
+        if routes is None:
+            # 新标的交给主事件循环配对，配对后按表中最新报价计算
+            if symbol not in self._discovering:
+                self._discovering.add(symbol)
+                self._main.call_soon_threadsafe(self._discover, symbol)
+            return
+        for name, near, far in routes:
+            self._mark(name, self._is_hot(name, near, far))
+
+    def _route(self, legs):
+        # 复制后整体替换，ingest线程读到的总是完整的映射
+        routes = dict(self._routes)
+        for leg in legs:
+            routes[leg] = tuple((spread.name, spread.near, spread.far) for spread in MarketDataStore.spreads.dependents(leg))
+        self._routes = routes
+
+    def _discover(self, symbol: str):
+        spreads = MarketDataStore.spreads.dependents(symbol)
+        self._route({symbol, *(leg for spread in spreads for leg in (spread.near, spread.far))})
+        for name, near, far in self._routes[symbol]:
+            self._mark(name, self._is_hot(name, near, far))
+
+    def _is_hot(self, name: str, near: str, far: str) -> bool:
+        if self.interest(name):
+            return True
+        if self.near_open is None:
+            return False
+        near_quote, far_quote = self.table.get(near), self.table.get(far)
+        return near_quote is not None and far_quote is not None and near_quote[ASK] > 0 and far_quote[BID] / near_quote[ASK] - 1 >= self.near_open
+
+    def _mark(self, name: str, hot: bool):
+        with self._lock:
+            if not hot:
+                if name not in self._hot:
+                    self._idle.add(name)
+                return
+            self._idle.discard(name)
+            wake = not self._hot
+            self._hot.add(name)
+        if wake:
+            self._main.call_soon_threadsafe(self._signal.set)
+
+    def _take(self, hot: bool) -> Set[str]:
+        with self._lock:
+            if hot:
+                names, self._hot = self._hot, set()
+            else:
+                names, self._idle = self._idle, set()
+        return names
+
+    async def _apply(self, names: Set[str], path: str):
+        spreads = MarketDataStore.spreads.spreads
+        quote = MarketDataStore.quote
+        for name in names:
+            spread = spreads.get(name)
+            if spread is None:
+                continue
+            # 只有一条腿到过ingest时，另一条腿沿用warm start的快照
+            for leg in (spread.near, spread.far):
+                if leg in self.table.rows:
+                    self.table.copy_to(leg, quote[leg])
+            await MarketDataStore.calculate_ratio(name)
+        INGEST_SIGNALS.labels(path).inc(len(names))
+
+    async def _process_signals(self):
+        while True:
+            await self._signal.wait()
+            self._signal.clear()
+            await self._apply(self._take(True), 'hot')
+
+    async def _run_sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.publish_counts()
+            await self._apply(self._take(False), 'sweep')
+
+    def publish_counts(self):
+        # dict.copy()在GIL下一次完成，线程同时插入新subject也不会打断
+        published = self._published
+        for subject, count in self.messages.copy().items():
+            delta = count - published.get(subject, 0)
+            if delta:
+                NATS_MESSAGES.labels(subject).inc(delta)
+                published[subject] = count
+
+    async def subscribe_depth(self, books: OrderBookManager):
+        # 深度行情同样在ingest线程解码，订单簿只在主事件循环中更新
+        async def callback(url, msg):
+            data = msgpack.unpackb(msg.data)
+            if self.depth_arbiter.legs == 1 or self.depth_arbiter.accept(book_ticker_key(data), url, time.time() * 1000):
+                self._main.call_soon_threadsafe(books.on_message, data)
+
+        async def subscribe():
+            await self._subscribe('binance.spot.depth.*', callback)
+            await self._subscribe('binance.linear.depth.*', callback)
+
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(subscribe(), self.loop))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self.loop is None:
+            return
+
+        async def close_legs():
+            for nc in list(self._connections.values()):
+                close = getattr(nc, 'close', None)
+                if close is not None:
+                    await close()
+
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(close_legs(), self.loop))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        await asyncio.to_thread(self._thread.join)
+
+    def report(self) -> Dict[str, Dict]:
+        report = super().report()
+        lag = max(self.feed_lag.copy().items(), key=lambda item: item[1].ewma, default=(None, None))
+        report['ingest'] = {
+            'instruments': len(self.table),
+            'pending': self.pending(),
+            'out_of_order': sum(self.out_of_order.copy().values()),
+            'worst_feed_lag': lag,
+        }
+        return report
@@ -0,0 +1,387 @@
+"""
+Load test for the market data path: publishes synthetic bookTicker messages in the format
+NatsManager consumes and measures queue growth and tick-to-ratio_changed latency.
+
+    python loadgen.py --symbols 200 --rates 2000,5000,10000,20000 --duration 5
+    python loadgen.py --nats-url nats://127.0.0.1:4222 --burst 50
+    python loadgen.py --runtime-profile low-latency    # compare GC pauses and tail latency
+    python loadgen.py --order-path --rates 5000,20000  # order reply latency with and without the ingest thread
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+import argparse
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+
+import msgpack
+import nats
+import numpy as np
+
+
+from entity import EventSystem, MarketDataStore
+from manager import NatsManager
+from ingest import IngestNatsManager
+from runtime import Runtime, PROFILES
+
+
+class LocalBroker:
+    """In-process stand-in for a NATS server, delivering to subscribers synchronously."""
+    def __init__(self):
+        self.subscriptions: List[Tuple[str, object]] = []
+
+    async def subscribe(self, subject, cb):
+        self.subscriptions.append((subject[:-1] if subject.endswith('*') else subject, cb))
+
+    async def publish(self, subject: str, data: bytes):
+        for prefix, cb in self.subscriptions:
+            if subject.startswith(prefix):
+                await cb(SimpleNamespace(subject=subject, data=data))
+
+
+class LoadNatsManager(NatsManager):
+    """NatsManager connected to the in-process broker (`local`) or a plain, non-TLS NATS url."""
+    def __init__(self, nats_url: str = 'local', broker: LocalBroker = None):
+        super().__init__(nats_url)
+        self.broker = broker or LocalBroker()
+
+    async def _connect(self, url):
+        if url == 'local':
+            return self.broker
+        return await nats.connect(url)
+
+
+class LoadIngestNatsManager(IngestNatsManager):
+    """IngestNatsManager whose thread connects to the in-process broker or a plain NATS url."""
+    def __init__(self, nats_url: str = 'local', broker: LocalBroker = None, **kwargs):
+        super().__init__(nats_url, **kwargs)
+        self.broker = broker or LocalBroker()
+
+    async def _connect(self, url):
+        if url == 'local':
+            return self.broker
+        return await nats.connect(url)
+
+
+class TickGenerator:
+    """Random-walk spot and linear quotes for `symbols` synthetic pairs."""
+    def __init__(self, symbols: int, seed: int = 0):
+        self._rng = random.Random(seed)
+        self.legs = []
+        for i in range(symbols):
+            base = f'LG{i:04d}'
+            mid = 10 + i
+            self.legs.append([f'{base}/USDT', f'binance.spot.bookTicker.{base}USDT', mid, 0])
+            self.legs.append([f'{base}/USDT:USDT', f'binance.linear.bookTicker.{base}USDT', mid * 1.0006, 0])
+        self.sent: Dict[Tuple[str, int], float] = {}
+
+    def next(self) -> Tuple[str, bytes]:
+        leg = self.legs[self._rng.randrange(len(self.legs))]
+        symbol, subject, mid, update_id = leg
+        mid *= 1 + self._rng.choice((-1, 1)) * 1e-4
+        leg[2] = mid
+        leg[3] = update_id = update_id + 1
+        now = time.time() * 1000
+        self.sent[(symbol, update_id)] = time.perf_counter()
+        payload = {'s': symbol, 'a': round(mid * 1.0001, 6), 'b': round(mid, 6), 'E': now, 'T': now, 'u': update_id}
+        return subject, msgpack.packb(payload)
+
+
+class LatencyProbe:
+    """Time from publishing the tick that completed a spread to its ratio_changed."""
+    def __init__(self, generator: TickGenerator):
+        self._sent = generator.sent
+        self.latencies: List[float] = []
+        EventSystem.on('ratio_changed', self.on_ratio_changed)
+
+    def on_ratio_changed(self, symbol: str, open_ratio: float, close_ratio: float):
+        now = time.perf_counter()
+        spread = MarketDataStore.spreads.spreads[symbol]
+        sent = [
+            self._sent.pop((leg, MarketDataStore.quote[leg].update_id), None)
+            for leg in (spread.near, spread.far)
+        ]
+        sent = [ts for ts in sent if ts is not None]
+        if sent:
+            self.latencies.append((now - max(sent)) * 1000)
+
+    def close(self):
+        EventSystem._listeners['ratio_changed'].remove(self.on_ratio_changed)
+
+
+class FeedThread:
+    """
+    Publishes ticks from its own thread onto `loop` in bursts, the way socket reads land on the
+    loop that owns the connection: the main loop normally, the ingest loop in ingest mode.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, publish, generator: TickGenerator, rate: float, burst: int = 1):
+        self.loop = loop
+        self.publish = publish
+        self.generator = generator
+        self.rate = rate
+        self.burst = burst
+        self.published = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='feed', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        next_burst = time.perf_counter()
+        while not self._stop.is_set():
+            batch = [self.generator.next() for _ in range(self.burst)]
+            self.loop.call_soon_threadsafe(self._deliver, batch)
+            self.published += len(batch)
+            next_burst += self.burst / self.rate
+            delay = next_burst - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _deliver(self, batch: List[Tuple[str, bytes]]):
+        self.loop.create_task(self._publish(batch))
+
+    async def _publish(self, batch: List[Tuple[str, bytes]]):
+        for subject, data in batch:
+            await self.publish(subject, data)
+
+
+class ReplyProbe:
+    """
+    Posts a timestamp to `loop` every `interval` seconds from another thread and records how long
+    the loop took to run it: the wait an order reply or user data event sees behind the feed.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = 0.001):
+        self.loop = loop
+        self.interval = interval
+        self.latencies: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='reply-probe', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.loop.call_soon_threadsafe(self._record, time.perf_counter())
+            time.sleep(self.interval)
+
+    def _record(self, sent: float):
+        self.latencies.append((time.perf_counter() - sent) * 1000)
+
+
+async def order_path_latency(rate: float, symbols: int = 100, duration: float = 3, burst: int = 1, ingest: bool = False, interest: float = 0.1) -> Dict:
+    """
+    Reply latency on the main loop while the feed runs at `rate` msg/s. In ingest mode the first
+    `interest` fraction of the spreads is treated as positions and reaches the loop immediately.
+    """
+    broker = LocalBroker()
+    if ingest:
+        watched = {f'LG{i:04d}/USDT' for i in range(int(symbols * interest))}
+        manager = LoadIngestNatsManager(broker=broker, interest=watched.__contains__)
+    else:
+        manager = LoadNatsManager(broker=broker)
+    await manager.subscribe()
+    generator = TickGenerator(symbols)
+    probe = ReplyProbe(asyncio.get_running_loop())
+    feed = FeedThread(manager.loop if ingest else asyncio.get_running_loop(), broker.publish, generator, rate, burst)
+    probe.start()
+    feed.start()
+    await asyncio.sleep(duration)
+    feed.stop()
+    probe.stop()
+    backlog = manager.pending() if ingest else manager._queue.qsize()
+    if ingest:
+        await manager.close()
+    generator.sent.clear()
+    latencies = np.array(probe.latencies) if probe.latencies else np.zeros(1)
+    return {
+        'rate': rate,
+        'ingest': ingest,
+        'published_rate': feed.published / duration,
+        'backlog': backlog,
+        'replies': len(probe.latencies),
+        'reply_ms': {q: float(np.percentile(latencies, q)) for q in (50, 90, 99, 99.9)},
+    }
+
+
+def compare_order_path(rates: List[float], symbols: int = 100, duration: float = 3, burst: int = 1) -> List[Dict]:
+    # 每次测量用新的事件循环，上一轮残留的任务不会影响下一轮
+    return [
+        asyncio.run(order_path_latency(rate, symbols, duration, burst, ingest))
+        for rate in rates
+        for ingest in (False, True)
+    ]
+
+
+def format_order_path(result: Dict) -> str:
+    latency = result['reply_ms']
+    return (
+        f"{'ingest' if result['ingest'] else 'inline':<6} offered {result['rate']:>8,.0f}/s published {result['published_rate']:>8,.0f}/s "
+        f"backlog {result['backlog']:>6} reply p50 {latency[50]:.3f}ms p99 {latency[99]:.3f}ms p99.9 {latency[99.9]:.3f}ms"
+    )
+
+
+async def run_step(manager: NatsManager, publish, generator: TickGenerator, rate: float, duration: float, burst: int = 1, sample_interval: float = 0.05) -> Dict:
+    """Offer `rate` msg/s in bursts of `burst` for `duration` seconds, then drain the queue."""
+    probe = LatencyProbe(generator)
+    queue = manager._queue
+    depths = []
+
+    async def sample():
+        while True:
+            depths.append(queue.qsize())
+            await asyncio.sleep(sample_interval)
+
+    sampler = asyncio.create_task(sample())
+    # 按消息数而不是墙钟截止时间结束一档：一次调度抖动不会让步长很短的一档整批丢失，
+    # 后面的批次会追上计划，只有持续跟不上才拉低发布速率
+    total = max(1, round(rate * duration / burst)) * burst
+    published = 0
+    start = time.perf_counter()
+    next_burst = start
+    while published < total:
+        for _ in range(burst):
+            subject, data = generator.next()
+            await publish(subject, data)
+            published += 1
+        next_burst += burst / rate
+        # 落后于计划时只让出一次事件循环
+        await asyncio.sleep(max(0.0, next_burst - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    end_depth = queue.qsize()
+    processed = published - end_depth
+
+    drain_start = time.perf_counter()
+    await queue.join()
+    drain = time.perf_counter() - drain_start
+    sampler.cancel()
+    probe.close()
+    generator.sent.clear()
+
+    latencies = np.array(probe.latencies) if probe.latencies else np.zeros(1)
+    return {
+        'rate': rate,
+        'published_rate': published / elapsed,
+        'processed_rate': processed / elapsed,
+        'queue_end': end_depth,
+        'queue_max': max(depths, default=0),
+        'queue_growth_per_s': end_depth / elapsed,
+        'drain_s': drain,
+        'ratio_changed': len(probe.latencies),
+        'latency_ms': {q: float(np.percentile(latencies, q)) for q in (50, 90, 99, 99.9)},
+    }
+
+
+def saturation_reason(result: Dict, tolerance: float = 0.95) -> str:
+    """Why a step counts as saturated, or '' if the pipeline kept up."""
+    # 发布端和消费端共用一个事件循环，发布跟不上计划速率说明整个进程已经满载
+    if result['published_rate'] < result['rate'] * tolerance:
+        return 'loop cannot publish at the offered rate'
+    if result['processed_rate'] < result['published_rate'] * tolerance:
+        return 'processing slower than publishing'
+    if result['queue_end'] > result['published_rate'] * 0.1:
+        return 'queue holds more than 0.1s of messages'
+    return ''
+
+
+async def find_saturation(rates: List[float], symbols: int = 100, duration: float = 3, burst: int = 1, nats_url: str = 'local', runtime: Runtime = None) -> Dict:
+    # 只测管道本身，窗口预热期间也发送ratio_changed
+    suppress_warmup, MarketDataStore.suppress_warmup = MarketDataStore.suppress_warmup, False
+    try:
+        return await _find_saturation(rates, symbols, duration, burst, nats_url, runtime)
+    finally:
+        MarketDataStore.suppress_warmup = suppress_warmup
+
+
+async def _find_saturation(rates: List[float], symbols: int, duration: float, burst: int, nats_url: str, runtime: Runtime) -> Dict:
+    manager = LoadNatsManager(nats_url)
+    await manager.subscribe()
+    if nats_url == 'local':
+        publish = manager.broker.publish
+    else:
+        publisher = await nats.connect(nats_url)
+        publish = publisher.publish
+
+    generator = TickGenerator(symbols)
+    if runtime is not None:
+        runtime.freeze()
+        if runtime.profile.idle_collect:
+            idle_collect = asyncio.create_task(runtime.run_idle_collect(lambda: not manager._queue.qsize()))
+    steps = []
+    sustained = 0
+    for rate in rates:
+        result = await run_step(manager, publish, generator, rate, duration, burst)
+        result['saturated'] = saturation_reason(result)
+        steps.append(result)
+        if result['saturated']:
+            break
+        sustained = rate
+    result = {'symbols': symbols, 'burst': burst, 'saturation_rate': sustained, 'steps': steps}
+    if runtime is not None:
+        if runtime.profile.idle_collect:
+            idle_collect.cancel()
+        result['runtime'] = runtime.report()
+    return result
+
+
+def format_step(result: Dict) -> str:
+    latency = result['latency_ms']
+    return (
+        f"offered {result['rate']:>8,.0f}/s published {result['published_rate']:>8,.0f}/s processed {result['processed_rate']:>8,.0f}/s "
+        f"queue max {result['queue_max']:>6} end {result['queue_end']:>6} drain {result['drain_s']:.3f}s "
+        f"latency p50 {latency[50]:.3f}ms p99 {latency[99]:.3f}ms p99.9 {latency[99.9]:.3f}ms"
+        f"{' SATURATED: ' + result['saturated'] if result['saturated'] else ''}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--rates', default='1000,2000,5000,10000,20000,50000', help='comma separated msg/s steps')
+    parser.add_argument('--duration', type=float, default=3, help='seconds per step')
+    parser.add_argument('--burst', type=int, default=1, help='messages published back to back per burst')
+    parser.add_argument('--nats-url', default='local', help="'local' for the in-process broker")
+    parser.add_argument('--runtime-profile', choices=list(PROFILES), default='default')
+    parser.add_argument('--order-path', action='store_true', help='measure order reply latency with and without the ingest thread')
+    parser.add_argument('--json', action='store_true', help='print the full result as JSON')
+    args = parser.parse_args(argv)
+
+    rates = [float(rate) for rate in args.rates.split(',')]
+    if args.order_path:
+        results = compare_order_path(rates, args.symbols, args.duration, args.burst)
+        if args.json:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+            return
+        for result in results:
+            print(format_order_path(result))
+        return
+    runtime = Runtime(args.runtime_profile)
+    runtime.apply()
+    result = asyncio.run(find_saturation(rates, args.symbols, args.duration, args.burst, args.nats_url, runtime))
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+    for step in result['steps']:
+        print(format_step(step))
+    for generation, pauses in result['runtime']['gc'].items():
+        print(f"gc {generation}: {pauses['count']} pauses, mean {pauses['mean']:.3f}ms, max {pauses['max']:.3f}ms")
+    print(f"{args.symbols} symbols, burst {args.burst}, runtime {args.runtime_profile}: sustained {result['saturation_rate']:,.0f} msg/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,10 @@
+import argparse
 import asyncio
 import uvloop
 
 
 from bot import Bot
+from runtime import PROFILES
 
 
 from configparser import ConfigParser
@@ -15,17 +17,27 @@ API_KEY = config['binance_2']['API_KEY']
 API_SECRET = config['binance_2']['SECRET']
 
 
-async def main():
+async def main(args):
     config = {
         'exchange_id': 'binance',
         'sandbox': False,
         'apiKey': API_KEY,
         'secret': API_SECRET, 
+        'runtime_profile': args.runtime_profile,
+        'cpus': [int(cpu) for cpu in args.cpus.split(',')] if args.cpus else None,
+        'nice': args.nice,
+        'ingest': args.ingest,
     }
     bot = Bot(config)
     await bot.run()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runtime-profile', choices=list(PROFILES), default='default')
+    parser.add_argument('--cpus', help='comma separated cpu ids to pin the process to')
+    parser.add_argument('--nice', type=int, help='process priority, negative values need privileges')
+    parser.add_argument('--ingest', action='store_true', help='decode market data on a separate thread')
+    args = parser.parse_args()
     uvloop.install()
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(args))
\ No newline at end of file
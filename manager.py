@@ -1,6 +1,9 @@
 import ssl
+import time
 import asyncio
-from typing import Literal, Union, Dict
+from functools import partial
+from typing import Literal, Union, Dict, List, Callable, Any, Mapping
+from urllib.parse import urlsplit
 
 
 import msgpack
@@ -9,51 +12,156 @@ from nats.aio.client import Client as NATS
 import ccxt.pro as ccxtpro
 
 
-from utils import amount_to_precision, price_to_precision
+from utils import amount_to_precision, price_to_precision, is_linear
 from utils import user_data_stream, parse_symbol, parse_order_status, parse_account_update
+from ratelimit import RateLimiter, PRIORITY_CANCEL, PRIORITY_ORDER, PRIORITY_INFO
+from orderbook import OrderBookManager
+from redundancy import FeedArbiter, book_ticker_key, user_data_key
+from fastrest import FastOrderClient, BASE_URLS, SANDBOX_URLS
+from fills import fill_store
+from metrics import metric_register
 from entity import context, log_register
-from entity import OrderResponse, MarketDataStore, EventSystem
+from entity import Context, OrderResponse, Position, MarketDataStore, EventSystem, OrderedDispatcher
+
+
+NATS_MESSAGES = metric_register.counter('nats_messages_total', 'NATS messages received per subject, before dedup', ('subject',))
+QUEUE_DEPTH = metric_register.gauge('queue_depth', 'Items waiting in an asyncio queue', ('queue',))
+ORDERS = metric_register.counter('orders_total', 'Order requests by outcome', ('outcome',))
+ORDERS_PLACED = ORDERS.labels('placed')
+ORDERS_REJECTED = ORDERS.labels('rejected')
+ORDERS_CANCELLED = ORDERS.labels('cancelled')
+ORDERS_CANCEL_FAILED = ORDERS.labels('cancel_failed')
 
 
 class NatsManager:
-    def __init__(self, nats_url = "nats://104.194.152.27:4222", cert_path = "./keys"):
+    """
+    bookTicker (and optional depth) from one or more NATS servers. Every url is a separate leg
+    subscribed to the same subjects; the first copy of each update wins and later copies are
+    dropped, so a dead leg costs nothing while the others are up. Each leg reconnects and
+    resubscribes on its own.
+    """
+    logger = log_register.get_logger('nats', level='INFO', flush=True)
+    connect_retry_wait = 1
+    
+    def __init__(self, nats_url: Union[str, List[str]] = "nats://104.194.152.27:4222", cert_path = "./keys"):
         self._nc = None
-        self._nats_url = nats_url
+        self._nats_urls = [nats_url] if isinstance(nats_url, str) else list(nats_url)
         self._cert_path = cert_path
         self._queue = asyncio.Queue()
+        self._connections: Dict[str, NATS] = {}
+        self._subscriptions: List = []
+        self._connected = asyncio.Event()
+        self.arbiter = FeedArbiter(len(self._nats_urls))
+        self.depth_arbiter = FeedArbiter(len(self._nats_urls))
+        self.disconnects: Dict[str, int] = {url: 0 for url in self._nats_urls}
+        QUEUE_DEPTH.labels('nats').set_function(self._queue.qsize)
     
-    async def _connect(self):
+    async def _connect(self, url: str) -> NATS:
         ssl_ctx = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH)
         ssl_ctx.load_cert_chain(certfile=f'{self._cert_path}/server-cert.pem',
                                 keyfile=f'{self._cert_path}/server-key.pem')
         ssl_ctx.check_hostname = False
         ssl_ctx.verify_mode = ssl.CERT_NONE
-        self._nc = await nats.connect(self._nats_url, tls=ssl_ctx)
+        
+        async def disconnected_cb():
+            self.disconnects[url] += 1
+            self.logger.error(f"NATS leg {url} disconnected")
+        
+        async def reconnected_cb():
+            self.logger.info(f"NATS leg {url} reconnected")
+        
+        # 客户端断线后自动重连并恢复已有订阅
+        return await nats.connect(
+            url, tls=ssl_ctx, max_reconnect_attempts=-1, reconnect_time_wait=0.5,
+            disconnected_cb=disconnected_cb, reconnected_cb=reconnected_cb,
+        )
+    
+    async def _run_leg(self, url: str):
+        while True:
+            try:
+                nc = await self._connect(url)
+                break
+            except Exception as e:
+                self.logger.error(f"Error connecting NATS leg {url}: {e}")
+                await asyncio.sleep(self.connect_retry_wait)
+        # 连接和订阅列表在同一步取得，之后新增的订阅由_subscribe补上
+        self._connections[url] = nc
+        self._nc = self._nc or nc
+        for subject, callback in list(self._subscriptions):
+            await nc.subscribe(subject, cb=partial(callback, url))
+        self._connected.set()
+    
+    async def _subscribe(self, subject: str, callback: Callable):
+        self._subscriptions.append((subject, callback))
+        for url, nc in list(self._connections.items()):
+            await nc.subscribe(subject, cb=partial(callback, url))
         
     async def subscribe(self):
-        await self._connect()
-        await self._nc.subscribe('binance.spot.bookTicker.*', cb=self._callback)
-        await self._nc.subscribe('binance.linear.bookTicker.*', cb=self._callback)
+        await self._subscribe('binance.spot.bookTicker.*', self._callback)
+        await self._subscribe('binance.linear.bookTicker.*', self._callback)
+        for url in self._nats_urls:
+            asyncio.create_task(self._run_leg(url))
         asyncio.create_task(self._process_queue())
+        # 任意一条腿连上即可开始
+        await self._connected.wait()
         
-    async def _callback(self, msg):
+    async def subscribe_depth(self, books: OrderBookManager):
+        # 可选的深度行情订阅，可在subscribe()之后调用
+        async def callback(url, msg):
+            data = msgpack.unpackb(msg.data)
+            if self.depth_arbiter.legs == 1 or self.depth_arbiter.accept(book_ticker_key(data), url, time.time() * 1000):
+                books.on_message(data)
+        await self._subscribe('binance.spot.depth.*', callback)
+        await self._subscribe('binance.linear.depth.*', callback)
+        
+    async def _callback(self, url, msg):
+        # 在入队前记录接收时间，避免把队列等待时间算进行情延迟
+        recv_ts = time.time() * 1000
+        NATS_MESSAGES.labels(msg.subject).inc()
         res = msgpack.unpackb(msg.data)
-        await self._queue.put(res)
+        if self.arbiter.legs > 1 and not self.arbiter.accept(book_ticker_key(res), url, recv_ts):
+            return
+        await self._queue.put((res, recv_ts, msg.subject))
     
     async def _process_queue(self):
         while True:
-            res = await self._queue.get()
-            await MarketDataStore.update(res)
+            res, recv_ts, subject = await self._queue.get()
+            await MarketDataStore.update(res, recv_ts, subject)
             self._queue.task_done()
     
+    def report(self) -> Dict[str, Dict]:
+        """Wins and lead time (ms) per leg, to decide which server to colocate with."""
+        report = self.arbiter.report()
+        for url in self._nats_urls:
+            report.setdefault(url, {'wins': 0, 'share': 0.0, 'lead_ewma': 0.0, 'lead_max': 0.0})['disconnects'] = self.disconnects[url]
+        return report
+    
     
+def url_family(url: str) -> Union[str, None]:
+    """Rate limit family of a Binance REST url; None for endpoints with their own limits (sapi, dapi)."""
+    path = urlsplit(url).path
+    if path.startswith('/fapi/'):
+        return 'linear'
+    if path.startswith('/api/'):
+        return 'spot'
+    return None
+
+
 class ExchangeManager:
     def __init__(self, config):
         self.config = config
         self.api = self._init_exchange()
         self._queue = asyncio.Queue()
+        self._dispatcher = OrderedDispatcher(EventSystem.emit, logger=log_register.error_logger)
+        self.rate_limit = RateLimiter()
+        self.user_data_arbiter = FeedArbiter(config.get('user_data_legs', 1))
+        # 账户池中每个账户的user data事件带后缀，由该账户自己的OrderManager和AccountManager处理
+        self.event_suffix = config.get('event_suffix', '')
+        QUEUE_DEPTH.labels('user_data' + self.event_suffix).set_function(self._queue.qsize)
         self.market = None
-    
+        # 下单和撤单的直连REST通道，在load_markets之后创建
+        self._fast: FastOrderClient = None
+
     def _init_exchange(self) -> Union[ccxtpro.Exchange, ccxtpro.binance]:
         try:
             exchange_class = getattr(ccxtpro, self.config['exchange_id'])
@@ -62,35 +170,114 @@ class ExchangeManager:
         
         api = exchange_class(self.config)
         api.set_sandbox_mode(self.config.get("sandbox", False))
-        api.enableRateLimit = True
-        
+        # 限频由RateLimiter负责，ccxt自带的节流会让请求等两次
+        api.enableRateLimit = False
+        on_rest_response = api.on_rest_response
+
+        def hook(code, reason, url, method, response_headers, response_body, request_headers, request_body):
+            self._on_response(url_family(url), code, response_headers)
+            return on_rest_response(code, reason, url, method, response_headers, response_body, request_headers, request_body)
+
+        api.on_rest_response = hook
         return api
+
+    @property
+    def fast(self) -> FastOrderClient:
+        return self._fast
+
+    @fast.setter
+    def fast(self, client: FastOrderClient):
+        if client is not None:
+            client.on_response = self._on_response
+        self._fast = client
+
+    def _on_response(self, family: Union[str, None], status: int, headers: Mapping):
+        # 每个响应用自己的响应头同步额度；last_response_headers被并发请求共享，可能属于另一个市场
+        if family not in self.rate_limit.budgets:
+            return
+        if status in (418, 429):
+            retry_after = headers.get('Retry-After') or headers.get('retry-after') or 60
+            self.rate_limit.block(family, float(retry_after))
+        self.rate_limit.sync(family, headers)
     
     async def load_markets(self) -> Dict:
         market = await self.api.load_markets()
         self.market = market
+        if self.config.get('fast_orders'):
+            base_urls = self.config.get('fast_order_urls') or (SANDBOX_URLS if self.config.get('sandbox') else BASE_URLS)
+            self.fast = FastOrderClient(self.config['apiKey'], self.config['secret'], market, base_urls)
         return market
     
     async def close(self) -> None:
+        if self.fast is not None:
+            await self.fast.close()
         await self.api.close()
     
+    async def request(
+        self,
+        family: Literal['spot', 'linear'],
+        method: str,
+        *args,
+        priority: int = PRIORITY_INFO,
+        weight: float = 1,
+        orders: int = 0,
+        client: Any = None,
+        **kwargs,
+    ):
+        """`client` replaces the ccxt client for this call, e.g. the `FastOrderClient` for order calls."""
+        api = client or self.api
+        await self.rate_limit.acquire(family, weight=weight, orders=orders, priority=priority)
+        # 响应头和429的Retry-After由响应钩子按各自的响应同步
+        return await getattr(api, method)(*args, **kwargs)
+    
+    def headroom(self, family: Literal['spot', 'linear'] = None) -> Dict:
+        return self.rate_limit.headroom(family)
+    
+    async def fetch_bids_asks(self, family: Literal['spot', 'linear']) -> Dict[str, Dict]:
+        # 不带symbol的bookTicker一次返回全部交易对，现货weight 4，合约weight 5
+        if family == 'spot':
+            return await self.request('spot', 'fetch_bids_asks', params={'type': 'spot'}, weight=4)
+        return await self.request('linear', 'fetch_bids_asks', params={'type': 'swap', 'subType': 'linear'}, weight=5)
+    
+    async def fetch_balance(self, family: Literal['spot', 'linear']) -> Dict:
+        if family == 'spot':
+            return await self.request('spot', 'fetch_balance', params={'type': 'spot'}, weight=20)
+        return await self.request('linear', 'fetch_balance', params={'type': 'future'}, weight=5)
+    
+    async def fetch_positions(self) -> List[Dict]:
+        return await self.request('linear', 'fetch_positions', params={'subType': 'linear'}, weight=5)
+    
     async def watch_user_data_stream(self) -> None:
-        asyncio.create_task(user_data_stream(typ='spot', api_key=self.config['apiKey'], queue=self._queue))
-        asyncio.create_task(user_data_stream(typ='linear', api_key=self.config['apiKey'], queue=self._queue))
+        # 每个市场开user_data_legs(默认1)条相同的websocket，先到的事件生效，只由第一条腿续期listen key
+        # user_data_urls: {family: (listen key url, stream url)}，默认连币安
+        urls = self.config.get('user_data_urls', {})
+        for typ in ('spot', 'linear'):
+            base_url, stream_url = urls.get(typ, (None, None))
+            for leg in range(self.user_data_arbiter.legs):
+                asyncio.create_task(user_data_stream(
+                    typ=typ, api_key=self.config['apiKey'], queue=self._queue, leg=f'{typ}-{leg}', keep_alive=leg == 0,
+                    base_url=base_url, stream_url=stream_url,
+                ))
         asyncio.create_task(self._process_queue())
     
     async def _process_queue(self):
         while True:
-            res = await self._queue.get()
-            if res['e'] == 'executionReport':
-                asyncio.create_task(EventSystem.emit('order_update', res, 'spot'))
-            elif res['e'] == 'ORDER_TRADE_UPDATE':
-                asyncio.create_task(EventSystem.emit('order_update', res, 'linear'))
-            elif res['e'] == 'ACCOUNT_UPDATE':
-                asyncio.create_task(EventSystem.emit('account_update', res, 'future'))
-            elif res['e'] == 'outboundAccountPosition':
-                asyncio.create_task(EventSystem.emit('account_update', res, 'spot'))
+            res, leg, recv_ts = await self._queue.get()
+            if self.user_data_arbiter.legs == 1 or self.user_data_arbiter.accept(user_data_key(res), leg, recv_ts):
+                self._dispatch(res)
             self._queue.task_done()
+
+    def _dispatch(self, res: Dict):
+        # 同一订单的事件进入同一个lane，保证PARTIALLY_FILLED一定先于FILLED处理
+        suffix = self.event_suffix
+        if res['e'] == 'executionReport':
+            self._dispatcher.submit(('spot', res['i']), 'order_update' + suffix, res, 'spot')
+        elif res['e'] == 'ORDER_TRADE_UPDATE':
+            self._dispatcher.submit(('linear', res['o']['i']), 'order_update' + suffix, res, 'linear')
+        elif res['e'] == 'ACCOUNT_UPDATE':
+            self._dispatcher.submit(('account', 'future'), 'account_update' + suffix, res, 'future')
+        elif res['e'] == 'outboundAccountPosition':
+            self._dispatcher.submit(('account', 'spot'), 'account_update' + suffix, res, 'spot')
     
     def amount_to_precision(self, symbol: str, amount: float, mode: Literal['round', 'ceil', 'floor'] = 'round') -> float:
         if self.market is None:
@@ -106,13 +293,63 @@ class ExchangeManager:
 class AccountManager:
     logger = log_register.get_logger('account', level='INFO', flush=True)
     
-    def __init__(self):
-        EventSystem.on('account_update', self._on_account_update)
-        EventSystem.on('position_update', self._on_position_update)
+    def __init__(self, ctx: Context = None, event_suffix: str = ''):
+        self.context = ctx or context
+        EventSystem.on('account_update' + event_suffix, self._on_account_update)
+        EventSystem.on('position_update' + event_suffix, self._on_position_update)
     
     def _on_account_update(self, res: Dict, typ: Literal['spot', 'future']):
-        parse_account_update(res, typ, context)
-        self.logger.info(f"Account Updated:\n {context.spot_account}\n {context.futures_account}")
+        parse_account_update(res, typ, self.context)
+        # INFO级别只记录本次更新的账户，完整的账户和持仓只在DEBUG级别格式化
+        if log_register.is_enabled(self.logger, 'DEBUG'):
+            self.logger.debug(f"Account Updated:\n {self.context.spot_account}\n {self.context.futures_account}")
+        elif log_register.is_enabled(self.logger, 'INFO'):
+            account = self.context.futures_account if typ == 'future' else self.context.spot_account
+            self.logger.info(f"Account Updated: {typ} USDT: {account.USDT} BNB: {account.BNB}")
+    
+    def reconcile(self, spot_balance: Dict = None, futures_balance: Dict = None, positions: List[Dict] = None) -> int:
+        """
+        Bring balances and linear positions in line with the exchange after a restart. Linear
+        positions reported by the exchange are authoritative; spot mismatches are only logged
+        because the spot wallet may hold coins outside of this bot. Returns the number of
+        positions corrected.
+        """
+        if spot_balance:
+            balances = [{'a': b['asset'], 'f': b['free']} for b in spot_balance['info']['balances']]
+            parse_account_update({'B': balances}, 'spot', self.context)
+        if futures_balance:
+            balances = [{'a': b['asset'], 'wb': b['walletBalance']} for b in futures_balance['info']['assets']]
+            parse_account_update({'a': {'B': balances}}, 'future', self.context)
+        
+        corrected = 0
+        if positions is not None:
+            exchange_positions = {}
+            for data in positions:
+                if data.get('contracts'):
+                    amount = data['contracts'] if data['side'] == 'long' else -data['contracts']
+                    exchange_positions[data['symbol']] = (amount, data.get('entryPrice') or 0.0, data.get('markPrice') or 0.0)
+            
+            for symbol in [symbol for symbol in self.context.position if is_linear(symbol) and symbol not in exchange_positions]:
+                self.logger.info(f"Position Reconciled: {symbol} {self.context.position[symbol].amount} -> 0")
+                del self.context.position[symbol]
+                corrected += 1
+            for symbol, (amount, entry_price, mark_price) in exchange_positions.items():
+                position = self.context.position.get(symbol)
+                if position is not None and abs(position.amount - amount) <= 1e-8:
+                    continue
+                self.logger.info(f"Position Reconciled: {symbol} {position.amount if position else 0} -> {amount}")
+                self.context.position[symbol] = Position(
+                    symbol=symbol, amount=amount, last_price=mark_price, avg_price=entry_price, total_cost=amount * entry_price,
+                )
+                corrected += 1
+            self.context.position.save_positions()
+        
+        if spot_balance:
+            total = spot_balance.get('total', {})
+            for symbol, position in self.context.position.items():
+                if not is_linear(symbol) and total.get(symbol.split('/')[0], 0) < position.amount - 1e-8:
+                    self.logger.info(f"Position Mismatch: {symbol} {position.amount} > balance {total.get(symbol.split('/')[0], 0)}")
+        return corrected
     
     def _on_position_update(self, order: OrderResponse):
         if order.side == 'buy':
@@ -120,16 +357,33 @@ class AccountManager:
         elif order.side == 'sell':
             amount = -order.last_filled
         
-        context.position.update(symbol=order.symbol, order_amount=amount, order_price=order.price)
-        self.logger.info(f"Position Updated:\n {context.position}")
+        self.context.position.update(symbol=order.symbol, order_amount=amount, order_price=order.price)
+        if log_register.is_enabled(self.logger, 'DEBUG'):
+            self.logger.debug(f"Position Updated:\n {self.context.position}")
+        elif log_register.is_enabled(self.logger, 'INFO'):
+            self.logger.info(f"Position Updated: {order.symbol} {self.context.position.get(order.symbol)}")
             
 
 class OrderManager:
     logger = log_register.get_logger('order', level='INFO', flush=True)
+    # Binance USDT-M batchOrders单次最多5个订单，现货没有批量下单接口
+    BATCH_ORDER_LIMIT = 5
     
-    def __init__(self, exchange: ExchangeManager):
+    position_event = 'position_update'
+    
+    def __init__(self, exchange: ExchangeManager, batch_window: float = 0.002):
         self._exchange = exchange
-        EventSystem.on('order_update', self._on_order_update)
+        self._batch_window = batch_window
+        self._batch: List = []
+        self._batch_handle: asyncio.TimerHandle = None
+        # 订单状态事件按client id路由到bot，不需要区分账户；持仓更新只属于下单的账户
+        suffix = getattr(exchange, 'event_suffix', '')
+        self.position_event = 'position_update' + suffix
+        EventSystem.on('order_update' + suffix, self._on_order_update)
+    
+    @staticmethod
+    def _family(symbol: str) -> Literal['spot', 'linear']:
+        return 'linear' if is_linear(symbol) else 'spot'
     
     async def _on_order_update(self, res: Dict, typ: Literal['spot', 'linear']):
         if typ == 'linear':
@@ -160,17 +414,32 @@ class OrderManager:
                 average = float(res['p']),
                 price = float(res['p'])
             )
+        fill_store.record_order(order)
         if order.status == 'new':
             await EventSystem.emit('new_order', order)
         elif order.status == 'partially_filled':
             await EventSystem.emit('partially_filled_order', order)
-            await EventSystem.emit('position_update', order)
+            await EventSystem.emit(self.position_event, order)
         elif order.status == 'filled':
             await EventSystem.emit('filled_order', order)
-            await EventSystem.emit('position_update', order)   
+            await EventSystem.emit(self.position_event, order)   
         elif order.status == 'canceled':
             await EventSystem.emit('canceled_order', order)
 
+    async def _create_order(self, symbol: str, **kwargs) -> OrderResponse:
+        # 配置了fast_orders时走直连REST客户端，直接返回OrderResponse；否则经ccxt下单再转换
+        fast = self._exchange.fast
+        res = await self._exchange.request(
+            self._family(symbol),
+            'create_order',
+            priority=PRIORITY_ORDER,
+            orders=1,
+            client=fast,
+            symbol=symbol,
+            **kwargs,
+        )
+        return res if fast is not None else self._parse_order(res)
+    
     async def place_limit_order(
         self,
         symbol: str,
@@ -182,44 +451,15 @@ class OrderManager:
     ) -> Union[OrderResponse, None]:
         try:
             if close_position:
-                res = await self._exchange.api.create_order(
-                    symbol=symbol,
-                    type='limit',
-                    side = side,
-                    amount = amount,
-                    price = price,
-                    params = {
-                        'reduceOnly': True,
-                        'clientOrderId': client_order_id
-                    }
-                )
+                params = {'reduceOnly': True, 'clientOrderId': client_order_id}
             else:
-                res = await self._exchange.api.create_order(
-                    symbol=symbol,
-                    type='limit',
-                    side = side,
-                    amount = amount,
-                    price = price,
-                    params = {
-                        'clientOrderId': client_order_id
-                    }
-                )
-            order_res = OrderResponse(
-                id = res['id'],
-                symbol = res['symbol'],
-                status = res['status'],
-                side = res['side'],
-                amount = res['amount'],
-                filled = res['filled'],
-                last_filled = 0,
-                remaining = res['remaining'],
-                client_order_id = res['clientOrderId'],
-                average = res['average'],
-                price = res['price']
-            )
+                params = {'clientOrderId': client_order_id}
+            order_res = await self._create_order(symbol, type='limit', side=side, amount=amount, price=price, params=params)
+            ORDERS_PLACED.inc()
             self.logger.info((f"Placed limit {side} order {order_res['id']} for {symbol} at {order_res['price']}: amount: {order_res['amount']}"))
             return order_res
         except Exception as e:
+            ORDERS_REJECTED.inc()
             self.logger.error(f"Error placing {side} limit order for {symbol} amount: {amount}: {e}")
             return None
     
@@ -233,63 +473,272 @@ class OrderManager:
     ) -> Union[OrderResponse, None]:
         try:
             if close_position:
-                res = await self._exchange.api.create_order(
-                    symbol=symbol,
-                    type='market',
-                    side = side,
-                    amount = amount,
-                    params = {
-                        'reduceOnly': True,
-                        'clientOrderId': client_order_id
-                    }
-                )
+                params = {'reduceOnly': True, 'clientOrderId': client_order_id}
             else:
-                res = await self._exchange.api.create_order(
-                    symbol=symbol,
-                    type='market',
-                    side = side,
-                    amount = amount,
-                    params = {
-                        'clientOrderId': client_order_id
-                    }
-                )
-            order_res = OrderResponse(
-                id = res['id'],
-                symbol = res['symbol'],
-                status = res['status'],
-                side = res['side'],
-                amount = res['amount'],
-                filled = res['filled'],
-                last_filled = 0,
-                remaining = res['remaining'],
-                client_order_id = res['clientOrderId'],
-                average = res['average'],
-                price= res['price']
-            )
+                params = {'clientOrderId': client_order_id}
+            order_res = await self._create_order(symbol, type='market', side=side, amount=amount, params=params)
+            ORDERS_PLACED.inc()
             self.logger.info((f"Placed market {side} order {order_res['id']} for {symbol} at average {order_res['average']}: amount: {order_res['amount']}"))
             return order_res
         except Exception as e:
+            ORDERS_REJECTED.inc()
             self.logger.error(f"Error placing {side} market order for {symbol} amount: {amount}: {e}")
             return None
             
     async def cancel_order(self, order_id: str, symbol: str) -> Union[OrderResponse, None]:
         try:
-            res = await self._exchange.api.cancel_order(id = order_id, symbol = symbol)
-            order_res = OrderResponse(
-                id = res['id'],
-                symbol = res['symbol'],
-                status = res['status'],
-                side = res['side'],
-                amount = res['amount'],
-                filled = res['filled'],
-                last_filled = 0,
-                remaining= res['remaining'],
-                client_order_id = res['clientOrderId'],
-                average = res['average'],
-                price = res['price']
+            fast = self._exchange.fast
+            res = await self._exchange.request(
+                self._family(symbol),
+                'cancel_order',
+                priority=PRIORITY_CANCEL,
+                client=fast,
+                id = order_id,
+                symbol = symbol,
             )
+            order_res = res if fast is not None else self._parse_order(res)
+            ORDERS_CANCELLED.inc()
             self.logger.info(f"Cancelled order {order_id} for {symbol}")
             return order_res
         except Exception as e:
+            ORDERS_CANCEL_FAILED.inc()
             self.logger.error(f"Error cancelling order {order_id} for {symbol}: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    @staticmethod
+    def _parse_order(res: Dict) -> OrderResponse:
+        return OrderResponse(
+            id = res['id'],
+            symbol = res['symbol'],
+            status = res['status'],
+            side = res['side'],
+            amount = res['amount'],
+            filled = res['filled'],
+            last_filled = 0,
+            remaining = res['remaining'],
+            client_order_id = res['clientOrderId'],
+            average = res['average'],
+            price = res['price']
+        )
+    
+    @staticmethod
+    def _order_request(order: Dict) -> Dict:
+        params = {'clientOrderId': order.get('client_order_id')}
+        if order.get('close_position'):
+            params['reduceOnly'] = True
+        return {
+            'symbol': order['symbol'],
+            'type': 'limit',
+            'side': order['side'],
+            'amount': order['amount'],
+            'price': order['price'],
+            'params': params,
+        }
+    
+    async def _place_chunk(self, chunk: List[Dict]) -> List[Union[OrderResponse, Exception]]:
+        requests = [self._order_request(order) for order in chunk]
+        try:
+            results = await self._exchange.request(
+                'linear',
+                'create_orders',
+                requests,
+                priority=PRIORITY_ORDER,
+                weight=5,
+                orders=len(requests),
+            )
+        except Exception as e:
+            return [e] * len(chunk)
+        
+        responses = []
+        for order, res in zip(chunk, results):
+            if res.get('id') is None:
+                info = res.get('info') or {}
+                responses.append(ccxtpro.ExchangeError(f"{info.get('code')} {info.get('msg')}"))
+            else:
+                responses.append(self._parse_order(res))
+        return responses
+    
+    async def _place_single(self, order: Dict) -> Union[OrderResponse, Exception]:
+        try:
+            return await self._create_order(**self._order_request(order))
+        except Exception as e:
+            return e
+    
+    async def place_orders_batch(self, orders: List[Dict]) -> List[Union[OrderResponse, Exception]]:
+        """
+        Place limit orders given as dicts with `symbol`, `side`, `amount`, `price` and optional
+        `close_position`/`client_order_id`. Linear orders go through the batch endpoint in chunks
+        of `BATCH_ORDER_LIMIT`; spot orders and single linear orders are sent one by one, since the
+        batch endpoint costs weight 5 and has no fast path. Results keep the input order.
+        """
+        results: List[Union[OrderResponse, Exception]] = [None] * len(orders)
+        linear = [i for i, order in enumerate(orders) if is_linear(order['symbol'])]
+        chunks = [linear[i:i + self.BATCH_ORDER_LIMIT] for i in range(0, len(linear), self.BATCH_ORDER_LIMIT)]
+        singles = [i for i, order in enumerate(orders) if not is_linear(order['symbol'])]
+        singles += [chunk[0] for chunk in chunks if len(chunk) == 1]
+        chunks = [chunk for chunk in chunks if len(chunk) > 1]
+        
+        chunk_results, single_results = await asyncio.gather(
+            asyncio.gather(*[self._place_chunk([orders[i] for i in chunk]) for chunk in chunks]),
+            asyncio.gather(*[self._place_single(orders[i]) for i in singles]),
+        )
+        for chunk, responses in zip(chunks, chunk_results):
+            for i, res in zip(chunk, responses):
+                results[i] = res
+        for i, res in zip(singles, single_results):
+            results[i] = res
+        
+        for order, res in zip(orders, results):
+            if isinstance(res, Exception):
+                ORDERS_REJECTED.inc()
+                self.logger.error(f"Error placing {order['side']} limit order for {order['symbol']} amount: {order['amount']}: {res}")
+            else:
+                ORDERS_PLACED.inc()
+                self.logger.info(f"Placed limit {res.side} order {res.id} for {res.symbol} at {res.price}: amount: {res.amount}")
+        return results
+    
+    async def place_limit_order_batched(
+        self,
+        symbol: str,
+        side: Literal['buy', 'sell'],
+        amount: float,
+        price: float,
+        close_position: bool = False,
+        client_order_id: str = None,
+    ) -> Union[OrderResponse, None]:
+        """Same as `place_limit_order`, but orders placed within `batch_window` are sent together."""
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((
+            {
+                'symbol': symbol,
+                'side': side,
+                'amount': amount,
+                'price': price,
+                'close_position': close_position,
+                'client_order_id': client_order_id,
+            },
+            future,
+        ))
+        if len(self._batch) >= self.BATCH_ORDER_LIMIT:
+            self._flush_batch()
+        elif self._batch_handle is None:
+            self._batch_handle = asyncio.get_running_loop().call_later(self._batch_window, self._flush_batch)
+        return await future
+    
+    def _flush_batch(self):
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._batch_handle = None
+        batch, self._batch = self._batch, []
+        if batch:
+            asyncio.create_task(self._send_batch(batch))
+    
+    async def _send_batch(self, batch: List):
+        try:
+            results = await self.place_orders_batch([order for order, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), res in zip(batch, results):
+            if not future.done():
+                future.set_result(None if isinstance(res, Exception) else res)
+
+
+class HedgeAggregator:
+    """
+    Coalesce hedge market orders per (symbol, side). Amounts collected within `window` are
+    sent as one order; a bucket is flushed early once it reaches `max_notional` or when a
+    `final` piece arrives, and held up to `max_wait` while it is below `min_notional`.
+    """
+    logger = log_register.get_logger('order', level='INFO', flush=True)
+    
+    def __init__(
+        self,
+        order: OrderManager,
+        window: float = 0.05,
+        max_notional: float = 100,
+        min_notional: float = 5,
+        max_wait: float = 1,
+        new_client_order_id: Callable[[str], str] = None,
+        on_rejected: Callable[[str], Any] = None,
+    ):
+        self._order = order
+        self._window = window
+        self._max_notional = max_notional
+        self._min_notional = min_notional
+        self._max_wait = max_wait
+        self._new_client_order_id = new_client_order_id
+        # 下单失败的对冲单不会有user data事件，由调用方释放为它登记的client id
+        self._on_rejected = on_rejected
+        self._buckets: Dict = {}
+        self.orders_sent = 0
+        self.fills_added = 0
+    
+    def _notional(self, symbol: str, side: Literal['buy', 'sell'], amount: float) -> float:
+        quote = MarketDataStore.quote.get(symbol)
+        if quote is None:
+            return 0
+        return amount * (quote.ask if side == 'buy' else quote.bid)
+    
+    def add(
+        self,
+        symbol: str,
+        side: Literal['buy', 'sell'],
+        amount: float,
+        callback: Callable[[float, float], Any],
+        final: bool = False,
+    ):
+        """`callback(filled, average)` receives this piece's pro-rata share of the combined fill."""
+        self.fills_added += 1
+        key = (symbol, side)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {'amount': 0, 'pieces': [], 'start': time.monotonic(), 'handle': None}
+        bucket['amount'] += amount
+        bucket['pieces'].append((amount, callback))
+        
+        if final or self._notional(symbol, side, bucket['amount']) >= self._max_notional:
+            self.flush(symbol, side)
+        elif bucket['handle'] is None:
+            bucket['handle'] = asyncio.get_running_loop().call_later(self._window, self._on_timer, key)
+    
+    def _on_timer(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        waited = time.monotonic() - bucket['start']
+        if self._notional(*key, bucket['amount']) < self._min_notional and waited < self._max_wait:
+            # 金额低于最小下单金额时继续攒单，直到max_wait
+            bucket['handle'] = asyncio.get_running_loop().call_later(
+                min(self._window, self._max_wait - waited), self._on_timer, key
+            )
+            return
+        self.flush(*key)
+    
+    def flush(self, symbol: str, side: Literal['buy', 'sell']):
+        bucket = self._buckets.pop((symbol, side), None)
+        if bucket is None:
+            return
+        if bucket['handle'] is not None:
+            bucket['handle'].cancel()
+        asyncio.create_task(self._send(symbol, side, bucket['amount'], bucket['pieces']))
+    
+    async def _send(self, symbol: str, side: Literal['buy', 'sell'], amount: float, pieces: List):
+        self.orders_sent += 1
+        client_order_id = self._new_client_order_id(symbol) if self._new_client_order_id else None
+        res = await self._order.place_market_order(
+            symbol=symbol,
+            side=side,
+            amount=amount,
+            client_order_id=client_order_id,
+        )
+        if res is None and client_order_id is not None and self._on_rejected is not None:
+            self._on_rejected(client_order_id)
+        filled = res['filled'] if res else 0
+        average = res['average'] if res else None
+        self.logger.info(f"[HEDGE] Symbol: {symbol} Side: {side} Pieces: {len(pieces)} Amount: {amount} Filled: {filled}")
+        for piece_amount, callback in pieces:
+            share = piece_amount * filled / amount if amount else 0
+            try:
+                callback(share, average)
+            except Exception as e:
+                self.logger.error(f"Error in hedge callback for {symbol}: {e}")
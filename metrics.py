@@ -0,0 +1,171 @@
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Dict, Tuple
+
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class CounterValue:
+    __slots__ = ['value']
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def get(self) -> float:
+        return self.value
+
+
+class GaugeValue:
+    """Either set directly or read from `function` at scrape time, which costs nothing on the hot path."""
+    __slots__ = ['value', 'function']
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class HistogramValue:
+    __slots__ = ['bounds', 'counts', 'sum', 'count']
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Prometheus的le是闭区间，bisect_left正好落在第一个>=value的桶
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    A metric family. Label values pick a child with `labels()`; keep the child around on hot
+    paths. Unlabeled families expose the child's methods directly. Everything runs on the
+    event loop thread, so plain attribute updates are enough and no locks are taken. Code on
+    other threads (the ingest thread, executor writes) keeps its own counts or returns its
+    timings, and the loop publishes them.
+    """
+    def __init__(self, name: str, help: str, kind: str, labelnames: Tuple[str, ...], factory: Callable):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[Tuple, object] = {}
+        if not self.labelnames:
+            child = self.labels()
+            for method in ('inc', 'dec', 'set', 'set_function', 'observe', 'get'):
+                if hasattr(child, method):
+                    setattr(self, method, getattr(child, method))
+
+    def labels(self, *values):
+        try:
+            return self._children[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._factory()
+            return child
+
+    def _label_text(self, values: Tuple, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self._children.items()):
+            if self.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(child.bounds, child.counts):
+                    cumulative += count
+                    le = self._label_text(values, f'le="{bound}"')
+                    lines.append(f'{self.name}_bucket{le} {cumulative}')
+                le = self._label_text(values, 'le="+Inf"')
+                lines.append(f'{self.name}_bucket{le} {child.count}')
+                lines.append(f'{self.name}_sum{self._label_text(values)} {child.sum}')
+                lines.append(f'{self.name}_count{self._label_text(values)} {child.count}')
+            else:
+                lines.append(f'{self.name}{self._label_text(values)} {child.get()}')
+        return '\n'.join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricRegister:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._server: asyncio.AbstractServer = None
+
+    def _get(self, name: str, help: str, kind: str, labelnames: Tuple[str, ...], factory: Callable) -> Metric:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Metric(name, help, kind, labelnames, factory)
+        elif metric.kind != kind:
+            raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Metric:
+        return self._get(name, help, 'counter', labelnames, CounterValue)
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Metric:
+        return self._get(name, help, 'gauge', labelnames, GaugeValue)
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Metric:
+        return self._get(name, help, 'histogram', labelnames, lambda: HistogramValue(buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        return '\n'.join(metric.render() for metric in list(self.metrics.values())) + '\n'
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 9108) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b'GET' and parts[1].split(b'?')[0] in (b'/metrics', b'/'):
+                body = self.render().encode()
+                status = b'200 OK'
+            else:
+                body = b'not found\n'
+                status = b'404 Not Found'
+            writer.write(
+                b'HTTP/1.1 ' + status + b'\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                + f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+metric_register = MetricRegister()
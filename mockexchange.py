@@ -0,0 +1,512 @@
+"""
+Local mock of the Binance spot and USDT-M endpoints the bot talks to: signed order placement
+and cancel, listen keys, book tickers and the user data websockets. Limit orders match against
+injected quotes, fills produce executionReport / ORDER_TRADE_UPDATE / ACCOUNT_UPDATE events.
+
+    python mockexchange.py --port 8765 --latency 0.002
+    curl -X POST localhost:8765/mock/quote -d '{"family": "linear", "symbol": "BTCUSDT", "bid": 100, "ask": 100.1}'
+
+Point a bot at it with `MockExchange.config()` (fast_order_urls, user_data_urls) and
+`route_ccxt()` for the ccxt client.
+"""
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import itertools
+from collections import deque
+from typing import Dict, List, Literal, Set, Tuple
+from urllib.parse import parse_qsl
+
+
+from aiohttp import web
+
+
+from fastrest import format_number
+from ratelimit import BINANCE_LIMITS
+
+
+ORDER_PATHS = {'/api/v3/order': 'spot', '/fapi/v1/order': 'linear'}
+LISTEN_KEY_PATHS = {'/api/v3/userDataStream': 'spot', '/fapi/v1/listenKey': 'linear'}
+BOOK_TICKER_PATHS = {'/api/v3/ticker/bookTicker': 'spot', '/fapi/v1/ticker/bookTicker': 'linear'}
+# 与币安文档一致的大致权重
+WEIGHTS = {'order': 1, 'listen_key': 2, 'book_ticker': {'spot': 4, 'linear': 5}, 'book_ticker_symbol': 2}
+QUOTE_ASSET = 'USDT'
+
+
+def error(code: int, msg: str, status: int = 400, headers: Dict = None) -> web.Response:
+    return web.json_response({'code': code, 'msg': msg}, status=status, headers=headers)
+
+
+class MockOrder:
+    __slots__ = ['family', 'symbol', 'id', 'client_order_id', 'side', 'type', 'price', 'quantity', 'executed', 'quote', 'status', 'reduce_only', 'time']
+
+    def __init__(self, family: str, symbol: str, id: int, client_order_id: str, side: str, type: str, price: float, quantity: float, reduce_only: bool):
+        self.family = family
+        self.symbol = symbol
+        self.id = id
+        self.client_order_id = client_order_id
+        self.side = side
+        self.type = type
+        self.price = price
+        self.quantity = quantity
+        self.executed = 0.0
+        self.quote = 0.0
+        self.status = 'NEW'
+        self.reduce_only = reduce_only
+        self.time = int(time.time() * 1000)
+
+    @property
+    def remaining(self) -> float:
+        return self.quantity - self.executed
+
+    @property
+    def average(self) -> float:
+        return self.quote / self.executed if self.executed else 0.0
+
+    def to_rest(self) -> Dict:
+        order = {
+            'symbol': self.symbol, 'orderId': self.id, 'clientOrderId': self.client_order_id,
+            'price': format_number(self.price), 'origQty': format_number(self.quantity), 'executedQty': format_number(self.executed),
+            'status': self.status, 'timeInForce': 'GTC', 'type': self.type, 'side': self.side,
+            'updateTime': int(time.time() * 1000), 'transactTime': self.time,
+        }
+        if self.family == 'linear':
+            order.update({'avgPrice': format_number(self.average), 'cumQuote': format_number(self.quote), 'reduceOnly': self.reduce_only})
+        else:
+            order['cummulativeQuoteQty'] = format_number(self.quote)
+        return order
+
+
+class Window:
+    """Fixed window counter, the way Binance resets its weight and order counts."""
+    __slots__ = ['limit', 'interval', 'header', 'start', 'used']
+
+    def __init__(self, limit: float, interval: float, header: str):
+        self.limit = limit
+        self.interval = interval
+        self.header = header
+        self.start = 0.0
+        self.used = 0.0
+
+    def add(self, amount: float, now: float) -> bool:
+        start = now - now % self.interval
+        if start != self.start:
+            self.start, self.used = start, 0.0
+        if self.used + amount > self.limit:
+            return False
+        self.used += amount
+        return True
+
+    def retry_after(self, now: float) -> int:
+        return int(self.start + self.interval - now) + 1
+
+
+class MockExchange:
+    """
+    In-process aiohttp server standing in for Binance. Orders are checked against the HMAC
+    `secret` and the `api_key` header. Market orders and crossing limit orders fill against the
+    injected quote as takers, resting limit orders fill at their price when `set_quote()` crosses
+    them, both limited by the quoted size. Every response and user data event is delayed by
+    `latency` seconds; request weight and order counts follow `limits` and exceed with a 429 and
+    Retry-After. `fail_status` answers every signed request with that status until reset.
+    """
+    def __init__(self, api_key: str = 'key', secret: str = 'secret', latency: float = 0.0, limits: Dict = BINANCE_LIMITS, balances: Dict[str, Dict[str, float]] = None):
+        self.api_key = api_key
+        self.secret = secret.encode()
+        self.latency = latency
+        self.fail_status = None
+        self.requests: deque = deque(maxlen=10000)
+        self.orders: Dict[int, MockOrder] = {}
+        self.quotes: Dict[Tuple[str, str], List[float]] = {}
+        self.balances = {'spot': {QUOTE_ASSET: 100000.0}, 'linear': {QUOTE_ASSET: 100000.0}}
+        for family, assets in (balances or {}).items():
+            self.balances[family].update(assets)
+        # 永续持仓: symbol -> [数量(带方向), 开仓均价]
+        self.positions: Dict[str, List[float]] = {}
+        self.listen_keys: Dict[str, str] = {}
+        self.keepalives = 0
+        self.windows = {
+            family: [Window(*limit['weight'])] + [Window(*orders) for orders in limit['orders']]
+            for family, limit in limits.items()
+        }
+        self._streams: Dict[str, Set[asyncio.Queue]] = {'spot': set(), 'linear': set()}
+        self._ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._runner: web.AppRunner = None
+        self._closing = False
+        self.base_url: str = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        for path in ORDER_PATHS:
+            app.router.add_route('*', path, self._order)
+        for path in LISTEN_KEY_PATHS:
+            app.router.add_route('*', path, self._listen_key)
+        for path in BOOK_TICKER_PATHS:
+            app.router.add_get(path, self._book_ticker)
+        app.router.add_get('/ws/{listen_key}', self._stream)
+        app.router.add_post('/mock/quote', self._inject_quote)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.base_url = f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+        return self.base_url
+
+    async def stop(self):
+        self._closing = True
+        self.disconnect()
+        # 先完成websocket的关闭握手，服务关闭后不再读取客户端的close帧
+        for _ in range(100):
+            if not any(self._streams.values()):
+                break
+            await asyncio.sleep(0.01)
+        await self._runner.cleanup()
+
+    def config(self) -> Dict:
+        """ExchangeManager config keys that route the fast order client and user data streams here."""
+        stream_url = self.base_url.replace('http', 'ws', 1) + '/ws/'
+        return {
+            'apiKey': self.api_key,
+            'secret': self.secret.decode(),
+            'fast_order_urls': {'spot': self.base_url, 'linear': self.base_url},
+            'user_data_urls': {
+                family: (self.base_url + path, stream_url) for path, family in LISTEN_KEY_PATHS.items()
+            },
+        }
+
+    # 限频
+
+    def _consume(self, family: str, weight: float, orders: int = 0) -> Tuple[Dict, web.Response]:
+        if family not in self.windows:
+            return {}, None
+        now = time.time()
+        weight_window, *order_windows = self.windows[family]
+        if not weight_window.add(weight, now):
+            return {}, error(-1003, 'Too many requests; current limit of IP is exceeded.', 429, {'Retry-After': str(weight_window.retry_after(now))})
+        headers = {weight_window.header.upper(): format_number(weight_window.used)}
+        for window in order_windows if orders else ():
+            if not window.add(orders, now):
+                return {}, error(-1015, 'Too many new orders.', 429, {'Retry-After': str(window.retry_after(now))})
+            headers[window.header.upper()] = format_number(window.used)
+        return headers, None
+
+    async def _respond(self, data, headers: Dict = None, status: int = 200) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response(data, status=status, headers=headers)
+
+    # 签名的下单和撤单
+
+    def _verify(self, request: web.Request, raw: str) -> Tuple[Dict, web.Response]:
+        if request.headers.get('X-MBX-APIKEY') != self.api_key:
+            return {}, error(-2015, 'Invalid API-key, IP, or permissions for action.', 401)
+        query, _, signature = raw.rpartition('&signature=')
+        if hmac.new(self.secret, query.encode(), hashlib.sha256).hexdigest() != signature:
+            return {}, error(-1022, 'Signature for this request is not valid.')
+        return dict(parse_qsl(query)), None
+
+    async def _order(self, request: web.Request) -> web.Response:
+        family = ORDER_PATHS[request.path]
+        raw = (await request.text()) if request.method == 'POST' else request.query_string
+        if request.method == 'POST' and request.query_string:
+            raw = f'{request.query_string}&{raw}' if raw else request.query_string
+        params, failure = self._verify(request, raw)
+        if failure is not None:
+            return failure
+        self.requests.append(dict(params, method=request.method, path=request.path))
+        if self.fail_status:
+            return error(-1003, 'Too many requests.', self.fail_status)
+        headers, failure = self._consume(family, WEIGHTS['order'], orders=1 if request.method == 'POST' else 0)
+        if failure is not None:
+            return failure
+        if request.method == 'DELETE':
+            order = self.cancel(family, params)
+            if order is None:
+                return error(-2011, 'Unknown order sent.')
+        elif request.method == 'POST':
+            order, failure = self.place(family, params)
+            if failure is not None:
+                return failure
+        else:
+            return error(-1000, f'Unsupported method {request.method}', 405)
+        return await self._respond(order.to_rest(), headers)
+
+    def place(self, family: str, params: Dict) -> Tuple[MockOrder, web.Response]:
+        symbol = params['symbol']
+        order_type = params['type']
+        if order_type not in ('LIMIT', 'MARKET'):
+            return None, error(-1116, 'Invalid orderType.')
+        if order_type == 'MARKET' and (family, symbol) not in self.quotes:
+            return None, error(-2010, 'No quote for symbol.')
+        order = MockOrder(
+            family, symbol, next(self._ids), params.get('newClientOrderId') or f'mock{next(self._ids)}', params['side'], order_type,
+            float(params.get('price') or 0), float(params['quantity']), params.get('reduceOnly') == 'true',
+        )
+        self._emit_order(order, 'NEW')
+        self._take(order)
+        if order.type == 'MARKET' and order.remaining > 1e-12:
+            # 盘口数量不足时剩余部分过期，和币安市价单一致
+            order.status = 'EXPIRED'
+            self._emit_order(order, 'EXPIRED')
+        elif order.status in ('NEW', 'PARTIALLY_FILLED'):
+            self.orders[order.id] = order
+        return order, None
+
+    def cancel(self, family: str, params: Dict) -> MockOrder:
+        order = self.orders.get(int(params['orderId'])) if params.get('orderId') else next(
+            (order for order in self.orders.values() if order.client_order_id == params.get('origClientOrderId')), None
+        )
+        if order is None or order.family != family:
+            return None
+        del self.orders[order.id]
+        order.status = 'CANCELED'
+        self._emit_order(order, 'CANCELED')
+        return order
+
+    # 撮合
+
+    def set_quote(self, family: Literal['spot', 'linear'], symbol: str, bid: float, ask: float, bid_qty: float = float('inf'), ask_qty: float = float('inf')):
+        """Inject a book ticker and fill resting limit orders it crosses, oldest first, at their own price."""
+        quote = self.quotes[(family, symbol)] = [bid, bid_qty, ask, ask_qty]
+        for order in sorted(self.orders.values(), key=lambda order: order.id):
+            if order.family != family or order.symbol != symbol:
+                continue
+            buy = order.side == 'BUY'
+            if (buy and order.price >= quote[2]) or (not buy and order.price <= quote[0]):
+                available = quote[3] if buy else quote[1]
+                amount = min(order.remaining, available)
+                if amount > 0:
+                    self._fill(order, amount, order.price, maker=True)
+                    quote[3 if buy else 1] -= amount
+            if order.status == 'FILLED':
+                del self.orders[order.id]
+
+    def _take(self, order: MockOrder):
+        quote = self.quotes.get((order.family, order.symbol))
+        if quote is None:
+            return
+        buy = order.side == 'BUY'
+        price, available = (quote[2], quote[3]) if buy else (quote[0], quote[1])
+        if order.type == 'LIMIT' and ((buy and order.price < price) or (not buy and order.price > price)):
+            return
+        amount = min(order.remaining, available)
+        if amount > 0:
+            self._fill(order, amount, price, maker=False)
+            quote[3 if buy else 1] -= amount
+
+    def _fill(self, order: MockOrder, amount: float, price: float, maker: bool):
+        order.executed += amount
+        order.quote += amount * price
+        order.status = 'FILLED' if order.remaining <= 1e-12 else 'PARTIALLY_FILLED'
+        signed = amount if order.side == 'BUY' else -amount
+        if order.family == 'spot':
+            balances = self.balances['spot']
+            base = order.symbol[:-len(QUOTE_ASSET)]
+            balances[base] = balances.get(base, 0.0) + signed
+            balances[QUOTE_ASSET] -= signed * price
+        else:
+            self._update_position(order.symbol, signed, price)
+        self._emit_order(order, 'TRADE', amount, price, maker)
+        self._emit_account(order)
+
+    def _update_position(self, symbol: str, signed: float, price: float):
+        position = self.positions.setdefault(symbol, [0.0, 0.0])
+        amount, entry = position
+        if amount == 0 or (amount > 0) == (signed > 0):
+            position[1] = (amount * entry + signed * price) / (amount + signed)
+        else:
+            closed = min(abs(signed), abs(amount))
+            # 减仓部分的已实现盈亏计入钱包余额
+            self.balances['linear'][QUOTE_ASSET] += closed * (price - entry) * (1 if amount > 0 else -1)
+            if abs(signed) > abs(amount):
+                position[1] = price
+        position[0] = amount + signed
+        if abs(position[0]) <= 1e-12:
+            position[0], position[1] = 0.0, 0.0
+
+    # user data
+
+    def _emit_order(self, order: MockOrder, execution: str, last: float = 0.0, last_price: float = 0.0, maker: bool = False):
+        now = int(time.time() * 1000)
+        trade_id = next(self._trade_ids) if execution == 'TRADE' else -1
+        if order.family == 'spot':
+            event = {
+                'e': 'executionReport', 'E': now, 's': order.symbol, 'c': order.client_order_id, 'S': order.side, 'o': order.type,
+                'f': 'GTC', 'q': format_number(order.quantity), 'p': format_number(order.price), 'x': execution, 'X': order.status,
+                'r': 'NONE', 'i': order.id, 'l': format_number(last), 'z': format_number(order.executed), 'L': format_number(last_price),
+                'n': '0', 'N': None, 'T': now, 't': trade_id, 'w': order.status in ('NEW', 'PARTIALLY_FILLED'), 'm': maker,
+                'O': order.time, 'Z': format_number(order.quote), 'Y': format_number(last * last_price), 'Q': '0',
+            }
+        else:
+            event = {
+                'e': 'ORDER_TRADE_UPDATE', 'E': now, 'T': now,
+                'o': {
+                    's': order.symbol, 'c': order.client_order_id, 'S': order.side, 'o': order.type, 'f': 'GTC',
+                    'q': format_number(order.quantity), 'p': format_number(order.price), 'ap': format_number(order.average), 'sp': '0',
+                    'x': execution, 'X': order.status, 'i': order.id, 'l': format_number(last), 'z': format_number(order.executed),
+                    'L': format_number(last_price), 'N': QUOTE_ASSET, 'n': '0', 'T': now, 't': trade_id, 'b': '0', 'a': '0', 'm': maker,
+                    'R': order.reduce_only, 'wt': 'CONTRACT_PRICE', 'ot': order.type, 'ps': 'BOTH', 'cp': False, 'rp': '0',
+                },
+            }
+        self.publish(order.family, event)
+
+    def _emit_account(self, order: MockOrder):
+        now = int(time.time() * 1000)
+        if order.family == 'spot':
+            base = order.symbol[:-len(QUOTE_ASSET)]
+            balances = self.balances['spot']
+            event = {
+                'e': 'outboundAccountPosition', 'E': now, 'u': now,
+                'B': [{'a': asset, 'f': format_number(balances.get(asset, 0.0)), 'l': '0'} for asset in (base, QUOTE_ASSET)],
+            }
+        else:
+            amount, entry = self.positions[order.symbol]
+            wallet = format_number(self.balances['linear'][QUOTE_ASSET])
+            event = {
+                'e': 'ACCOUNT_UPDATE', 'E': now, 'T': now,
+                'a': {
+                    'm': 'ORDER',
+                    'B': [{'a': QUOTE_ASSET, 'wb': wallet, 'cw': wallet, 'bc': '0'}],
+                    'P': [{'s': order.symbol, 'pa': format_number(amount), 'ep': format_number(entry), 'cr': '0', 'up': '0', 'mt': 'cross', 'iw': '0', 'ps': 'BOTH'}],
+                },
+            }
+        self.publish(order.family, event)
+
+    def publish(self, family: Literal['spot', 'linear'], event: Dict):
+        data = json.dumps(event)
+        loop = asyncio.get_running_loop()
+        for queue in self._streams[family]:
+            # 同样的延迟下call_later保持先后顺序
+            if self.latency:
+                loop.call_later(self.latency, queue.put_nowait, data)
+            else:
+                queue.put_nowait(data)
+
+    def disconnect(self, family: str = None):
+        """Close user data websockets, e.g. to exercise reconnects."""
+        for name, queues in self._streams.items():
+            if family is None or name == family:
+                for queue in queues:
+                    queue.put_nowait(None)
+
+    async def _stream(self, request: web.Request) -> web.WebSocketResponse:
+        family = self.listen_keys.get(request.match_info['listen_key'])
+        if family is None or self._closing:
+            return error(-1125, 'This listenKey does not exist.')
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        queue = asyncio.Queue()
+        self._streams[family].add(queue)
+        try:
+            while True:
+                data = await queue.get()
+                if data is None or ws.closed:
+                    break
+                await ws.send_str(data)
+        finally:
+            self._streams[family].discard(queue)
+            await ws.close()
+        return ws
+
+    async def _listen_key(self, request: web.Request) -> web.Response:
+        family = LISTEN_KEY_PATHS[request.path]
+        if request.headers.get('X-MBX-APIKEY') != self.api_key:
+            return error(-2015, 'Invalid API-key, IP, or permissions for action.', 401)
+        headers, failure = self._consume(family, WEIGHTS['listen_key'])
+        if failure is not None:
+            return failure
+        if request.method == 'POST':
+            listen_key = f'{family}{next(self._ids):060d}'
+            self.listen_keys[listen_key] = family
+            return await self._respond({'listenKey': listen_key}, headers)
+        listen_key = request.query.get('listenKey')
+        if listen_key not in self.listen_keys:
+            return error(-1125, 'This listenKey does not exist.')
+        if request.method == 'PUT':
+            self.keepalives += 1
+            return await self._respond({} if family == 'spot' else {'listenKey': listen_key}, headers)
+        if request.method == 'DELETE':
+            del self.listen_keys[listen_key]
+            return await self._respond({}, headers)
+        return error(-1000, f'Unsupported method {request.method}', 405)
+
+    # 行情
+
+    def book_ticker(self, family: str, symbol: str) -> Dict:
+        bid, bid_qty, ask, ask_qty = self.quotes[(family, symbol)]
+        ticker = {
+            'symbol': symbol, 'bidPrice': format_number(bid), 'bidQty': format_number(min(bid_qty, 1e9)),
+            'askPrice': format_number(ask), 'askQty': format_number(min(ask_qty, 1e9)),
+        }
+        if family == 'linear':
+            ticker['time'] = int(time.time() * 1000)
+        return ticker
+
+    async def _book_ticker(self, request: web.Request) -> web.Response:
+        family = BOOK_TICKER_PATHS[request.path]
+        symbol = request.query.get('symbol')
+        headers, failure = self._consume(family, WEIGHTS['book_ticker_symbol'] if symbol else WEIGHTS['book_ticker'][family])
+        if failure is not None:
+            return failure
+        if symbol is not None:
+            if (family, symbol) not in self.quotes:
+                return error(-1121, 'Invalid symbol.')
+            return await self._respond(self.book_ticker(family, symbol), headers)
+        return await self._respond([self.book_ticker(name, symbol) for name, symbol in self.quotes if name == family], headers)
+
+    async def _inject_quote(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        self.set_quote(
+            data['family'], data['symbol'], float(data['bid']), float(data['ask']),
+            float(data.get('bidQty', 'inf')), float(data.get('askQty', 'inf')),
+        )
+        return web.json_response(self.book_ticker(data['family'], data['symbol']))
+
+
+def route_ccxt(api, base_url: str):
+    """Send every ccxt REST call to `base_url`, keeping the paths."""
+    for name, url in list(api.urls['api'].items()):
+        if isinstance(url, str):
+            api.urls['api'][name] = base_url + url.split('.com', 1)[1]
+
+
+def local_market(symbol: str, market_id: str) -> Dict:
+    """Just enough of a ccxt market for binance.create_order/cancel_order and the precision helpers."""
+    linear = ':' in symbol
+    base, quote = symbol.split(':')[0].split('/')
+    return {
+        'id': market_id, 'symbol': symbol, 'base': base, 'quote': quote, 'baseId': base, 'quoteId': quote,
+        'settle': quote if linear else None, 'settleId': quote if linear else None,
+        'type': 'swap' if linear else 'spot', 'spot': not linear, 'margin': False, 'swap': linear, 'future': False,
+        'option': False, 'contract': linear, 'linear': True if linear else None, 'inverse': False if linear else None,
+        'contractSize': 1 if linear else None, 'active': True,
+        'precision': {'amount': 0.001, 'price': 0.01},
+        'limits': {'amount': {'min': 0.001, 'max': None}, 'price': {'min': None, 'max': None}, 'cost': {'min': None, 'max': None}, 'market': {'min': None, 'max': None}},
+        'info': {'symbol': market_id, 'filters': [], 'orderTypes': ['LIMIT', 'MARKET']},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--api-key', default='key')
+    parser.add_argument('--secret', default='secret')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response and user data event')
+    args = parser.parse_args(argv)
+
+    async def run():
+        exchange = MockExchange(args.api_key, args.secret, args.latency)
+        base_url = await exchange.start(args.host, args.port)
+        print(f"mock exchange on {base_url}, config: {json.dumps(exchange.config())}")
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import asyncio
+from array import array
+from collections import deque
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Literal, Tuple, Union, Callable, Awaitable
+
+
+from entity import log_register
+
+
+class PriceLadder:
+    """
+    One side of a book as two parallel `array('d')` sorted from best to worst. Bids are
+    stored as negative prices so both sides sort ascending and share the same bisect code.
+    Finding a level is O(log n); adding or removing one shifts the tail of the arrays, a
+    memmove of at most `max_levels` doubles, which is cheaper at book sizes than a balanced
+    tree in pure Python. `max_levels` bounds n.
+    """
+    __slots__ = ['side', '_sign', '_keys', '_sizes', 'max_levels']
+
+    def __init__(self, side: Literal['bid', 'ask'], max_levels: int = 5000):
+        self.side = side
+        self._sign = -1.0 if side == 'bid' else 1.0
+        self._keys = array('d')
+        self._sizes = array('d')
+        self.max_levels = max_levels
+
+    def set(self, price: float, size: float):
+        key = price * self._sign
+        keys = self._keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            if size > 0:
+                self._sizes[i] = size
+            else:
+                del keys[i]
+                del self._sizes[i]
+        elif size > 0:
+            keys.insert(i, key)
+            self._sizes.insert(i, size)
+            if len(keys) > self.max_levels:
+                # 只保留最优的max_levels档，远端价位对成交价影响可以忽略
+                del keys[-1]
+                del self._sizes[-1]
+
+    def clear(self):
+        del self._keys[:]
+        del self._sizes[:]
+
+    def best(self) -> Union[Tuple[float, float], None]:
+        if not self._keys:
+            return None
+        return self._keys[0] * self._sign, self._sizes[0]
+
+    def vwap(self, notional: float) -> Union[Tuple[float, float], None]:
+        """Average price and amount to fill `notional` quote currency, or None if the book is too thin or `notional` is not positive."""
+        if notional <= 0:
+            return None
+        cost = 0.0
+        amount = 0.0
+        sign = self._sign
+        for key, size in zip(self._keys, self._sizes):
+            price = key * sign
+            level_cost = price * size
+            if cost + level_cost >= notional:
+                remaining = (notional - cost) / price
+                amount += remaining
+                return notional / amount, amount
+            cost += level_cost
+            amount += size
+        return None
+
+    def depth_within(self, ticks: int, tick_size: float) -> float:
+        """Total size resting within `ticks` ticks of the best price, inclusive."""
+        if not self._keys:
+            return 0.0
+        bound = self._keys[0] + ticks * tick_size + tick_size * 1e-6
+        return sum(self._sizes[:bisect_right(self._keys, bound)])
+
+    def levels(self, n: int = None) -> List[Tuple[float, float]]:
+        n = len(self._keys) if n is None else n
+        return [(key * self._sign, size) for key, size in zip(self._keys[:n], self._sizes[:n])]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class OrderBook:
+    """
+    L2 book kept in sync from Binance diff depth updates (`U`/`u`/`pu`) on top of a REST
+    snapshot. Partial depth payloads carrying `lastUpdateId` are applied as snapshots.
+    """
+    def __init__(self, symbol: str, max_levels: int = 5000):
+        self.symbol = symbol
+        self.bids = PriceLadder('bid', max_levels)
+        self.asks = PriceLadder('ask', max_levels)
+        self.last_update_id = 0
+        self.synced = False
+        self.gaps = 0
+        self._first = False
+        self._buffer = deque(maxlen=1000)
+
+    def apply_snapshot(self, last_update_id: int, bids: List, asks: List):
+        self.bids.clear()
+        self.asks.clear()
+        for price, size in bids:
+            self.bids.set(float(price), float(size))
+        for price, size in asks:
+            self.asks.set(float(price), float(size))
+        self.last_update_id = last_update_id
+        self.synced = True
+        self._first = True
+        buffered, self._buffer = self._buffer, deque(maxlen=self._buffer.maxlen)
+        for data in buffered:
+            if data['u'] > last_update_id:
+                self.apply_diff(data)
+
+    def apply_diff(self, data: Dict) -> bool:
+        if not self.synced:
+            self._buffer.append(data)
+            return False
+        first_id, final_id = data['U'], data['u']
+        if final_id <= self.last_update_id:
+            return False
+
+        if self._first:
+            # 快照后的第一条：现货要求U <= lastUpdateId+1 <= u，合约要求U <= lastUpdateId <= u
+            in_sequence = first_id <= self.last_update_id + 1 and final_id >= self.last_update_id
+        elif 'pu' in data:
+            in_sequence = data['pu'] == self.last_update_id
+        else:
+            in_sequence = first_id == self.last_update_id + 1
+        if not in_sequence:
+            self.gaps += 1
+            self.synced = False
+            self._buffer.append(data)
+            return False
+
+        for price, size in data['b']:
+            self.bids.set(float(price), float(size))
+        for price, size in data['a']:
+            self.asks.set(float(price), float(size))
+        self.last_update_id = final_id
+        self._first = False
+        return True
+
+    def apply(self, data: Dict) -> bool:
+        if 'lastUpdateId' in data:
+            self.apply_snapshot(data['lastUpdateId'], data.get('bids', data.get('b', [])), data.get('asks', data.get('a', [])))
+            return True
+        return self.apply_diff(data)
+
+    def vwap(self, side: Literal['buy', 'sell'], notional: float) -> Union[Tuple[float, float], None]:
+        # 买入吃ask，卖出吃bid
+        return (self.asks if side == 'buy' else self.bids).vwap(notional)
+
+    def depth_within(self, side: Literal['bid', 'ask'], ticks: int, tick_size: float) -> float:
+        return (self.bids if side == 'bid' else self.asks).depth_within(ticks, tick_size)
+
+
+class OrderBookManager:
+    """
+    Books per symbol. A gap marks the book unsynced and schedules one `fetch_snapshot(symbol)`,
+    which must return a ccxt order book (`nonce` is Binance's lastUpdateId).
+    """
+    logger = log_register.get_logger('orderbook', level='INFO', flush=True)
+
+    def __init__(self, fetch_snapshot: Callable[[str], Awaitable[Dict]] = None, max_levels: int = 5000):
+        self.books: Dict[str, OrderBook] = {}
+        self._fetch_snapshot = fetch_snapshot
+        self._max_levels = max_levels
+        self._resyncing: Dict[str, asyncio.Task] = {}
+
+    def book(self, symbol: str) -> OrderBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol, self._max_levels)
+        return book
+
+    def on_message(self, data: Dict):
+        symbol = data['s']
+        book = self.book(symbol)
+        book.apply(data)
+        if not book.synced and symbol not in self._resyncing and self._fetch_snapshot is not None:
+            self._resyncing[symbol] = asyncio.create_task(self.resync(symbol))
+
+    async def resync(self, symbol: str):
+        try:
+            snapshot = await self._fetch_snapshot(symbol)
+            self.book(symbol).apply_snapshot(snapshot['nonce'], snapshot['bids'], snapshot['asks'])
+            self.logger.info(f"Resynced {symbol} order book at {snapshot['nonce']}")
+        except Exception as e:
+            self.logger.error(f"Error resyncing {symbol} order book: {e}")
+        finally:
+            self._resyncing.pop(symbol, None)
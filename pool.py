@@ -0,0 +1,218 @@
+import asyncio
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Literal, Union
+
+
+from entity import Context, EventSystem, OrderResponse, Position
+from manager import AccountManager, ExchangeManager, OrderManager
+from utils import linear_2_spot, spot_2_linear
+
+
+class PooledAccount:
+    """One sub-account: its own ccxt client and rate budget, user data stream, `Context` and managers."""
+    def __init__(self, name: str, exchange: ExchangeManager, directory: Path):
+        self.name = name
+        self.exchange = exchange
+        self.context = Context(directory)
+        self.order = OrderManager(exchange)
+        self.account = AccountManager(self.context, exchange.event_suffix)
+        # 分配到该账户的交易对，现货和永续共用一个key，保证对冲落在同一账户
+        self.pairs = set()
+
+    def headroom(self) -> float:
+        """Smallest remaining fraction over all weight and order-count budgets."""
+        return min(value for family in self.exchange.headroom().values() for value in family.values())
+
+    def load(self) -> int:
+        rate_limit = self.exchange.rate_limit
+        return len(self.pairs) + sum(rate_limit.pending(family) for family in rate_limit.budgets)
+
+    def holds(self, pair: str) -> bool:
+        position = self.context.position
+        return pair in position or spot_2_linear(pair) in position
+
+
+class PositionView(Mapping):
+    """Read-only sum of every account's positions, so strategy code can keep using `symbol in positions`."""
+    def __init__(self, accounts: Callable[[], List[PooledAccount]]):
+        self._accounts = accounts
+
+    def __getitem__(self, symbol: str) -> Position:
+        found = [account.context.position[symbol] for account in self._accounts() if symbol in account.context.position]
+        if not found:
+            raise KeyError(symbol)
+        if len(found) == 1:
+            return found[0]
+        amount = sum(position.amount for position in found)
+        total_cost = sum(position.total_cost for position in found)
+        return Position(
+            symbol=symbol,
+            amount=amount,
+            last_price=found[-1].last_price,
+            avg_price=total_cost / amount if amount else 0,
+            total_cost=total_cost,
+        )
+
+    def __contains__(self, symbol) -> bool:
+        return any(symbol in account.context.position for account in self._accounts())
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for account in self._accounts():
+            for symbol in account.context.position:
+                if symbol not in seen:
+                    seen.add(symbol)
+                    yield symbol
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class AccountPool:
+    """
+    Spreads order traffic over several sub-accounts so each pair only uses one account's
+    order-rate and weight limits. A pair is routed to the least loaded account with enough
+    budget left and stays there while that account holds a position in it; orders are
+    cancelled on the account that placed them. Exposes the `OrderManager` order methods, so
+    it can stand in for one in the bot and the `HedgeAggregator`.
+    """
+    logger = OrderManager.logger
+
+    def __init__(
+        self,
+        config: Dict,
+        accounts: List[Dict],
+        directory: Path = Path('.context') / 'accounts',
+        min_headroom: float = 0.2,
+        exchange_factory: Callable[[Dict], ExchangeManager] = ExchangeManager,
+    ):
+        if not accounts:
+            raise ValueError("AccountPool needs at least one account")
+        self.min_headroom = min_headroom
+        self.accounts: Dict[str, PooledAccount] = {}
+        for i, account_config in enumerate(accounts):
+            name = account_config.get('name', str(i))
+            exchange = exchange_factory({
+                **{key: value for key, value in config.items() if key != 'accounts'},
+                **account_config,
+                'event_suffix': f'@{name}',
+            })
+            self.accounts[name] = PooledAccount(name, exchange, Path(directory) / name)
+        self.primary = next(iter(self.accounts.values()))
+        self.positions = PositionView(lambda: list(self.accounts.values()))
+        self._routes: Dict[str, PooledAccount] = {}
+        self._orders: Dict[str, PooledAccount] = {}
+        EventSystem.on('filled_order', self._forget)
+        EventSystem.on('canceled_order', self._forget)
+
+    def account_for(self, symbol: str) -> PooledAccount:
+        pair = linear_2_spot(symbol)
+        account = self._routes.get(pair)
+        if account is not None and (account.holds(pair) or account.headroom() >= self.min_headroom):
+            return account
+        # 预算充足的账户优先，其次负载最低，最后剩余预算最多
+        best = max(self.accounts.values(), key=lambda a: (a.headroom() >= self.min_headroom, -a.load(), a.headroom()))
+        if best is not account:
+            if account is not None:
+                account.pairs.discard(pair)
+                self.logger.info(f"[POOL] {pair} moved from {account.name} to {best.name}, headroom: {account.headroom():.2f}")
+            best.pairs.add(pair)
+            self._routes[pair] = best
+        return best
+
+    def _remember(self, account: PooledAccount, res: Union[OrderResponse, None]) -> Union[OrderResponse, None]:
+        # REST返回的id是字符串，user data事件里是整数，统一按字符串记录
+        if res is not None:
+            self._orders[str(res['id'])] = account
+        return res
+
+    def _forget(self, order: OrderResponse):
+        self._orders.pop(str(order.id), None)
+
+    async def place_limit_order(
+        self,
+        symbol: str,
+        side: Literal['buy', 'sell'],
+        amount: float,
+        price: float,
+        close_position: bool = False,
+        client_order_id: str = None,
+    ) -> Union[OrderResponse, None]:
+        account = self.account_for(symbol)
+        return self._remember(account, await account.order.place_limit_order(symbol, side, amount, price, close_position, client_order_id))
+
+    async def place_limit_order_batched(
+        self,
+        symbol: str,
+        side: Literal['buy', 'sell'],
+        amount: float,
+        price: float,
+        close_position: bool = False,
+        client_order_id: str = None,
+    ) -> Union[OrderResponse, None]:
+        account = self.account_for(symbol)
+        return self._remember(account, await account.order.place_limit_order_batched(symbol, side, amount, price, close_position, client_order_id))
+
+    async def place_market_order(
+        self,
+        symbol: str,
+        side: Literal['buy', 'sell'],
+        amount: float,
+        close_position: bool = False,
+        client_order_id: str = None,
+    ) -> Union[OrderResponse, None]:
+        return await self.account_for(symbol).order.place_market_order(symbol, side, amount, close_position, client_order_id)
+
+    async def cancel_order(self, order_id: str, symbol: str) -> Union[OrderResponse, None]:
+        account = self._orders.pop(str(order_id), None) or self.account_for(symbol)
+        return await account.order.cancel_order(order_id, symbol)
+
+    async def load_markets(self) -> Dict:
+        markets = await asyncio.gather(*[account.exchange.load_markets() for account in self.accounts.values()])
+        return markets[0]
+
+    async def watch_user_data_stream(self):
+        for account in self.accounts.values():
+            await account.exchange.watch_user_data_stream()
+
+    async def close(self):
+        await asyncio.gather(*[account.exchange.close() for account in self.accounts.values()])
+
+    async def reconcile(self) -> int:
+        """Fetch balances and positions of every account in parallel and reconcile each `Context`."""
+        async def reconcile_account(account: PooledAccount) -> int:
+            results = await asyncio.gather(
+                account.exchange.fetch_balance('spot'),
+                account.exchange.fetch_balance('linear'),
+                account.exchange.fetch_positions(),
+                return_exceptions=True,
+            )
+            for name, result in zip(('spot balance', 'futures balance', 'positions'), results):
+                if isinstance(result, Exception):
+                    self.logger.error(f"[POOL] Error fetching {name} of {account.name}: {result}")
+            return account.account.reconcile(*[None if isinstance(result, Exception) else result for result in results])
+
+        return sum(await asyncio.gather(*[reconcile_account(account) for account in self.accounts.values()]))
+
+    def balances(self, typ: Literal['spot', 'future']) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for account in self.accounts.values():
+            balance = account.context.futures_account if typ == 'future' else account.context.spot_account
+            for asset in balance.keys():
+                totals[asset] = totals.get(asset, 0) + balance[asset]
+        return totals
+
+    def queued(self) -> int:
+        return sum(account.exchange._queue.qsize() for account in self.accounts.values())
+
+    def report(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                'pairs': len(account.pairs),
+                'headroom': account.headroom(),
+                'positions': len(account.context.position),
+                'user_data': account.exchange.user_data_arbiter.report(),
+            }
+            for name, account in self.accounts.items()
+        }
@@ -0,0 +1,168 @@
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Dict, List, Literal, Mapping, Tuple
+
+
+PRIORITY_CANCEL = 0
+PRIORITY_ORDER = 1
+PRIORITY_INFO = 2
+
+
+# (limit, interval seconds, header)，参考Binance的REQUEST_WEIGHT和ORDERS限制
+BINANCE_LIMITS = {
+    'spot': {
+        'weight': (6000, 60, 'x-mbx-used-weight-1m'),
+        'orders': [
+            (100, 10, 'x-mbx-order-count-10s'),
+            (200000, 86400, 'x-mbx-order-count-1d'),
+        ],
+    },
+    'linear': {
+        'weight': (2400, 60, 'x-mbx-used-weight-1m'),
+        'orders': [
+            (300, 10, 'x-mbx-order-count-10s'),
+            (1200, 60, 'x-mbx-order-count-1m'),
+        ],
+    },
+}
+
+
+class TokenBucket:
+    __slots__ = ['capacity', 'rate', 'tokens', 'updated']
+
+    def __init__(self, capacity: float, interval: float):
+        self.capacity = capacity
+        self.rate = capacity / interval
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float = None) -> float:
+        self._refill(now or time.monotonic())
+        return self.tokens
+
+    def wait_time(self, amount: float, reserve: float = 0, now: float = None) -> float:
+        missing = amount + reserve - self.available(now)
+        return max(missing / self.rate, 0)
+
+    def consume(self, amount: float):
+        self.tokens -= amount
+
+    def sync_used(self, used: float, now: float = None):
+        # 以交易所返回的已用额度为准，只会收紧本地估计
+        self._refill(now or time.monotonic())
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class EndpointBudget:
+    def __init__(self, family: str, weight: Tuple, orders: List[Tuple], reserve_ratio: float = 0.1):
+        self.family = family
+        limit, interval, header = weight
+        self.weight = TokenBucket(limit, interval)
+        self.orders = [TokenBucket(limit, interval) for limit, interval, _ in orders]
+        self.headers = {header: self.weight}
+        self.headers.update({header: bucket for (_, _, header), bucket in zip(orders, self.orders)})
+        self.reserve_ratio = reserve_ratio
+        self.blocked_until = 0.0
+
+    def wait_time(self, weight: float, orders: int, priority: int) -> float:
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        # 信息类请求需要给撤单和下单留出余量
+        ratio = self.reserve_ratio if priority >= PRIORITY_INFO else 0
+        wait = self.weight.wait_time(weight, self.weight.capacity * ratio, now)
+        if orders:
+            for bucket in self.orders:
+                wait = max(wait, bucket.wait_time(orders, bucket.capacity * ratio, now))
+        return wait
+
+    def consume(self, weight: float, orders: int):
+        self.weight.consume(weight)
+        if orders:
+            for bucket in self.orders:
+                bucket.consume(orders)
+
+    def headroom(self) -> Dict[str, float]:
+        now = time.monotonic()
+        return {header: bucket.available(now) / bucket.capacity for header, bucket in self.headers.items()}
+
+
+class RateLimiter:
+    """
+    Local request-weight and order-count budgets per endpoint family. Requests that
+    don't fit the budget wait in a priority queue: cancels, then new orders, then
+    informational calls.
+    """
+    def __init__(self, limits: Dict = BINANCE_LIMITS, reserve_ratio: float = 0.1):
+        self.budgets: Dict[str, EndpointBudget] = {
+            family: EndpointBudget(family, limit['weight'], limit['orders'], reserve_ratio)
+            for family, limit in limits.items()
+        }
+        self._waiters: Dict[str, List] = {family: [] for family in self.budgets}
+        self._pumps: Dict[str, asyncio.Task] = {}
+        self._seq = itertools.count()
+
+    async def acquire(
+        self,
+        family: Literal['spot', 'linear'],
+        weight: float = 1,
+        orders: int = 0,
+        priority: int = PRIORITY_INFO,
+    ):
+        budget = self.budgets[family]
+        waiters = self._waiters[family]
+        if not waiters and budget.wait_time(weight, orders, priority) == 0:
+            budget.consume(weight, orders)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(waiters, (priority, next(self._seq), weight, orders, future))
+        pump = self._pumps.get(family)
+        if pump is None or pump.done():
+            self._pumps[family] = asyncio.create_task(self._pump(family))
+        await future
+
+    async def _pump(self, family: str):
+        budget = self.budgets[family]
+        waiters = self._waiters[family]
+        while waiters:
+            priority, _, weight, orders, future = waiters[0]
+            if future.done():
+                heapq.heappop(waiters)
+                continue
+            wait = budget.wait_time(weight, orders, priority)
+            if wait > 0:
+                # 等待期间可能有更高优先级的请求插队，因此醒来后重新检查堆顶
+                await asyncio.sleep(min(wait, 0.05))
+                continue
+            heapq.heappop(waiters)
+            budget.consume(weight, orders)
+            future.set_result(None)
+
+    def sync(self, family: str, headers: Mapping):
+        if not headers:
+            return
+        budget = self.budgets[family]
+        for key, value in headers.items():
+            bucket = budget.headers.get(key.lower())
+            if bucket is not None:
+                bucket.sync_used(float(value))
+
+    def block(self, family: str, seconds: float):
+        """Stop all requests of a family, e.g. after a 429 with Retry-After."""
+        budget = self.budgets[family]
+        budget.blocked_until = max(budget.blocked_until, time.monotonic() + seconds)
+
+    def headroom(self, family: str = None) -> Dict:
+        if family:
+            return self.budgets[family].headroom()
+        return {family: budget.headroom() for family, budget in self.budgets.items()}
+
+    def pending(self, family: str) -> int:
+        return len(self._waiters[family])
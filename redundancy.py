@@ -0,0 +1,75 @@
+import json
+from collections import OrderedDict, defaultdict
+from typing import Dict, Hashable, Optional
+
+
+from entity import FeedLag
+
+
+def book_ticker_key(data: Dict) -> Optional[Hashable]:
+    # bookTicker的u在同一symbol内单调递增；没有u时报价内容相同也可能是A→B→A的真实回跳，不做去重
+    if data.get('u'):
+        return data['s'], data['u']
+    return None
+
+
+def user_data_key(res: Dict) -> Hashable:
+    # 同一订单的NEW/CANCELED等事件trade id都是-1，需要带上执行类型和状态区分
+    if res['e'] == 'executionReport':
+        return 'spot', res['i'], res['t'], res['x'], res['X']
+    if res['e'] == 'ORDER_TRADE_UPDATE':
+        order = res['o']
+        return 'linear', order['i'], order['t'], order['x'], order['X']
+    # 账户类事件没有唯一序号，同一毫秒内可能有多条不同的更新；各条腿上的副本内容相同，按整条内容去重
+    return res['e'], json.dumps(res, sort_keys=True)
+
+
+class FeedArbiter:
+    """
+    First-arrival dedup across redundant legs of the same feed. The first copy of a key is let
+    through and credited to its leg; later copies are dropped and measure how far the winning
+    leg was ahead. A key is forgotten once every leg has delivered it, or after `max_keys`
+    newer keys when a leg is down. A None key cannot be deduplicated and is always let through.
+    """
+    def __init__(self, legs: int, max_keys: int = 100000):
+        self.legs = legs
+        self.max_keys = max_keys
+        self.wins: Dict[Hashable, int] = defaultdict(int)
+        self.lead: Dict[Hashable, FeedLag] = defaultdict(FeedLag)
+        self.duplicates = 0
+        self.unkeyed = 0
+        self._seen: OrderedDict = OrderedDict()
+
+    def accept(self, key: Optional[Hashable], leg: Hashable, ts: float) -> bool:
+        if key is None:
+            self.unkeyed += 1
+            return True
+        seen = self._seen.get(key)
+        if seen is None:
+            self._seen[key] = [leg, ts, 1]
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+            self.wins[leg] += 1
+            return True
+
+        self.duplicates += 1
+        winner, first_ts, arrivals = seen
+        if leg != winner:
+            self.lead[winner].record(ts - first_ts)
+        if arrivals + 1 >= self.legs:
+            del self._seen[key]
+        else:
+            seen[2] = arrivals + 1
+        return False
+
+    def report(self) -> Dict[Hashable, Dict]:
+        total = sum(self.wins.values()) or 1
+        return {
+            leg: {
+                'wins': wins,
+                'share': wins / total,
+                'lead_ewma': self.lead[leg].ewma,
+                'lead_max': self.lead[leg].max,
+            }
+            for leg, wins in self.wins.items()
+        }
@@ -0,0 +1,135 @@
+import random
+import string
+import itertools
+from typing import Dict, List, Literal, Union
+
+
+from entity import OrderResponse
+
+
+INTENT_OPEN = 'o'
+INTENT_CLOSE = 'c'
+INTENT_HEDGE = 'h'
+
+FINAL_STATUSES = frozenset(['filled', 'canceled', 'expired', 'rejected', 'closed'])
+
+# 允许的状态迁移，'pending'为已生成client id但交易所尚未确认
+TRANSITIONS = {
+    'pending': frozenset(['new', 'open', 'partially_filled']) | FINAL_STATUSES,
+    'new': frozenset(['open', 'partially_filled']) | FINAL_STATUSES,
+    'open': frozenset(['new', 'partially_filled']) | FINAL_STATUSES,
+    'partially_filled': frozenset(['partially_filled']) | FINAL_STATUSES,
+}
+
+_BASE36 = string.digits + string.ascii_lowercase
+
+
+def _base36(value: int) -> str:
+    if value == 0:
+        return '0'
+    digits = []
+    while value:
+        value, rem = divmod(value, 36)
+        digits.append(_BASE36[rem])
+    return ''.join(reversed(digits))
+
+
+class LiveOrder:
+    __slots__ = ['client_order_id', 'id', 'symbol', 'intent', 'status', 'filled', 'hedged']
+
+    def __init__(self, client_order_id: str, symbol: str, intent: str):
+        self.client_order_id = client_order_id
+        self.id = None
+        self.symbol = symbol
+        self.intent = intent
+        self.status = 'pending'
+        self.filled = 0.0
+        self.hedged = 0.0
+
+    @property
+    def is_final(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def __repr__(self):
+        return f"LiveOrder(client_order_id={self.client_order_id}, id={self.id}, symbol={self.symbol}, intent={self.intent}, status={self.status}, filled={self.filled}, hedged={self.hedged})"
+
+
+class OrderRegistry:
+    """
+    Live orders indexed by client order id and exchange id. Client order ids are
+    `{prefix}{strategy}.{symbol id}.{intent}.{session}{seq}` in base36, unique per session
+    and at most 36 characters as Binance requires. Orders are evicted once final.
+    """
+    def __init__(self, strategy: str = 'b', prefix: str = 'x', max_orders: int = 10000):
+        self._prefix = f'{prefix}{strategy}.'
+        self._session = ''.join(random.choices(_BASE36, k=4))
+        self._seq = itertools.count()
+        self._max_orders = max_orders
+        self._symbol_ids: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._by_client_id: Dict[str, LiveOrder] = {}
+        self._by_id: Dict[str, LiveOrder] = {}
+        self.evicted = 0
+
+    def symbol_id(self, symbol: str) -> int:
+        sid = self._symbol_ids.get(symbol)
+        if sid is None:
+            sid = self._symbol_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return sid
+
+    def new_client_order_id(self, symbol: str, intent: Literal['o', 'c', 'h'] = INTENT_OPEN) -> str:
+        client_order_id = f'{self._prefix}{_base36(self.symbol_id(symbol))}.{intent}.{self._session}{_base36(next(self._seq))}'
+        if len(self._by_client_id) >= self._max_orders:
+            # 长时间收不到终态的订单按插入顺序淘汰，保证内存有界
+            self.evict(next(iter(self._by_client_id.values())))
+        self._by_client_id[client_order_id] = LiveOrder(client_order_id, symbol, intent)
+        return client_order_id
+
+    def parse_client_order_id(self, client_order_id: str) -> Union[Dict, None]:
+        if not client_order_id or not client_order_id.startswith(self._prefix):
+            return None
+        try:
+            sid, intent, _ = client_order_id[len(self._prefix):].split('.')
+            return {'symbol': self._symbols[int(sid, 36)], 'intent': intent}
+        except (ValueError, IndexError):
+            return None
+
+    def get(self, order_id: str = None, client_order_id: str = None) -> Union[LiveOrder, None]:
+        if client_order_id is not None:
+            return self._by_client_id.get(client_order_id)
+        return self._by_id.get(str(order_id))
+
+    def on_update(self, order: OrderResponse) -> Union[LiveOrder, None]:
+        """Apply an order event to its live order; returns None for orders this registry doesn't own."""
+        record = self._by_client_id.get(order.client_order_id)
+        if record is None:
+            return None
+        if record.id is None:
+            # 现货推送的订单id为int，ccxt返回的为str，统一按str索引
+            record.id = str(order.id)
+            self._by_id[record.id] = record
+        if order.filled and order.filled > record.filled:
+            record.filled = order.filled
+        allowed = TRANSITIONS.get(record.status)
+        if allowed is not None and order.status in allowed:
+            record.status = order.status
+        return record
+
+    def evict(self, record: LiveOrder):
+        if record is None:
+            return
+        if self._by_client_id.pop(record.client_order_id, None) is not None:
+            self.evicted += 1
+        if record.id is not None:
+            self._by_id.pop(record.id, None)
+
+    def release(self, record: LiveOrder):
+        if record.is_final:
+            self.evict(record)
+
+    def __len__(self) -> int:
+        return len(self._by_client_id)
+
+    def __contains__(self, client_order_id: str) -> bool:
+        return client_order_id in self._by_client_id
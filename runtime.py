@@ -0,0 +1,146 @@
+import gc
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, Union
+
+
+from entity import log_register
+from diagnostics import LagHistogram
+from metrics import metric_register
+
+
+GC_PAUSE = metric_register.histogram('gc_pause_seconds', 'Garbage collector pause per collection', ('generation',))
+
+
+@dataclass(frozen=True)
+class RuntimeProfile:
+    # None保持解释器默认值(700, 10, 10)
+    gc_thresholds: Tuple[int, int, int] = None
+    # 启动完成后把市场信息、logger、context等长期对象移出GC跟踪
+    freeze: bool = False
+    # 行情队列为空时主动回收，避免自动回收落在行情突发中间
+    idle_collect: bool = False
+    idle_interval: float = 1.0
+    full_collect_interval: float = 600
+
+
+PROFILES: Dict[str, RuntimeProfile] = {
+    'default': RuntimeProfile(),
+    'low-latency': RuntimeProfile(gc_thresholds=(50000, 50, 1000), freeze=True, idle_collect=True),
+}
+
+
+class GCMonitor:
+    """Times every collection through `gc.callbacks`, per generation, in milliseconds."""
+    def __init__(self):
+        self.pauses: Dict[int, LagHistogram] = {generation: LagHistogram() for generation in range(3)}
+        self.collected = [0, 0, 0]
+        self._start = 0.0
+        self._installed = False
+
+    def install(self):
+        if not self._installed:
+            gc.callbacks.append(self._callback)
+            self._installed = True
+
+    def uninstall(self):
+        if self._installed:
+            gc.callbacks.remove(self._callback)
+            self._installed = False
+
+    def _callback(self, phase: str, info: Dict):
+        if phase == 'start':
+            self._start = time.perf_counter()
+            return
+        pause = time.perf_counter() - self._start
+        generation = info['generation']
+        self.pauses[generation].record(pause * 1000)
+        self.collected[generation] += info['collected']
+        GC_PAUSE.labels(generation).observe(pause)
+
+    def report(self) -> Dict:
+        return {f'gen{generation}': dict(histogram.summary(), collected=self.collected[generation]) for generation, histogram in self.pauses.items()}
+
+
+class Runtime:
+    """
+    Applies a `RuntimeProfile` at startup: GC thresholds, CPU affinity and priority, and a GC
+    pause report. `freeze()` is called once startup objects exist; `run_idle_collect()` moves
+    collections to moments when `is_quiet()` says no market data is waiting.
+    """
+    logger = log_register.get_logger('runtime', level='INFO', flush=True)
+
+    def __init__(self, profile: Union[str, RuntimeProfile] = 'default', cpus: List[int] = None, nice: int = None):
+        if isinstance(profile, str):
+            if profile not in PROFILES:
+                raise ValueError(f"Unknown runtime profile {profile}, expected one of {', '.join(PROFILES)}")
+            self.name, self.profile = profile, PROFILES[profile]
+        else:
+            self.name, self.profile = 'custom', profile
+        self.cpus = cpus
+        self.nice = nice
+        self.monitor = GCMonitor()
+        self.idle_collections = 0
+        self._thresholds = gc.get_threshold()
+
+    def apply(self):
+        self.monitor.install()
+        if self.profile.gc_thresholds:
+            gc.set_threshold(*self.profile.gc_thresholds)
+        if self.cpus:
+            try:
+                os.sched_setaffinity(0, self.cpus)
+            except (AttributeError, OSError) as e:
+                self.logger.error(f"Error pinning to cpus {self.cpus}: {e}")
+        if self.nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+            except (AttributeError, OSError) as e:
+                self.logger.error(f"Error setting nice {self.nice}: {e}")
+        self.logger.info(f"[RUNTIME] profile: {self.name}, gc thresholds: {gc.get_threshold()}, cpus: {self.cpus}, nice: {self.nice}")
+
+    def restore(self):
+        self.monitor.uninstall()
+        gc.set_threshold(*self._thresholds)
+
+    def freeze(self):
+        if not self.profile.freeze:
+            return
+        # 启动时的这次全量回收不计入暂停统计
+        self.monitor.uninstall()
+        gc.collect()
+        gc.freeze()
+        self.monitor.install()
+        self.logger.info(f"[RUNTIME] froze {gc.get_freeze_count()} startup objects")
+
+    async def run_idle_collect(self, is_quiet: Callable[[], bool]):
+        profile = self.profile
+        threshold = gc.get_threshold()[0]
+        last_full = time.monotonic()
+        while True:
+            await asyncio.sleep(profile.idle_interval)
+            if not is_quiet():
+                continue
+            if time.monotonic() - last_full >= profile.full_collect_interval:
+                gc.collect()
+                last_full = time.monotonic()
+                self.idle_collections += 1
+            # 第0代过半就回收，给下一次突发留出余量
+            elif gc.get_count()[0] >= threshold // 2:
+                gc.collect(1)
+                self.idle_collections += 1
+
+    def report(self) -> Dict:
+        return {
+            'profile': self.name,
+            'frozen': gc.get_freeze_count(),
+            'idle_collections': self.idle_collections,
+            'gc': self.monitor.report(),
+        }
+
+    async def run_report(self, interval: float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            self.logger.info(f"[RUNTIME] {self.report()}")
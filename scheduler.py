@@ -0,0 +1,158 @@
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Awaitable, Callable, Dict, List
+
+
+from entity import log_register
+from metrics import metric_register
+
+
+PRIORITY_CLOSE = 0
+PRIORITY_OPEN = 1
+PRIORITY_NAMES = {PRIORITY_CLOSE: 'close', PRIORITY_OPEN: 'open'}
+
+IDLE = 'idle'
+QUEUED = 'queued'
+RUNNING = 'running'
+# 每个symbol同一时间只有一个动作：idle -> queued -> running -> idle，排队时信号过期直接回到idle
+TRANSITIONS = {
+    IDLE: (QUEUED,),
+    QUEUED: (RUNNING, IDLE),
+    RUNNING: (IDLE,),
+}
+
+QUEUE_SECONDS = metric_register.histogram('execution_queue_seconds', 'Time an action waited for an execution slot', ('kind',))
+EXEC_SECONDS = metric_register.histogram('execution_seconds', 'Time an action held an execution slot', ('kind',))
+DROPPED = metric_register.counter('execution_dropped_total', 'Queued actions dropped before running', ('reason',))
+FAILED = metric_register.counter('execution_failed_total', 'Actions that raised', ('kind',))
+QUEUED_ACTIONS = metric_register.gauge('execution_queued', 'Actions waiting for an execution slot')
+RUNNING_ACTIONS = metric_register.gauge('execution_running', 'Actions holding an execution slot')
+
+
+class Action:
+    __slots__ = ['symbol', 'priority', 'run', 'is_stale', 'created', 'queued', 'seq', 'cancelled']
+
+    def __init__(self, symbol: str, priority: int, run: Callable[[], Awaitable], is_stale: Callable[[], bool], seq: int, queued: float = None):
+        self.symbol = symbol
+        self.priority = priority
+        self.run = run
+        self.is_stale = is_stale
+        # created是信号的时间，决定是否过期；queued是symbol开始排队的时间，用于排队耗时
+        self.created = time.monotonic()
+        self.queued = self.created if queued is None else queued
+        self.seq = seq
+        self.cancelled = False
+
+    def __lt__(self, other: 'Action') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ExecutionScheduler:
+    """
+    Runs at most `max_concurrent` order actions at a time, one per symbol, closes before opens
+    and older before newer within a priority. A queued action is dropped instead of run when
+    its signal is older than `max_queue_age` seconds or its `is_stale()` says the signal is gone.
+    A newer signal for a queued symbol replaces the queued action and keeps its place in the
+    queue. Slots and symbol states are
+    released in `finally`, so an action that raises never blocks its symbol.
+    """
+    logger = log_register.get_logger('scheduler', level='INFO', flush=True)
+
+    def __init__(self, max_concurrent: int = 8, max_queue_age: float = 0.5):
+        self.max_concurrent = max_concurrent
+        self.max_queue_age = max_queue_age
+        self.states: Dict[str, str] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+        self._queue: List[Action] = []
+        self._queued: Dict[str, Action] = {}
+        self._seq = itertools.count()
+        QUEUED_ACTIONS.set_function(lambda: len(self._queued))
+        RUNNING_ACTIONS.set_function(lambda: len(self.running))
+
+    def state(self, symbol: str) -> str:
+        return self.states.get(symbol, IDLE)
+
+    def _transition(self, symbol: str, state: str):
+        current = self.state(symbol)
+        if state not in TRANSITIONS[current]:
+            raise RuntimeError(f"{symbol}: invalid transition {current} -> {state}")
+        if state == IDLE:
+            self.states.pop(symbol, None)
+        else:
+            self.states[symbol] = state
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.states
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def submit(self, symbol: str, priority: int, run: Callable[[], Awaitable], is_stale: Callable[[], bool] = None) -> bool:
+        """Queue `run()` for `symbol`; returns False while the symbol already has an action running."""
+        state = self.state(symbol)
+        if state == RUNNING:
+            return False
+        if state == QUEUED:
+            # 排队中的动作被更新的信号替换：信号年龄从新信号算起，排队位置和排队时间保留
+            queued = self._queued[symbol]
+            queued.cancelled = True
+            DROPPED.labels('replaced').inc()
+            action = Action(symbol, priority, run, is_stale, queued.seq, queued.queued)
+        else:
+            self._transition(symbol, QUEUED)
+            action = Action(symbol, priority, run, is_stale, next(self._seq))
+        self._queued[symbol] = action
+        heapq.heappush(self._queue, action)
+        self._pump()
+        return True
+
+    def _pump(self):
+        while self._queue and len(self.running) < self.max_concurrent:
+            action = heapq.heappop(self._queue)
+            if action.cancelled:
+                continue
+            del self._queued[action.symbol]
+            now = time.monotonic()
+            reason = None
+            if now - action.created > self.max_queue_age:
+                reason = 'expired'
+            elif action.is_stale is not None and action.is_stale():
+                reason = 'stale'
+            if reason is not None:
+                DROPPED.labels(reason).inc()
+                self._transition(action.symbol, IDLE)
+                continue
+            kind = PRIORITY_NAMES.get(action.priority, str(action.priority))
+            QUEUE_SECONDS.labels(kind).observe(now - action.queued)
+            self._transition(action.symbol, RUNNING)
+            self.running[action.symbol] = asyncio.create_task(self._run(action, kind), name=action.symbol)
+
+    async def _run(self, action: Action, kind: str):
+        start = time.monotonic()
+        try:
+            await action.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            FAILED.labels(kind).inc()
+            self.logger.error(f"Error executing {kind} for {action.symbol}: {e}")
+        finally:
+            EXEC_SECONDS.labels(kind).observe(time.monotonic() - start)
+            del self.running[action.symbol]
+            self._transition(action.symbol, IDLE)
+            self._pump()
+
+    async def close(self):
+        """Drop queued actions and cancel running ones."""
+        for action in self._queue:
+            if not action.cancelled:
+                action.cancelled = True
+                self._transition(action.symbol, IDLE)
+        self._queue.clear()
+        self._queued.clear()
+        tasks = list(self.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
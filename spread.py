@@ -0,0 +1,67 @@
+from typing import Dict, List, Set
+
+
+class Spread:
+    """
+    Two-leg spread: open buys `near` at ask and sells `far` at bid, close does the opposite.
+    `open = far.bid / near.ask - 1`, `close = far.ask / near.bid - 1`.
+    """
+    __slots__ = ['name', 'near', 'far']
+
+    def __init__(self, name: str, near: str, far: str):
+        self.name = name
+        self.near = near
+        self.far = far
+
+    def __repr__(self):
+        return f"Spread(name={self.name}, near={self.near}, far={self.far})"
+
+
+class SpreadGraph:
+    """
+    Registry of spreads with an inverted index from instrument to the spreads that use it,
+    so a quote update only recomputes the spreads depending on that instrument.
+    """
+    def __init__(self, auto_pair: bool = True):
+        self.spreads: Dict[str, Spread] = {}
+        self._dependents: Dict[str, List[Spread]] = {}
+        self._auto_pair = auto_pair
+        self._seen: Set[str] = set()
+
+    def add(self, name: str, near: str, far: str) -> Spread:
+        if name in self.spreads:
+            self.remove(name)
+        spread = self.spreads[name] = Spread(name, near, far)
+        for leg in (near, far):
+            self._dependents.setdefault(leg, []).append(spread)
+        return spread
+
+    def remove(self, name: str):
+        spread = self.spreads.pop(name, None)
+        if spread is None:
+            return
+        for leg in (spread.near, spread.far):
+            dependents = self._dependents.get(leg, [])
+            if spread in dependents:
+                dependents.remove(spread)
+
+    def dependents(self, symbol: str) -> List[Spread]:
+        if symbol not in self._seen:
+            self._seen.add(symbol)
+            if self._auto_pair:
+                self._pair(symbol)
+        return self._dependents.get(symbol, ())
+
+    def _pair(self, symbol: str):
+        # 默认的期现价差：现货'BTC/USDT'与永续'BTC/USDT:USDT'，价差以现货symbol命名
+        spot = symbol.split(':')[0]
+        if '/' not in spot or spot in self.spreads:
+            return
+        settle = spot.split('/')[1]
+        self.add(spot, near=spot, far=f'{spot}:{settle}')
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.spreads
+
+    def __len__(self) -> int:
+        return len(self.spreads)
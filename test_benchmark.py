@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+
+from bench import compare, drive
+from benchmark import CASES, run_suite
+from entity import EventSystem, MarketDataStore
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+    def test_cases_run_and_clean_up(self):
+        listeners = EventSystem._listeners
+        results = run_suite(list(CASES), repeat=1, min_time=0.001)
+        self.assertEqual(set(results['results']), set(CASES))
+        for result in results['results'].values():
+            self.assertGreater(result['ns_per_op'], 0)
+        self.assertIs(EventSystem._listeners, listeners)
+        self.assertNotIn('BENCH/USDT', MarketDataStore.quote)
+        self.assertNotIn('BENCH/USDT', MarketDataStore.spreads)
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {'results': {'a': {'ns_per_op': 100}, 'b': {'ns_per_op': 100}}}
+        results = {'results': {'a': {'ns_per_op': 115}, 'b': {'ns_per_op': 130}, 'c': {'ns_per_op': 1}}}
+        report = compare(results, baseline, tolerance=0.2)
+        self.assertFalse(report['a']['regressed'])
+        self.assertAlmostEqual(report['a']['change'], 0.15)
+        self.assertTrue(report['b']['regressed'])
+        self.assertIsNone(report['c']['baseline'])
+        self.assertFalse(report['c']['regressed'])
+
+    def test_drive_rejects_suspending_coroutines(self):
+        async def returns():
+            return 1
+
+        async def suspends():
+            await asyncio.sleep(0)
+
+        self.assertEqual(drive(returns()), 1)
+        with self.assertRaises(RuntimeError):
+            drive(suspends())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from pathlib import Path
+from binlog import BinaryLogger, decode, DEBUG, INFO
+
+
+LAYOUTS = {
+    1: ('Sdd', "symbol: {}, bid: {}, ask: {}"),
+    2: ('dSI', "Price: {} has not changed for {}. (x{})"),
+}
+
+
+class BinaryLoggerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'trade.bin'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_through_decoder(self):
+        logger = BinaryLogger(self.path, LAYOUTS)
+        for i in range(20):
+            logger.info(1, 'BTC/USDT', 100.0 + i, 100.5 + i)
+        logger.info(2, 101.5, 'BTC/USDT:USDT', 100)
+        logger.close()
+
+        lines = list(decode(self.path))
+        self.assertEqual(len(lines), 21)
+        self.assertTrue(lines[0].endswith('[INFO] symbol: BTC/USDT, bid: 100.0, ask: 100.5'))
+        self.assertTrue(lines[-1].endswith('Price: 101.5 has not changed for BTC/USDT:USDT. (x100)'))
+
+    def test_level_gating(self):
+        logger = BinaryLogger(self.path, LAYOUTS, level=INFO)
+        logger.log(DEBUG, 1, 'BTC/USDT', 1.0, 2.0)
+        self.assertFalse(logger.enabled(DEBUG))
+        logger.close()
+        self.assertEqual(list(decode(self.path)), [])
+
+    def test_sessions_are_appended(self):
+        for bid in (1.0, 2.0):
+            logger = BinaryLogger(self.path, LAYOUTS)
+            logger.info(1, 'ETH/USDT', bid, 3.0)
+            logger.close()
+        lines = list(decode(self.path))
+        self.assertEqual(len(lines), 2)
+        self.assertIn('bid: 2.0', lines[1])
+
+    def test_sampling(self):
+        logger = BinaryLogger(self.path, LAYOUTS)
+        repeats = [logger.sample('BTC/USDT:USDT', 10) for _ in range(25)]
+        logger.close()
+        self.assertEqual([r for r in repeats if r], [10, 10])
+
+    def test_full_ring_drops_instead_of_blocking(self):
+        logger = BinaryLogger(self.path, LAYOUTS, capacity=4, flush_interval=60)
+        for _ in range(10):
+            logger.info(1, 'BTC/USDT', 1.0, 2.0)
+        # 第一条记录之前还写入了一条字符串表记录
+        self.assertEqual(logger.dropped, 7)
+        logger.close()
+        self.assertEqual(len(list(decode(self.path))), 3)
+
+
+    def test_dropped_string_is_written_again(self):
+        logger = BinaryLogger(self.path, LAYOUTS, capacity=2, flush_interval=60)
+        logger.info(1, 'BTC/USDT', 1.0, 2.0)
+        # 环已满，新字符串和引用它的记录都被丢弃
+        logger.info(1, 'ETH/USDT', 3.0, 4.0)
+        self.assertEqual(logger.dropped, 2)
+        logger._drain()
+        logger.info(1, 'ETH/USDT', 5.0, 6.0)
+        logger.close()
+        lines = list(decode(self.path))
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith('symbol: ETH/USDT, bid: 5.0, ask: 6.0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import time
+import asyncio
+import tempfile
+import unittest
+from functools import partial
+from pathlib import Path
+from bot import Bot
+from entity import Context, EventSystem, MarketDataStore, OrderResponse, Position
+from fakes import MockExchangeApi, MockMarketOrders
+from manager import HedgeAggregator
+from registry import INTENT_HEDGE, INTENT_OPEN
+
+
+class BotHedgeAccountingTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.bot = Bot({'exchange_id': 'binance', 'apiKey': ''}, Context(Path(self._tmp.name)))
+        self.client_order_id = self.bot.registry.new_client_order_id('HEDGE/USDT:USDT', INTENT_OPEN)
+
+    def linear_order(self, status, filled, average=101.0, client_order_id=None):
+        return OrderResponse(
+            id='1', symbol='HEDGE/USDT:USDT', status=status, side='sell', amount=10, filled=filled,
+            last_filled=0, remaining=0, client_order_id=client_order_id or self.client_order_id,
+            average=average, price=101.0,
+        )
+
+    async def test_partial_fills_share_one_hedge(self):
+        orders = MockMarketOrders()
+        self.bot._hedger = HedgeAggregator(orders, window=0.01, max_notional=10000, min_notional=0)
+
+        await self.bot._on_new_order(self.linear_order('new', 0))
+        for filled in (1, 2, 3):
+            await self.bot._on_partially_filled_order(self.linear_order('partially_filled', filled))
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(orders.orders, [('HEDGE/USDT', 'buy', 3)])
+        self.assertEqual(self.bot.registry.get('1').hedged, 3)
+        self.assertAlmostEqual(self.bot.context.openpx['HEDGE/USDT'], 101.0 / 100.0 - 1)
+
+        await self.bot._on_filled_order(self.linear_order('filled', 10))
+        await asyncio.sleep(0)
+        self.assertEqual(orders.orders[-1], ('HEDGE/USDT', 'buy', 7))
+        self.assertIsNone(self.bot.registry.get('1'))
+        self.assertNotIn(self.client_order_id, self.bot.registry)
+
+    async def test_short_hedge_is_carried_to_next_fill(self):
+        orders = MockMarketOrders(fill_ratio=0.5)
+        self.bot._hedger = HedgeAggregator(orders, window=0.01, max_notional=10000, min_notional=0)
+
+        await self.bot._on_partially_filled_order(self.linear_order('partially_filled', 4))
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.bot.registry.get('1').hedged, 2)
+
+        await self.bot._on_partially_filled_order(self.linear_order('partially_filled', 6))
+        await asyncio.sleep(0.05)
+        self.assertEqual(orders.orders[-1], ('HEDGE/USDT', 'buy', 4))
+
+    async def test_shortfall_of_the_last_hedge_is_not_dropped(self):
+        orders = MockMarketOrders(fill_ratio=0.5)
+        self.bot._hedger = HedgeAggregator(orders, window=0.01, max_notional=10000, min_notional=0)
+        record = self.bot.registry.get(client_order_id=self.client_order_id)
+
+        await self.bot._on_filled_order(self.linear_order('filled', 10))
+        await asyncio.sleep(0.05)
+        self.assertEqual(orders.orders, [('HEDGE/USDT', 'buy', 10)])
+        # 永续单已终态，不足的部分记回未对冲
+        self.assertEqual(record.hedged, 5)
+
+    async def test_failed_hedge_is_released(self):
+        orders = MockMarketOrders(fail=True)
+        self.bot._hedger = HedgeAggregator(
+            orders, window=0.01, max_notional=10000, min_notional=0,
+            new_client_order_id=partial(self.bot.registry.new_client_order_id, intent=INTENT_HEDGE),
+            on_rejected=self.bot._release_hedge,
+        )
+        await self.bot._on_filled_order(self.linear_order('filled', 10))
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(orders.client_order_ids), 1)
+        self.assertNotIn(orders.client_order_ids[0], self.bot.registry)
+        self.assertEqual(len(self.bot.registry), 0)
+
+    async def test_foreign_orders_are_ignored(self):
+        orders = MockMarketOrders()
+        self.bot._hedger = HedgeAggregator(orders, window=0.01, max_notional=10000, min_notional=0)
+
+        await self.bot._on_filled_order(self.linear_order('filled', 10, client_order_id='web_manual'))
+        await asyncio.sleep(0.02)
+
+        self.assertEqual(orders.orders, [])
+
+
+TICKERS = {
+    'spot': {
+        'WARM1/USDT': {'bid': 99.9, 'ask': 100.0, 'timestamp': None},
+        'WARM2/USDT': {'bid': 9.9, 'ask': 10.0, 'timestamp': None},
+        'EMPTY/USDT': {'bid': None, 'ask': None, 'timestamp': None},
+    },
+    'linear': {
+        'WARM1/USDT:USDT': {'bid': 100.1, 'ask': 100.2, 'timestamp': 1000},
+        'WARM2/USDT:USDT': {'bid': 10.1, 'ask': 10.2, 'timestamp': 1000},
+    },
+}
+POSITIONS = [
+    {'symbol': 'WARM1/USDT:USDT', 'contracts': 2.0, 'side': 'short', 'entryPrice': 100.0, 'markPrice': 100.1},
+    {'symbol': 'WARM2/USDT:USDT', 'contracts': 0.0, 'side': None, 'entryPrice': 0.0, 'markPrice': 0.0},
+]
+
+
+class WarmStartTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # 持仓、余额和rolling快照写到临时目录，reconcile不会动部署目录里的状态
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.context = Context(Path(self._tmp.name))
+        self.bot = Bot({'exchange_id': 'binance', 'apiKey': ''}, self.context)
+        # warm start期间每个REST调用耗时50ms
+        self.api = self.bot._exchange.api = MockExchangeApi(
+            usdt=500.25, spot={'USDT': 1000.5, 'WARM1': 2.0}, positions=POSITIONS, tickers=TICKERS, latency=0.05,
+        )
+        self.emitted = []
+        for symbol in ('WARM1/USDT', 'WARM1/USDT:USDT', 'WARM2/USDT', 'WARM2/USDT:USDT'):
+            MarketDataStore.quote.pop(symbol, None)
+        EventSystem._listeners['ratio_changed'].remove(self.bot.on_ratio_changed)
+        EventSystem.on('ratio_changed', self._on_ratio_changed)
+
+    async def asyncTearDown(self):
+        EventSystem._listeners['ratio_changed'].remove(self._on_ratio_changed)
+
+    def _on_ratio_changed(self, symbol, open_ratio, close_ratio):
+        self.emitted.append((symbol, open_ratio))
+
+    async def test_warm_start_is_one_round_trip(self):
+        self.context.position['STALE/USDT:USDT'] = Position(symbol='STALE/USDT:USDT', amount=-1)
+        # 重启前保存的窗口可以直接使用，第一批报价就能发送ratio_changed
+        for i in range(MarketDataStore.open_rolling_median['WARM1/USDT'].n):
+            MarketDataStore.seed_rolling('WARM1/USDT', [0.001 + i * 1e-5], [0.002 + i * 1e-5])
+        MarketDataStore.save_rolling(self.context.directory / 'rolling.pkl')
+        MarketDataStore.open_rolling_median.pop('WARM1/USDT')
+        MarketDataStore.close_rolling_median.pop('WARM1/USDT')
+
+        start_time = time.perf_counter()
+        await self.bot.warm_start()
+        elapsed = time.perf_counter() - start_time
+
+        self.assertLess(elapsed, 2 * self.api.latency)
+        self.assertEqual(len(self.api.calls), 5)
+        self.assertEqual(MarketDataStore.quote['WARM1/USDT:USDT'].bid, 100.1)
+        self.assertNotIn('EMPTY/USDT', MarketDataStore.quote)
+        self.assertTrue(MarketDataStore.open_rolling_median['WARM1/USDT'].ready)
+        self.assertEqual([symbol for symbol, _ in self.emitted], ['WARM1/USDT'])
+
+        self.assertEqual(self.context.spot_account.USDT, 1000.5)
+        self.assertEqual(self.context.futures_account.USDT, 500.25)
+        self.assertEqual(self.context.position['WARM1/USDT:USDT'].amount, -2.0)
+        self.assertNotIn('STALE/USDT:USDT', self.context.position)
+        self.assertNotIn('WARM2/USDT:USDT', self.context.position)
+
+    async def test_live_quotes_are_not_overwritten(self):
+        await MarketDataStore.update({'s': 'WARM2/USDT', 'a': '10.5', 'b': '10.4', 'u': 5}, recv_ts=1000)
+        await self.bot.warm_start()
+        self.assertEqual(MarketDataStore.quote['WARM2/USDT'].ask, 10.5)
+        self.assertEqual(MarketDataStore.quote['WARM2/USDT:USDT'].ask, 10.2)
+
+    async def test_failed_request_does_not_block_warm_start(self):
+        async def unavailable(params={}):
+            raise ConnectionError('unavailable')
+        self.api.fetch_balance = unavailable
+        await self.bot.warm_start()
+        self.assertIn('WARM1/USDT', MarketDataStore.quote)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import time
+import signal
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+
+from entity import EventSystem
+from diagnostics import LagHistogram, LoopMonitor, SamplingProfiler
+
+
+def blocking_listener(symbol):
+    time.sleep(0.15)
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class LagHistogramTests(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LagHistogram()
+        for value in [0.05] * 98 + [30, 3000]:
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(50), 0.1)
+        self.assertEqual(histogram.percentile(99), 50)
+        self.assertEqual(histogram.percentile(100), 3000)
+        self.assertEqual(histogram.summary()['max'], 3000)
+
+
+class LoopMonitorTests(unittest.IsolatedAsyncioTestCase):
+    async def test_stall_is_attributed_to_listener(self):
+        monitor = LoopMonitor(interval=0.005, slow_threshold=0.05)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        EventSystem.on('diagnostics_test', blocking_listener)
+        try:
+            await EventSystem.emit('diagnostics_test', 'BTC/USDT')
+        finally:
+            EventSystem._listeners['diagnostics_test'].remove(blocking_listener)
+        await asyncio.sleep(0.02)
+        monitor.stop()
+
+        self.assertGreaterEqual(monitor.lag.max, 100)
+        self.assertEqual(monitor.slow_callbacks[('diagnostics_test', 'blocking_listener')], 1)
+        event, listener, stack, stalled = monitor.stalls[-1]
+        self.assertIn('test_diagnostics.py:blocking_listener', stack)
+
+
+class SamplingProfilerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_signal_toggles_profiler(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = SamplingProfiler(interval=0.001, directory=Path(tmp))
+            profiler.install_signal()
+            os.kill(os.getpid(), signal.SIGUSR2)
+            await asyncio.sleep(0.01)
+            self.assertTrue(profiler.enabled)
+
+            busy(0.1)
+            os.kill(os.getpid(), signal.SIGUSR2)
+            await asyncio.sleep(0.01)
+            self.assertFalse(profiler.enabled)
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR2)
+
+            lines = next(Path(tmp).glob('profile-*.collapsed')).read_text().splitlines()
+            stack, count = lines[0].rsplit(' ', 1)
+            self.assertTrue(stack.endswith('test_diagnostics.py:busy'))
+            self.assertGreater(int(count), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
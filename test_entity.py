@@ -1,9 +1,16 @@
+import copyreg
+import pickle
+import random
+import asyncio
+import tempfile
 import unittest
-from entity import PositionDict, Position
+from entity import PositionDict, Position, OrderResponse, OrderedDispatcher, MarketDataStore, EventSystem
 
 class PositionDictTests(unittest.TestCase):
     def setUp(self):
-        self.position_dict = PositionDict()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.position_dict = PositionDict(tmp.name)
 
     def test_update_existing_position(self):
         symbol = 'BTC'
@@ -49,12 +56,192 @@ class PositionDictTests(unittest.TestCase):
         self.position_dict.update(symbol, order_amount, order_price)
 
         # Update the position with zero amount
-        new_order_amount = -5
+        new_order_amount = -order_amount
         new_order_price = 55000.0
         self.position_dict.update(symbol, new_order_amount, new_order_price)
 
         # Check if the position is removed
         self.assertNotIn(symbol, self.position_dict)
 
+    def test_load_positions_pickled_with_instance_dict(self):
+        # 按旧版带__dict__的Position的形式写pickle：状态是字段字典
+        class LegacyPickler(pickle.Pickler):
+            def reducer_override(self, obj):
+                if type(obj) is Position:
+                    return copyreg.__newobj__, (Position,), {'symbol': obj.symbol, 'amount': obj.amount, 'last_price': obj.last_price, 'avg_price': obj.avg_price, 'total_cost': obj.total_cost}
+                return NotImplemented
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(f'{tmp}/positions.pkl', 'wb') as f:
+                LegacyPickler(f).dump({'BTC': Position('BTC', 1.5, 50000.0, 50000.0, 75000.0)})
+            positions = PositionDict(tmp)
+            self.assertEqual(positions['BTC'], Position('BTC', 1.5, 50000.0, 50000.0, 75000.0))
+            self.assertFalse(hasattr(positions['BTC'], '__dict__'))
+            positions.update('BTC', 0.5, 60000.0)
+            self.assertEqual(PositionDict(tmp)['BTC'].amount, 2.0)
+
+
+class OrderResponseTests(unittest.TestCase):
+    def test_mapping_access(self):
+        order = OrderResponse('1', 'BTC/USDT', 'open', 'buy', 0.01, 0.0, 0.0, 0.01, 'x-1', None, 100.0)
+        self.assertEqual(order['id'], '1')
+        self.assertIsNone(order.get('average', 0))
+        self.assertEqual(order.get('missing', 0), 0)
+        self.assertEqual(len(order), 11)
+        self.assertEqual(list(order)[:3], ['id', 'symbol', 'status'])
+        order['filled'] = 0.01
+        self.assertEqual(order.filled, 0.01)
+        # 方法名不是字段
+        with self.assertRaises(KeyError):
+            order['keys']
+        with self.assertRaises(KeyError):
+            order['missing'] = 1
+        self.assertFalse(hasattr(order, '__dict__'))
+
+class OrderedDispatcherTests(unittest.IsolatedAsyncioTestCase):
+    async def test_order_kept_within_lane_under_load(self):
+        seen = {}
+
+        async def handler(order_id, seq):
+            # 随机让出事件循环，模拟handler中的await
+            if random.random() < 0.5:
+                await asyncio.sleep(0)
+            seen.setdefault(order_id, []).append(seq)
+
+        dispatcher = OrderedDispatcher(handler)
+        n_orders, n_events = 200, 50
+        for seq in range(n_events):
+            for order_id in range(n_orders):
+                dispatcher.submit(order_id, order_id, seq)
+
+        while dispatcher.lanes:
+            await asyncio.sleep(0.001)
+
+        self.assertEqual(dispatcher.processed, n_orders * n_events)
+        for order_id in range(n_orders):
+            self.assertEqual(seen[order_id], list(range(n_events)))
+
+    async def test_lanes_run_concurrently(self):
+        release = asyncio.Event()
+        done = []
+
+        async def handler(key):
+            if key == 'slow':
+                await release.wait()
+            done.append(key)
+
+        dispatcher = OrderedDispatcher(handler)
+        dispatcher.submit('slow', 'slow')
+        dispatcher.submit('fast', 'fast')
+        await asyncio.sleep(0.01)
+        self.assertEqual(done, ['fast'])
+
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(done, ['fast', 'slow'])
+        self.assertEqual(dispatcher.lanes, 0)
+
+    async def test_handler_error_does_not_block_lane(self):
+        done = []
+
+        async def handler(seq):
+            if seq == 0:
+                raise ValueError('boom')
+            done.append(seq)
+
+        dispatcher = OrderedDispatcher(handler)
+        for seq in range(3):
+            dispatcher.submit('lane', seq)
+        await asyncio.sleep(0.01)
+        self.assertEqual(done, [1, 2])
+
+
+class MarketDataStoreTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.emitted = []
+        EventSystem.on('ratio_changed', self._on_ratio_changed)
+        MarketDataStore.suppress_warmup = False
+
+    async def asyncTearDown(self):
+        EventSystem._listeners['ratio_changed'].remove(self._on_ratio_changed)
+        MarketDataStore.suppress_warmup = True
+        MarketDataStore.min_ratio_change = 0.0
+        MarketDataStore.min_emit_interval = 0.0
+        MarketDataStore.max_emit_interval = 1.0
+
+    def _on_ratio_changed(self, symbol, open_ratio, close_ratio):
+        self.emitted.append(symbol)
+
+    async def test_quote_keeps_timestamps_and_update_id(self):
+        await MarketDataStore.update({'s': 'TS/USDT:USDT', 'a': '2', 'b': '1', 'E': 1000, 'T': 990, 'u': 7}, recv_ts=1010, subject='binance.linear.bookTicker.TSUSDT')
+        quote = MarketDataStore.quote['TS/USDT:USDT']
+        self.assertEqual((quote.ask, quote.bid, quote.exchange_ts, quote.recv_ts, quote.update_id), (2.0, 1.0, 990, 1010, 7))
+        self.assertEqual(quote['update_id'], 7)
+        self.assertEqual(MarketDataStore.feed_lag['binance.linear.bookTicker.TSUSDT'].last, 20)
+        self.assertFalse(hasattr(quote, '__dict__'))
+
+    async def test_out_of_order_update_is_dropped(self):
+        await MarketDataStore.update({'s': 'OOO/USDT:USDT', 'a': '2', 'b': '1', 'u': 10}, recv_ts=1)
+        await MarketDataStore.update({'s': 'OOO/USDT:USDT', 'a': '3', 'b': '2', 'u': 9}, recv_ts=2)
+        self.assertEqual(MarketDataStore.quote['OOO/USDT:USDT'].ask, 2.0)
+        self.assertEqual(MarketDataStore.out_of_order['OOO/USDT:USDT'], 1)
+
+    async def test_stale_leg_is_skipped(self):
+        await MarketDataStore.update({'s': 'STALE/USDT', 'a': '100', 'b': '99'}, recv_ts=1000)
+        await MarketDataStore.update({'s': 'STALE/USDT:USDT', 'a': '101', 'b': '100'}, recv_ts=1000 + MarketDataStore.max_skew + 1)
+        self.assertEqual(self.emitted, [])
+        self.assertEqual(MarketDataStore.stale_skipped['STALE/USDT'], 1)
+
+        await MarketDataStore.update({'s': 'STALE/USDT', 'a': '100', 'b': '99'}, recv_ts=1000 + MarketDataStore.max_skew + 2)
+        self.assertEqual(self.emitted, ['STALE/USDT'])
+
+    async def test_update_recomputes_only_dependent_spreads(self):
+        MarketDataStore.spreads.add('DEP-USDC/USDT', near='DEP/USDT', far='DEP/USDC')
+        try:
+            await MarketDataStore.update({'s': 'DEP/USDC', 'a': '10.1', 'b': '10'}, recv_ts=1000)
+            await MarketDataStore.update({'s': 'DEP/USDT:USDT', 'a': '10.2', 'b': '10.1'}, recv_ts=1000)
+            self.assertEqual(self.emitted, [])
+
+            await MarketDataStore.update({'s': 'DEP/USDT', 'a': '10', 'b': '9.9'}, recv_ts=1000)
+            self.assertEqual(sorted(self.emitted), ['DEP-USDC/USDT', 'DEP/USDT'])
+            self.assertAlmostEqual(MarketDataStore.open_rolling_median['DEP-USDC/USDT'].data[-1], 10 / 10 - 1)
+
+            self.emitted.clear()
+            await MarketDataStore.update({'s': 'DEP/USDC', 'a': '10.2', 'b': '10.1'}, recv_ts=1001)
+            self.assertEqual(self.emitted, ['DEP-USDC/USDT'])
+        finally:
+            MarketDataStore.spreads.remove('DEP-USDC/USDT')
+
+    async def test_warmup_is_suppressed(self):
+        MarketDataStore.suppress_warmup = True
+        window = MarketDataStore.open_rolling_median['WARM/USDT'].n
+        for i in range(window):
+            await MarketDataStore.update({'s': 'WARM/USDT', 'a': str(100 + i), 'b': str(99 + i)}, recv_ts=1000)
+            await MarketDataStore.update({'s': 'WARM/USDT:USDT', 'a': '101', 'b': '100.5'}, recv_ts=1000)
+        # 第window个不同的值填满窗口，之后的两次计算才发送
+        self.assertTrue(MarketDataStore.open_rolling_median['WARM/USDT'].ready)
+        self.assertEqual(self.emitted, ['WARM/USDT', 'WARM/USDT'])
+        self.assertEqual(MarketDataStore.emitted['WARM/USDT'], 2)
+        self.assertEqual(MarketDataStore.suppressed['WARM/USDT'], 2 * window - 3)
+
+    async def test_small_changes_are_suppressed(self):
+        MarketDataStore.min_ratio_change = 0.001
+        MarketDataStore.max_emit_interval = 60
+        self.assertTrue(MarketDataStore.should_emit('GATE/USDT', 0.001, 0.002))
+        self.assertFalse(MarketDataStore.should_emit('GATE/USDT', 0.0015, 0.0025))
+        self.assertTrue(MarketDataStore.should_emit('GATE/USDT', 0.001, 0.0035))
+        self.assertEqual((MarketDataStore.emitted['GATE/USDT'], MarketDataStore.suppressed['GATE/USDT']), (2, 1))
+
+        # 超过max_emit_interval即使没有变化也发送
+        MarketDataStore.max_emit_interval = 0
+        self.assertTrue(MarketDataStore.should_emit('GATE/USDT', 0.001, 0.0035))
+
+    async def test_min_interval_is_per_symbol(self):
+        MarketDataStore.min_emit_interval = 60
+        self.assertTrue(MarketDataStore.should_emit('IVA/USDT', 0.001, 0.002))
+        self.assertTrue(MarketDataStore.should_emit('IVB/USDT', 0.001, 0.002))
+        self.assertFalse(MarketDataStore.should_emit('IVA/USDT', 0.01, 0.02))
+        self.assertEqual(MarketDataStore.suppressed['IVA/USDT'], 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,97 @@
+import unittest
+
+
+import ccxt.pro as ccxtpro
+
+
+from fastrest import FastOrderClient, format_number
+from manager import ExchangeManager, OrderManager
+from mockexchange import MockExchange, local_market
+
+
+MARKETS = {
+    'BTC/USDT:USDT': local_market('BTC/USDT:USDT', 'BTCUSDT'),
+    'BTC/USDT': local_market('BTC/USDT', 'BTCUSDT'),
+}
+
+
+class FormatNumberTests(unittest.TestCase):
+    def test_plain_decimal_text(self):
+        self.assertEqual(format_number(100.0), '100')
+        self.assertEqual(format_number(0.00001), '0.00001')
+        self.assertEqual(format_number(60000.12), '60000.12')
+
+
+class FastOrderClientTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.endpoint = MockExchange(secret='secret')
+        base = await self.endpoint.start()
+        self.client = FastOrderClient('key', 'secret', MARKETS, base_urls={'spot': base, 'linear': base})
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.endpoint.stop()
+
+    async def test_linear_limit_order_and_cancel(self):
+        order = await self.client.create_order('BTC/USDT:USDT', 'limit', 'sell', 0.01, 60000.5, {'reduceOnly': True, 'clientOrderId': 'x-fast'})
+        request = self.endpoint.requests[-1]
+        self.assertEqual(request['path'], '/fapi/v1/order')
+        self.assertEqual((request['symbol'], request['side'], request['type'], request['price'], request['quantity']), ('BTCUSDT', 'SELL', 'LIMIT', '60000.5', '0.01'))
+        self.assertEqual(request['reduceOnly'], 'true')
+        self.assertEqual(order.symbol, 'BTC/USDT:USDT')
+        self.assertEqual(order.status, 'open')
+        self.assertEqual(order.client_order_id, 'x-fast')
+        self.assertEqual(order.remaining, 0.01)
+        self.assertEqual(self.client.last_response_headers['x-mbx-used-weight-1m'], '1')
+
+        canceled = await self.client.cancel_order(order.id, 'BTC/USDT:USDT')
+        self.assertEqual(canceled.status, 'canceled')
+        self.assertEqual(self.endpoint.requests[-1]['method'], 'DELETE')
+
+    async def test_amount_and_price_rounded_to_market_precision(self):
+        await self.client.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.1 + 0.2, 60000.123)
+        request = self.endpoint.requests[-1]
+        self.assertEqual((request['quantity'], request['price']), ('0.3', '60000.12'))
+
+    async def test_spot_market_order_average(self):
+        self.endpoint.set_quote('spot', 'BTCUSDT', 99.9, 100)
+        order = await self.client.create_order('BTC/USDT', 'market', 'buy', 0.5, params={})
+        self.assertEqual(self.endpoint.requests[-1]['path'], '/api/v3/order')
+        self.assertEqual(self.endpoint.requests[-1]['newOrderRespType'], 'RESULT')
+        self.assertEqual(order.status, 'closed')
+        self.assertEqual(order.filled, 0.5)
+        self.assertEqual(order.average, 100)
+
+    async def test_errors_map_to_ccxt_exceptions(self):
+        with self.assertRaises(ccxtpro.OrderNotFound):
+            await self.client.cancel_order('404', 'BTC/USDT:USDT')
+        self.endpoint.fail_status = 429
+        with self.assertRaises(ccxtpro.RateLimitExceeded):
+            await self.client.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 100)
+
+    async def test_order_manager_uses_fast_path(self):
+        exchange = ExchangeManager({'exchange_id': 'binance'})
+        exchange.fast = self.client
+        order_manager = OrderManager(exchange)
+        order = await order_manager.place_limit_order('BTC/USDT:USDT', 'buy', 0.01, 100, client_order_id='x-om')
+        self.assertEqual(order.client_order_id, 'x-om')
+        # 权重按fast客户端的响应头同步
+        weight = exchange.rate_limit.budgets['linear'].weight
+        self.assertAlmostEqual(weight.available(), weight.capacity - 1, delta=0.5)
+        canceled = await order_manager.cancel_order(order.id, 'BTC/USDT:USDT')
+        self.assertEqual(canceled.status, 'canceled')
+        await exchange.api.close()
+
+
+    async def test_lone_batched_order_uses_fast_path(self):
+        exchange = ExchangeManager({'exchange_id': 'binance'})
+        exchange.fast = self.client
+        order_manager = OrderManager(exchange)
+        order = await order_manager.place_limit_order_batched('BTC/USDT:USDT', 'buy', 0.01, 100, client_order_id='x-batch')
+        self.assertEqual(order.client_order_id, 'x-batch')
+        self.assertEqual(self.endpoint.requests[-1]['path'], '/fapi/v1/order')
+        await exchange.api.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+
+import numpy as np
+
+
+from entity import OrderResponse
+from fills import FillStore, KIND_HEDGE, KIND_ORDER, export_fills, load_fills, main
+
+
+DAY = 1704067200.0  # 2024-01-01 00:00:00 UTC
+
+
+def order(symbol='BTC/USDT:USDT', id=1, status='filled', filled=1.0, average=100.0):
+    return OrderResponse(
+        id=id, symbol=symbol, status=status, side='sell', amount=1.0, filled=filled, last_filled=filled,
+        remaining=0, client_order_id=f'c{id}', average=average, price=100.0,
+    )
+
+
+class FillStoreTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_disabled_store_records_nothing(self):
+        store = FillStore()
+        store.record_order(order())
+        self.assertEqual(store._rows, 0)
+
+    def test_rows_round_trip_by_symbol_and_day(self):
+        async def run():
+            store = FillStore(self.directory, block_size=8)
+            store.record_order(order(status='new', filled=0, average=None), ts=DAY + 1)
+            store.record_order(order(), ts=DAY + 2)
+            store.record_hedge(order(), 'BTC/USDT', 'buy', 1.0, 1.0, 99.9, 0.001, ts=DAY + 3)
+            store.record_order(order('ETH/USDT:USDT', id=2), ts=DAY + 4)
+            # 跨天时当前块先落盘，每个文件只属于一天
+            store.record_order(order(id=3), ts=DAY + 86400)
+            await store.flush()
+            return store
+
+        store = asyncio.run(run())
+        self.assertEqual(store.written, 5)
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()), ['20240101', '20240102'])
+
+        rows = load_fills(self.directory, symbol='BTC/USDT', day='20240101')
+        self.assertEqual(list(rows['ts']), [DAY + 1, DAY + 2, DAY + 3])
+        self.assertEqual(list(rows['kind']), [KIND_ORDER, KIND_ORDER, KIND_HEDGE])
+        self.assertEqual(list(rows['symbol']), ['BTC/USDT:USDT', 'BTC/USDT:USDT', 'BTC/USDT'])
+        self.assertEqual(list(rows['status']), ['new', 'filled', 'hedged'])
+        self.assertEqual(rows['order_id'][2], '1')
+        self.assertTrue(np.isnan(rows['average'][0]))
+        self.assertAlmostEqual(rows['basis'][2], 0.001)
+
+        self.assertEqual(len(load_fills(self.directory)['ts']), 5)
+        self.assertEqual(list(load_fills(self.directory, start='20240102')['order_id']), ['3'])
+        self.assertEqual(len(load_fills(self.directory / 'missing')['ts']), 0)
+
+    def test_memory_stays_constant(self):
+        async def run():
+            store = FillStore(self.directory, block_size=16, blocks=2)
+            blocks = store._free + [store._block]
+            for i in range(1000):
+                store.record_order(order(id=i), ts=DAY + i)
+                if i % 50 == 0:
+                    await asyncio.sleep(0.01)
+            await store.flush()
+            return store, blocks
+
+        store, blocks = asyncio.run(run())
+        self.assertEqual(store.written + store.dropped, 1000)
+        self.assertEqual({id(block) for block in store._free}, {id(block) for block in blocks})
+        self.assertEqual(len(load_fills(self.directory)['ts']), store.written)
+
+    def test_flush_loop_survives_failed_write(self):
+        async def run():
+            # 目标目录被同名文件占用，第一次落盘失败
+            blocked = self.directory / 'fills'
+            blocked.write_text('')
+            store = FillStore(blocked, block_size=8)
+            task = asyncio.create_task(store.run_flush(0.01))
+            store.record_order(order(), ts=DAY)
+            await asyncio.sleep(0.1)
+            blocked.unlink()
+            store.record_order(order(id=2), ts=DAY + 1)
+            await asyncio.sleep(0.1)
+            self.assertFalse(task.done())
+            task.cancel()
+            return store
+
+        store = asyncio.run(run())
+        self.assertEqual(store.written, 1)
+        self.assertEqual(len(store._free), 4)
+        self.assertEqual(list(load_fills(self.directory / 'fills')['order_id']), ['2'])
+
+    def test_export(self):
+        store = FillStore(self.directory)
+        store.record_order(order(), ts=DAY)
+        store.record_order(order('ETH/USDT:USDT', id=2), ts=DAY + 1)
+        asyncio.run(store.flush())
+
+        self.assertEqual(export_fills(self.directory / 'out.npz', self.directory, symbol='ETH/USDT'), 1)
+        with np.load(self.directory / 'out.npz') as data:
+            self.assertEqual(list(data['symbol']), ['ETH/USDT:USDT'])
+        main(['export', str(self.directory / 'out.csv'), '--directory', str(self.directory)])
+        lines = (self.directory / 'out.csv').read_text().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('ts,kind,symbol'))
+
+
+if __name__ == '__main__':
+    unittest.main()
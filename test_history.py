@@ -0,0 +1,131 @@
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+
+import numpy as np
+
+
+from history import RatioHistory, RatioHistoryStore, load_export, load_recent
+
+
+class RatioHistoryTests(unittest.TestCase):
+    def fill(self, history, n):
+        for i in range(n):
+            history.append(float(i), i * 0.1, i * 0.2, i * 0.3, i * 0.4)
+
+    def test_window_is_a_view_of_newest_rows(self):
+        history = RatioHistory(capacity=8)
+        self.fill(history, 21)
+        window = history.window()
+        self.assertEqual(window.shape, (5, 8))
+        self.assertEqual(list(window[0]), [float(i) for i in range(13, 21)])
+        self.assertTrue(np.shares_memory(window, history._data))
+        self.assertFalse(window.flags.writeable)
+        self.assertEqual(list(history.column('ts', n=3)), [18.0, 19.0, 20.0])
+
+    def test_memory_does_not_grow(self):
+        history = RatioHistory(capacity=16)
+        nbytes = history._data.nbytes
+        self.fill(history, 10000)
+        self.assertEqual(history._data.nbytes, nbytes)
+        self.assertEqual(len(history), 16)
+
+    def test_time_window_and_signals(self):
+        history = RatioHistory(capacity=100)
+        for i in range(10):
+            value = 1.0 if i >= 5 else 0.0
+            history.append(float(i), value, value, value, value)
+        self.assertEqual(len(history.column('open', seconds=3)), 4)
+        self.assertEqual(history.time_above('open', 0.5), 4.0)
+        self.assertEqual(history.percentile('open', 50), 0.5)
+        self.assertAlmostEqual(history.zscore('open', n=10), 1.0)
+
+
+class RatioHistoryStoreTests(unittest.TestCase):
+    def test_export_only_new_rows(self):
+        store = RatioHistoryStore(capacity=32)
+        for i in range(10):
+            store.record('BTC/USDT', 0.1, 0.2, 0.3, 0.4, ts=float(i))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = asyncio.run(store.export(Path(tmp)))
+            data = load_export(path)
+            self.assertEqual(list(data['BTC/USDT']['ts']), [float(i) for i in range(10)])
+
+            self.assertIsNone(asyncio.run(store.export(Path(tmp))))
+            store.record('BTC/USDT', 0.1, 0.2, 0.3, 0.4, ts=10.0)
+            self.assertEqual(list(store.snapshot()['BTC/USDT/ts']), [10.0])
+
+    def test_exports_in_the_same_second_do_not_overwrite(self):
+        store = RatioHistoryStore(capacity=8)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(2):
+                store.record('BTC/USDT', 0.1, 0.2, 0.3, 0.4, ts=float(i))
+                paths.append(asyncio.run(store.export(Path(tmp))))
+            self.assertNotEqual(paths[0], paths[1])
+            self.assertEqual(list(load_recent(Path(tmp))['BTC/USDT']['ts']), [0.0, 1.0])
+
+    def test_overwritten_rows_are_counted(self):
+        store = RatioHistoryStore(capacity=8)
+        for i in range(20):
+            store.record('BTC/USDT', 0.1, 0.2, 0.3, 0.4, ts=float(i))
+        self.assertEqual(list(store.snapshot()['BTC/USDT/ts']), [float(i) for i in range(12, 20)])
+        self.assertEqual(store.lost, {'BTC/USDT': 12})
+
+    def test_export_loop_survives_failed_write(self):
+        class Logger:
+            def __init__(self):
+                self.errors = []
+                self.warnings = []
+
+            def error(self, message):
+                self.errors.append(message)
+
+            def warn(self, message):
+                self.warnings.append(message)
+
+        async def run(directory):
+            store = RatioHistoryStore(capacity=4)
+            logger = Logger()
+            # 导出目录被同名文件占用，第一次导出失败
+            directory.write_text('')
+            task = asyncio.create_task(store.run_export(0.01, directory, logger=logger))
+            store.record('BTC/USDT', 0.1, 0.2, 0.3, 0.4, ts=1.0)
+            await asyncio.sleep(0.1)
+            directory.unlink()
+            for i in range(6):
+                store.record('BTC/USDT', 0.1, 0.2, 0.3, 0.4, ts=float(i + 2))
+            await asyncio.sleep(0.1)
+            self.assertFalse(task.done())
+            task.cancel()
+            return logger
+
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = asyncio.run(run(Path(tmp) / 'history'))
+            self.assertEqual(len(logger.errors), 1)
+            # 写盘失败的1行和被覆盖的2行都计入丢失
+            self.assertEqual(len(logger.warnings), 2)
+            self.assertIn('lost 1 rows', logger.warnings[0])
+            self.assertIn('lost 2 rows', logger.warnings[1])
+            recent = load_recent(Path(tmp) / 'history')
+            self.assertEqual(list(recent['BTC/USDT']['ts']), [4.0, 5.0, 6.0, 7.0])
+
+    def test_load_recent_skips_old_exports(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, ts in (('ratios-1.npz', 1.0), ('ratios-2.npz', 2.0), ('ratios-3.npz', 3.0)):
+                RatioHistoryStore._write(Path(tmp) / name, {'BTC/USDT/ts': np.array([ts]), 'BTC/USDT/open_raw': np.array([ts / 10])})
+            old = time.time() - 3600
+            os.utime(Path(tmp) / 'ratios-1.npz', (old, old))
+
+            recent = load_recent(Path(tmp), max_age=300)
+            self.assertEqual(list(recent['BTC/USDT']['ts']), [2.0, 3.0])
+            self.assertEqual(load_recent(Path(tmp) / 'missing'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
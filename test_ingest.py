@@ -0,0 +1,79 @@
+import time
+import asyncio
+import threading
+import unittest
+
+
+import msgpack
+
+
+from entity import MarketDataStore, Quote
+from ingest import QuoteTable
+from loadgen import LoadIngestNatsManager
+from manager import NATS_MESSAGES
+
+
+class QuoteTableTests(unittest.TestCase):
+    def test_rows_round_trip(self):
+        table = QuoteTable(capacity=2)
+        row = table.row('A/USDT')
+        self.assertEqual(table.row('A/USDT'), row)
+        table.write(row, 101.0, 100.0, 5.0, 6.0, 7)
+        quote = Quote()
+        self.assertTrue(table.copy_to('A/USDT', quote))
+        self.assertEqual((quote.ask, quote.bid, quote.exchange_ts, quote.recv_ts, quote.update_id), (101.0, 100.0, 5.0, 6.0, 7))
+        self.assertFalse(table.copy_to('B/USDT', quote))
+        table.row('B/USDT')
+        with self.assertRaises(OverflowError):
+            table.row('C/USDT')
+
+
+class IngestNatsManagerTests(unittest.TestCase):
+    def test_interest_reaches_loop_before_sweep(self):
+        async def run():
+            manager = LoadIngestNatsManager(interest={'IGA/USDT'}.__contains__, sweep_interval=0.2)
+            await manager.subscribe()
+            # 价差图只能在主线程修改
+            spreads = MarketDataStore.spreads
+            pair, threads = spreads._pair, set()
+
+            def record_pair(symbol):
+                threads.add(threading.current_thread())
+                pair(symbol)
+            spreads._pair = record_pair
+
+            async def publish(subject, symbol, price, update_id):
+                data = msgpack.packb({'s': symbol, 'a': price * 1.0001, 'b': price, 'T': time.time() * 1000 - 5, 'u': update_id})
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(manager.broker.publish(subject, data), manager.loop))
+
+            for base in ('IGA', 'IGB'):
+                await publish(f'binance.spot.bookTicker.{base}USDT', f'{base}/USDT', 10, 5)
+                await publish(f'binance.linear.bookTicker.{base}USDT', f'{base}/USDT:USDT', 10.01, 5)
+            # 旧的update id被丢弃
+            await publish('binance.spot.bookTicker.IGAUSDT', 'IGA/USDT', 8, 3)
+            await publish('binance.spot.bookTicker.IGAUSDT', 'IGA/USDT', 9, 6)
+            await asyncio.sleep(0.05)
+            hot = (MarketDataStore.quote['IGA/USDT'].bid, 'IGB/USDT' in MarketDataStore.open_ratio)
+            await asyncio.sleep(0.3)
+            swept = 'IGB/USDT' in MarketDataStore.open_ratio
+            await manager.close()
+            del spreads._pair
+            self.assertEqual(threads, {threading.current_thread()})
+            return manager, hot, swept
+
+        manager, hot, swept = asyncio.run(run())
+        self.assertEqual(hot, (9.0, False))
+        self.assertTrue(swept)
+        self.assertIn('IGA/USDT', MarketDataStore.open_ratio)
+        self.assertEqual(manager.out_of_order['IGA/USDT'], 1)
+        self.assertEqual(manager.feed_lag['binance.spot.bookTicker.IGAUSDT'].count, 2)
+        self.assertEqual(manager.report()['ingest']['out_of_order'], 1)
+        # 线程内的消息计数由事件循环发布到指标
+        self.assertEqual(manager.messages['binance.spot.bookTicker.IGAUSDT'], 3)
+        self.assertEqual(NATS_MESSAGES.labels('binance.spot.bookTicker.IGAUSDT').get(), 3)
+        self.assertEqual(manager.pending(), 0)
+        self.assertFalse(manager._thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+
+import msgpack
+
+
+from entity import MarketDataStore
+from loadgen import TickGenerator, compare_order_path, find_saturation, saturation_reason
+
+
+class TickGeneratorTests(unittest.TestCase):
+    def test_messages_match_nats_format(self):
+        generator = TickGenerator(symbols=2)
+        subject, data = generator.next()
+        tick = msgpack.unpackb(data)
+        self.assertEqual(set(tick), {'s', 'a', 'b', 'E', 'T', 'u'})
+        self.assertTrue(subject.startswith('binance.spot.bookTicker.') or subject.startswith('binance.linear.bookTicker.'))
+        self.assertEqual(subject.rsplit('.', 1)[1], tick['s'].split(':')[0].replace('/', ''))
+        self.assertGreater(tick['a'], tick['b'])
+
+
+class LoadTestTests(unittest.IsolatedAsyncioTestCase):
+    async def test_steps_report_latency_and_saturation(self):
+        result = await find_saturation([500, 1000], symbols=5, duration=0.2, burst=10)
+        self.assertEqual(len(result['steps']), 2)
+        self.assertEqual(result['saturation_rate'], 1000)
+        step = result['steps'][0]
+        self.assertGreater(step['ratio_changed'], 0)
+        self.assertLessEqual(step['latency_ms'][50], step['latency_ms'][99])
+        self.assertEqual(step['queue_end'], 0)
+        self.assertTrue(MarketDataStore.suppress_warmup)
+
+    def test_order_path_inline_and_ingest(self):
+        results = compare_order_path([500], symbols=5, duration=0.2, burst=5)
+        self.assertEqual([result['ingest'] for result in results], [False, True])
+        for result in results:
+            self.assertGreater(result['published_rate'], 0)
+            self.assertGreater(result['replies'], 0)
+            self.assertLessEqual(result['reply_ms'][50], result['reply_ms'][99])
+
+    def test_saturation_reasons(self):
+        step = {'rate': 1000, 'published_rate': 1000, 'processed_rate': 1000, 'queue_end': 0}
+        self.assertEqual(saturation_reason(step), '')
+        self.assertIn('publish', saturation_reason(dict(step, published_rate=500)))
+        self.assertIn('processing', saturation_reason(dict(step, processed_rate=500)))
+
+
+if __name__ == '__main__':
+    unittest.main()
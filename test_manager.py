@@ -0,0 +1,142 @@
+import asyncio
+import unittest
+
+
+from fakes import MockExchangeApi, MockMarketOrders
+from manager import ExchangeManager, OrderManager, HedgeAggregator
+from entity import MarketDataStore, Quote
+
+
+def make_order_manager(api, batch_window=0.002):
+    exchange = ExchangeManager({'exchange_id': 'binance'})
+    exchange.api = api
+    return OrderManager(exchange, batch_window=batch_window)
+
+
+def limit_order(symbol, price=1.0):
+    return {'symbol': symbol, 'side': 'sell', 'amount': 10, 'price': price, 'client_order_id': 'x-test'}
+
+
+class PlaceOrdersBatchTests(unittest.IsolatedAsyncioTestCase):
+    async def test_linear_orders_are_chunked(self):
+        api = MockExchangeApi()
+        order_manager = make_order_manager(api)
+        orders = [limit_order(f'COIN{i}/USDT:USDT', price=i) for i in range(12)]
+
+        results = await order_manager.place_orders_batch(orders)
+
+        self.assertEqual(sorted(api.calls), [('create_orders', 2), ('create_orders', 5), ('create_orders', 5)])
+        self.assertEqual([res.symbol for res in results], [order['symbol'] for order in orders])
+        self.assertEqual([res.price for res in results], list(range(12)))
+
+    async def test_per_order_errors_and_spot_fallback(self):
+        api = MockExchangeApi(reject_symbols={'BAD/USDT:USDT'})
+        order_manager = make_order_manager(api)
+        orders = [limit_order('ETH/USDT:USDT'), limit_order('BAD/USDT:USDT'), limit_order('ETH/USDT')]
+
+        results = await order_manager.place_orders_batch(orders)
+
+        self.assertEqual(results[0].symbol, 'ETH/USDT:USDT')
+        self.assertIsInstance(results[1], Exception)
+        self.assertIn('-2019', str(results[1]))
+        self.assertEqual(results[2].symbol, 'ETH/USDT')
+        self.assertIn(('create_order', 'ETH/USDT'), api.calls)
+
+    async def test_orders_from_same_tick_share_a_batch(self):
+        api = MockExchangeApi()
+        order_manager = make_order_manager(api, batch_window=0.01)
+
+        results = await asyncio.gather(*[
+            order_manager.place_limit_order_batched(symbol=f'COIN{i}/USDT:USDT', side='sell', amount=1, price=1)
+            for i in range(3)
+        ])
+
+        self.assertEqual(api.calls, [('create_orders', 3)])
+        self.assertEqual([res.symbol for res in results], [f'COIN{i}/USDT:USDT' for i in range(3)])
+
+    async def test_single_linear_order_skips_batch_endpoint(self):
+        api = MockExchangeApi()
+        order_manager = make_order_manager(api)
+        orders = [limit_order(f'COIN{i}/USDT:USDT', price=i) for i in range(6)]
+
+        results = await order_manager.place_orders_batch(orders)
+        res = await order_manager.place_limit_order_batched(symbol='ETH/USDT:USDT', side='sell', amount=1, price=1)
+
+        # 单独一单走create_order，weight 1而不是批量接口的5
+        self.assertEqual(api.calls, [('create_orders', 5), ('create_order', 'COIN5/USDT:USDT'), ('create_order', 'ETH/USDT:USDT')])
+        self.assertEqual([res.price for res in results], list(range(6)))
+        self.assertEqual(res.symbol, 'ETH/USDT:USDT')
+
+    async def test_batched_order_returns_none_on_error(self):
+        api = MockExchangeApi(reject_symbols={'BAD/USDT:USDT'})
+        order_manager = make_order_manager(api)
+
+        res = await order_manager.place_limit_order_batched(symbol='BAD/USDT:USDT', side='sell', amount=1, price=1)
+
+        self.assertIsNone(res)
+
+
+class HedgeAggregatorTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        MarketDataStore.quote['HEDGE/USDT'] = Quote(ask=100, bid=99)
+
+    async def test_partial_fills_are_coalesced(self):
+        orders = MockMarketOrders()
+        hedger = HedgeAggregator(orders, window=0.01, max_notional=10000, min_notional=0)
+        fills = []
+        for _ in range(20):
+            hedger.add('HEDGE/USDT', 'buy', 0.5, lambda filled, average: fills.append((filled, average)))
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(orders.orders, [('HEDGE/USDT', 'buy', 10.0)])
+        self.assertEqual(fills, [(0.5, 100.0)] * 20)
+
+    async def test_final_piece_and_size_threshold_flush_immediately(self):
+        orders = MockMarketOrders()
+        hedger = HedgeAggregator(orders, window=10, max_notional=150, min_notional=0)
+        hedger.add('HEDGE/USDT', 'buy', 1, lambda *_: None)
+        hedger.add('HEDGE/USDT', 'buy', 1, lambda *_: None)
+        hedger.add('HEDGE/USDT', 'sell', 0.1, lambda *_: None, final=True)
+        await asyncio.sleep(0)
+
+        self.assertEqual(sorted(orders.orders), [('HEDGE/USDT', 'buy', 2), ('HEDGE/USDT', 'sell', 0.1)])
+
+    async def test_below_min_notional_waits_for_more(self):
+        orders = MockMarketOrders()
+        hedger = HedgeAggregator(orders, window=0.01, max_notional=10000, min_notional=50, max_wait=0.1)
+        hedger.add('HEDGE/USDT', 'buy', 0.1, lambda *_: None)
+        await asyncio.sleep(0.03)
+        self.assertEqual(orders.orders, [])
+
+        await asyncio.sleep(0.15)
+        self.assertEqual(orders.orders, [('HEDGE/USDT', 'buy', 0.1)])
+
+    async def test_short_fill_is_shared_pro_rata(self):
+        orders = MockMarketOrders(fill_ratio=0.5)
+        hedger = HedgeAggregator(orders, window=0.01, max_notional=10000, min_notional=0)
+        fills = []
+        hedger.add('HEDGE/USDT', 'buy', 1, lambda filled, average: fills.append(filled))
+        hedger.add('HEDGE/USDT', 'buy', 3, lambda filled, average: fills.append(filled), final=True)
+        await asyncio.sleep(0)
+
+        self.assertEqual(fills, [0.5, 1.5])
+
+
+class ResponseHeaderTests(unittest.TestCase):
+    def test_headers_sync_the_family_of_their_own_response(self):
+        exchange = ExchangeManager({'exchange_id': 'binance'})
+        self.assertFalse(exchange.api.enableRateLimit)
+        budgets = exchange.rate_limit.budgets
+        # 现货的已用权重不能记到合约的额度上
+        exchange.api.on_rest_response(200, 'OK', 'https://api.binance.com/api/v3/account', 'GET', {'x-mbx-used-weight-1m': '3000'}, '{}', {}, None)
+        self.assertAlmostEqual(budgets['spot'].weight.available(), 3000, delta=1)
+        self.assertAlmostEqual(budgets['linear'].weight.available(), 2400, delta=1)
+        exchange.api.on_rest_response(429, 'Too Many Requests', 'https://fapi.binance.com/fapi/v1/order', 'POST', {'Retry-After': '5'}, '{}', {}, None)
+        self.assertGreater(budgets['linear'].blocked_until, budgets['spot'].blocked_until)
+        # sapi有单独的限额
+        exchange.api.on_rest_response(200, 'OK', 'https://api.binance.com/sapi/v1/asset', 'GET', {'x-mbx-used-weight-1m': '5000'}, '{}', {}, None)
+        self.assertAlmostEqual(budgets['spot'].weight.available(), 3000, delta=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
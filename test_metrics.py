@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+
+from entity import EventSystem
+from fakes import MockExchangeApi
+from manager import ORDERS
+from metrics import MetricRegister, metric_register
+from test_manager import make_order_manager
+
+
+class MetricRegisterTests(unittest.TestCase):
+    def test_render_exposition_format(self):
+        register = MetricRegister()
+        counter = register.counter('messages_total', 'Messages', ('subject',))
+        counter.labels('binance.spot.bookTicker.BTCUSDT').inc()
+        counter.labels('binance.spot.bookTicker.BTCUSDT').inc(2)
+        counter.labels('quote"d').inc()
+        depth = register.gauge('queue_depth', 'Queue depth', ('queue',))
+        items = [1, 2, 3]
+        depth.labels('nats').set_function(lambda: len(items))
+        flush = register.histogram('flush_seconds', 'Flush time', buckets=(0.01, 0.1))
+        for value in (0.005, 0.01, 0.05, 1.0):
+            flush.observe(value)
+
+        lines = register.render().splitlines()
+        self.assertIn('# TYPE messages_total counter', lines)
+        self.assertIn('messages_total{subject="binance.spot.bookTicker.BTCUSDT"} 3', lines)
+        self.assertIn('messages_total{subject="quote\\"d"} 1', lines)
+        self.assertIn('queue_depth{queue="nats"} 3', lines)
+        self.assertIn('flush_seconds_bucket{le="0.01"} 2', lines)
+        self.assertIn('flush_seconds_bucket{le="0.1"} 3', lines)
+        self.assertIn('flush_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn('flush_seconds_count 4', lines)
+
+    def test_same_name_returns_same_metric(self):
+        register = MetricRegister()
+        self.assertIs(register.counter('a_total', 'A'), register.counter('a_total', 'A'))
+        with self.assertRaises(ValueError):
+            register.gauge('a_total', 'A')
+        with self.assertRaises(ValueError):
+            register.counter('b_total', 'B', ('x',)).labels('1', '2')
+
+
+class MetricsEndpointTests(unittest.IsolatedAsyncioTestCase):
+    async def test_endpoint_serves_instrumented_metrics(self):
+        await EventSystem.emit('metrics_test')
+        rejected = ORDERS.labels('rejected').get()
+        order_manager = make_order_manager(MockExchangeApi(error=ConnectionError('down')))
+        await order_manager.place_limit_order('METRIC/USDT:USDT', 'sell', 1, 1)
+        self.assertEqual(ORDERS.labels('rejected').get(), rejected + 1)
+
+        server = await metric_register.serve(port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = (await reader.read()).decode()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+
+        self.assertTrue(response.startswith('HTTP/1.1 200 OK'))
+        self.assertIn('event_emits_total{event="metrics_test"} 1', response)
+        self.assertIn('queue_depth{queue="user_data"} 0', response)
+        self.assertIn(f'orders_total{{outcome="rejected"}} {rejected + 1}', response)
+
+
+if __name__ == '__main__':
+    unittest.main()
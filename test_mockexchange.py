@@ -0,0 +1,116 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+
+import ccxt.pro as ccxtpro
+
+
+from entity import Context, EventSystem
+from fastrest import FastOrderClient
+from manager import AccountManager, ExchangeManager, OrderManager
+from mockexchange import MockExchange, local_market, route_ccxt
+
+
+MARKETS = [local_market('BTC/USDT:USDT', 'BTCUSDT'), local_market('BTC/USDT', 'BTCUSDT')]
+
+
+async def wait_for(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError('timed out')
+        await asyncio.sleep(0.01)
+
+
+class MockExchangeEndToEndTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.mock = MockExchange()
+        await self.mock.start()
+        self.exchange = ExchangeManager({'exchange_id': 'binance', **self.mock.config(), 'fast_orders': True, 'event_suffix': '@mock', 'user_data_legs': 2})
+        route_ccxt(self.exchange.api, self.mock.base_url)
+        self.exchange.api.set_markets(MARKETS)
+        await self.exchange.load_markets()
+        self.order = OrderManager(self.exchange)
+        self.context = Context(Path(self._tmp.name))
+        self.account = AccountManager(self.context, '@mock')
+        self.events = []
+        EventSystem.on('partially_filled_order', self._collect)
+        EventSystem.on('filled_order', self._collect)
+
+    async def asyncTearDown(self):
+        await self.exchange.close()
+        await self.mock.stop()
+        self._tmp.cleanup()
+
+    def _collect(self, order):
+        if order.client_order_id.startswith('x-mock'):
+            self.events.append((order.status, order.filled))
+
+    def connected(self, count: int = 4):
+        return lambda: sum(len(streams) for streams in self.mock._streams.values()) == count
+
+    async def test_limit_order_fills_through_user_data_stream(self):
+        await self.exchange.watch_user_data_stream()
+        await wait_for(self.connected())
+        await wait_for(lambda: self.mock.keepalives >= 1)
+
+        order = await self.order.place_limit_order('BTC/USDT:USDT', 'buy', 0.01, 99.5, client_order_id='x-mock-1')
+        self.assertEqual(order.status, 'open')
+        self.mock.set_quote('linear', 'BTCUSDT', 99, 99.5, ask_qty=0.004)
+        await wait_for(lambda: len(self.events) == 1)
+        self.assertEqual(self.events[0][0], 'partially_filled')
+        self.assertAlmostEqual(self.events[0][1], 0.004)
+
+        # 断线后用新的listen key重连，之后的成交照常推送
+        self.mock.disconnect('linear')
+        await wait_for(self.connected(2))
+        await wait_for(self.connected())
+        self.mock.set_quote('linear', 'BTCUSDT', 99, 99.4)
+        await wait_for(lambda: len(self.events) == 2)
+        self.assertEqual(self.events[1][0], 'filled')
+        await wait_for(lambda: 'BTC/USDT:USDT' in self.context.position)
+        self.assertAlmostEqual(self.context.position['BTC/USDT:USDT'].amount, 0.01)
+        self.assertEqual(self.mock.positions['BTCUSDT'], [0.01, 99.5])
+        self.assertEqual(self.context.futures_account.USDT, 100000.0)
+
+    async def test_spot_market_order_and_book_ticker(self):
+        self.mock.set_quote('spot', 'BTCUSDT', 99.9, 100, ask_qty=0.3)
+        order = await self.order.place_market_order('BTC/USDT', 'buy', 0.5, client_order_id='x-mock-2')
+        # 盘口只有0.3，剩余部分过期
+        self.assertEqual(order.status, 'expired')
+        self.assertAlmostEqual(order.filled, 0.3)
+        self.assertEqual(order.average, 100)
+        self.assertAlmostEqual(self.mock.balances['spot']['BTC'], 0.3)
+
+        tickers = await self.exchange.fetch_bids_asks('spot')
+        self.assertEqual((tickers['BTC/USDT']['bid'], tickers['BTC/USDT']['ask']), (99.9, 100))
+        self.assertIsNone(await self.order.cancel_order('404', 'BTC/USDT:USDT'))
+        with self.assertRaises(ccxtpro.OrderNotFound):
+            await self.exchange.fast.cancel_order('404', 'BTC/USDT:USDT')
+
+
+class MockExchangeLimitTests(unittest.IsolatedAsyncioTestCase):
+    async def test_rate_limit_and_latency(self):
+        limits = {'linear': {'weight': (2, 60, 'x-mbx-used-weight-1m'), 'orders': [(300, 10, 'x-mbx-order-count-10s')]}}
+        mock = MockExchange(latency=0.05, limits=limits)
+        base = await mock.start()
+        client = FastOrderClient('key', 'secret', {'BTC/USDT:USDT': MARKETS[0]}, base_urls={'spot': base, 'linear': base})
+        try:
+            start = asyncio.get_running_loop().time()
+            await client.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 100)
+            self.assertGreaterEqual(asyncio.get_running_loop().time() - start, 0.05)
+            self.assertEqual(client.last_response_headers['X-MBX-ORDER-COUNT-10S'], '1')
+            await client.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 100)
+            with self.assertRaises(ccxtpro.RateLimitExceeded):
+                await client.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 100)
+            self.assertIn('Retry-After', client.last_response_headers)
+        finally:
+            await client.close()
+            await mock.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
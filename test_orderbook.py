@@ -0,0 +1,142 @@
+import random
+import asyncio
+import unittest
+from orderbook import PriceLadder, OrderBook, OrderBookManager
+
+
+class LocalDepthFeed:
+    """Stand-in for the exchange: keeps a true book and emits Binance-style diff updates."""
+    def __init__(self, symbol='BTCUSDT', futures=True, seed=0):
+        self.symbol = symbol
+        self.futures = futures
+        self.random = random.Random(seed)
+        self.update_id = 100
+        self.bids = {100.0 - i * 0.1: 1.0 for i in range(1, 21)}
+        self.asks = {100.0 + i * 0.1: 1.0 for i in range(0, 20)}
+
+    def snapshot(self):
+        return {
+            'nonce': self.update_id,
+            'bids': sorted(self.bids.items(), reverse=True),
+            'asks': sorted(self.asks.items()),
+        }
+
+    def diff(self):
+        bids, asks = [], []
+        for _ in range(self.random.randint(1, 5)):
+            side, levels = self.random.choice([(bids, self.bids), (asks, self.asks)])
+            base = 99.9 if levels is self.bids else 100.0
+            price = round(base + self.random.randint(-20, 20) * 0.1, 1)
+            size = self.random.choice([0.0, 0.5, 1.0, 2.0])
+            if size:
+                levels[price] = size
+            else:
+                levels.pop(price, None)
+            side.append([str(price), str(size)])
+        previous = self.update_id
+        self.update_id += self.random.randint(1, 3)
+        data = {'s': self.symbol, 'U': previous + 1, 'u': self.update_id, 'b': bids, 'a': asks}
+        if self.futures:
+            data['pu'] = previous
+        return data
+
+
+class PriceLadderTests(unittest.TestCase):
+    def test_sorted_updates_and_deletes(self):
+        ladder = PriceLadder('bid')
+        for price in (99.0, 101.0, 100.0):
+            ladder.set(price, 1.0)
+        ladder.set(100.0, 3.0)
+        ladder.set(101.0, 0)
+        self.assertEqual(ladder.levels(), [(100.0, 3.0), (99.0, 1.0)])
+
+    def test_vwap_and_depth(self):
+        ladder = PriceLadder('ask')
+        ladder.set(100.0, 1.0)
+        ladder.set(101.0, 1.0)
+        ladder.set(105.0, 10.0)
+        price, amount = ladder.vwap(150.0)
+        self.assertAlmostEqual(amount, 1.0 + 50.0 / 101.0)
+        self.assertAlmostEqual(price, 150.0 / amount)
+        self.assertIsNone(ladder.vwap(1e6))
+        self.assertIsNone(ladder.vwap(0.0))
+        self.assertIsNone(PriceLadder('bid').vwap(-1.0))
+        self.assertEqual(ladder.depth_within(1, 1.0), 2.0)
+        self.assertEqual(ladder.depth_within(0, 1.0), 1.0)
+
+    def test_max_levels(self):
+        ladder = PriceLadder('ask', max_levels=3)
+        for price in (5.0, 4.0, 3.0, 2.0, 1.0):
+            ladder.set(price, 1.0)
+        self.assertEqual([price for price, _ in ladder.levels()], [1.0, 2.0, 3.0])
+
+
+class OrderBookTests(unittest.TestCase):
+    def assertBookMatches(self, book, feed):
+        self.assertEqual(book.bids.levels(), sorted(feed.bids.items(), reverse=True))
+        self.assertEqual(book.asks.levels(), sorted(feed.asks.items()))
+
+    def test_follows_local_feed(self):
+        for futures in (True, False):
+            feed = LocalDepthFeed(futures=futures)
+            book = OrderBook(feed.symbol)
+            snapshot = feed.snapshot()
+            book.apply_snapshot(snapshot['nonce'], snapshot['bids'], snapshot['asks'])
+            for _ in range(2000):
+                self.assertTrue(book.apply_diff(feed.diff()))
+            self.assertBookMatches(book, feed)
+            self.assertEqual(book.gaps, 0)
+
+    def test_buffers_until_snapshot(self):
+        feed = LocalDepthFeed()
+        early = [feed.diff() for _ in range(3)]
+        snapshot = feed.snapshot()
+        late = [feed.diff() for _ in range(3)]
+
+        book = OrderBook(feed.symbol)
+        for data in early + late:
+            self.assertFalse(book.apply_diff(data))
+        book.apply_snapshot(snapshot['nonce'], snapshot['bids'], snapshot['asks'])
+        self.assertTrue(book.synced)
+        self.assertBookMatches(book, feed)
+
+    def test_gap_is_detected(self):
+        feed = LocalDepthFeed()
+        book = OrderBook(feed.symbol)
+        snapshot = feed.snapshot()
+        book.apply_snapshot(snapshot['nonce'], snapshot['bids'], snapshot['asks'])
+        book.apply_diff(feed.diff())
+        feed.diff()  # 丢失一条
+        self.assertFalse(book.apply_diff(feed.diff()))
+        self.assertFalse(book.synced)
+        self.assertEqual(book.gaps, 1)
+
+
+class OrderBookManagerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_resync_after_gap(self):
+        feed = LocalDepthFeed()
+        fetches = []
+
+        async def fetch_snapshot(symbol):
+            fetches.append(symbol)
+            return feed.snapshot()
+
+        books = OrderBookManager(fetch_snapshot)
+        books.on_message(feed.diff())
+        await asyncio.sleep(0)
+        for _ in range(50):
+            books.on_message(feed.diff())
+        feed.diff()
+        for _ in range(50):
+            books.on_message(feed.diff())
+        await asyncio.sleep(0)
+
+        book = books.book(feed.symbol)
+        self.assertEqual(fetches, [feed.symbol, feed.symbol])
+        self.assertTrue(book.synced)
+        self.assertEqual(book.last_update_id, feed.update_id)
+        self.assertEqual(book.bids.levels(), sorted(feed.bids.items(), reverse=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import tempfile
+import unittest
+from itertools import count
+from pathlib import Path
+
+
+from fakes import MockExchangeApi
+from pool import AccountPool
+
+
+def order_trade_update(symbol, side, amount, price, order_id):
+    return {
+        'e': 'ORDER_TRADE_UPDATE',
+        'o': {'s': symbol, 'c': 'x-pool', 'S': side, 'q': str(amount), 'p': str(price), 'ap': str(price), 'X': 'FILLED',
+              'i': order_id, 'l': str(amount), 'z': str(amount), 't': order_id, 'x': 'TRADE'},
+    }
+
+
+class AccountPoolTests(unittest.IsolatedAsyncioTestCase):
+    pools = count()
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # 监听器注册在全局EventSystem上，每个测试使用不同的账户名，避免收到其它测试账户的事件
+        n = next(self.pools)
+        self.pool = AccountPool(
+            {'exchange_id': 'binance'},
+            [{'name': f'a{n}', 'apiKey': ''}, {'name': f'b{n}', 'apiKey': ''}],
+            directory=Path(self.tmp.name),
+        )
+        self.a, self.b = self.pool.accounts.values()
+        self.a.exchange.api = MockExchangeApi(usdt=100)
+        self.b.exchange.api = MockExchangeApi(usdt=50)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_pairs_are_spread_and_hedges_stay_with_their_pair(self):
+        for base in ('P1', 'P2', 'P3', 'P4'):
+            await self.pool.place_limit_order(f'{base}/USDT:USDT', 'sell', 1, 10)
+        self.assertEqual(len(self.a.pairs), 2)
+        self.assertEqual(len(self.b.pairs), 2)
+
+        owner = self.pool.account_for('P3/USDT:USDT')
+        await self.pool.place_market_order('P3/USDT', 'buy', 1)
+        self.assertIn(('create_order', 'P3/USDT'), owner.exchange.api.calls)
+
+    async def test_cancel_goes_to_the_placing_account(self):
+        order = await self.pool.place_limit_order('P1/USDT:USDT', 'sell', 1, 10)
+        owner = self.pool.account_for('P1/USDT:USDT')
+        other = self.b if owner is self.a else self.a
+        # 即使路由已经改变，撤单仍发往下单的账户
+        self.pool._routes['P1/USDT'] = other
+        res = await self.pool.cancel_order(order['id'], 'P1/USDT:USDT')
+        self.assertEqual(res['status'], 'canceled')
+        self.assertIn(('cancel_order', 'P1/USDT:USDT'), owner.exchange.api.calls)
+
+    async def test_filled_order_is_forgotten(self):
+        order = await self.pool.place_limit_order('P1/USDT:USDT', 'sell', 1, 10)
+        other = await self.pool.place_limit_order('P2/USDT:USDT', 'sell', 1, 10)
+        owner = self.pool.account_for('P1/USDT:USDT')
+        # user data事件中的订单id是整数
+        owner.exchange._dispatch(order_trade_update('P1USDT', 'SELL', 1, 10, int(order['id'])))
+        await asyncio.sleep(0.05)
+        self.assertNotIn(order['id'], self.pool._orders)
+
+        other_owner = self.pool.account_for('P2/USDT:USDT')
+        self.pool._routes['P2/USDT'] = self.a if other_owner is self.b else self.b
+        res = await self.pool.cancel_order(int(other['id']), 'P2/USDT:USDT')
+        self.assertEqual(res['status'], 'canceled')
+        self.assertIn(('cancel_order', 'P2/USDT:USDT'), other_owner.exchange.api.calls)
+        self.assertEqual(self.pool._orders, {})
+
+    async def test_pairs_leave_an_exhausted_account_unless_it_holds_a_position(self):
+        self.assertIs(self.pool.account_for('FREE/USDT:USDT'), self.a)
+        self.assertIs(self.pool.account_for('HELD/USDT:USDT'), self.b)
+        self.pool._routes['HELD/USDT'] = self.a
+        self.a.context.position.update('HELD/USDT:USDT', -1, 10)
+        for bucket in self.a.exchange.rate_limit.budgets['linear'].orders:
+            bucket.consume(bucket.capacity * 0.9)
+
+        self.assertIs(self.pool.account_for('FREE/USDT:USDT'), self.b)
+        self.assertIs(self.pool.account_for('HELD/USDT:USDT'), self.a)
+
+    async def test_user_data_updates_only_the_owning_context(self):
+        self.a.exchange._dispatch(order_trade_update('UDUSDT', 'SELL', 2, 10, 1))
+        self.b.exchange._dispatch(order_trade_update('UDUSDT', 'SELL', 1, 13, 2))
+        self.b.exchange._dispatch({'e': 'ACCOUNT_UPDATE', 'a': {'B': [{'a': 'USDT', 'wb': '70'}]}})
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.a.context.position['UD/USDT:USDT'].amount, -2)
+        self.assertEqual(self.b.context.position['UD/USDT:USDT'].amount, -1)
+        self.assertEqual(self.b.context.futures_account.USDT, 70)
+        self.assertNotEqual(self.a.context.futures_account.USDT, 70)
+
+        position = self.pool.positions['UD/USDT:USDT']
+        self.assertEqual(position.amount, -3)
+        self.assertAlmostEqual(position.avg_price, 11)
+        self.assertEqual(list(self.pool.positions), ['UD/USDT:USDT'])
+        self.assertNotIn('UD/USDT', self.pool.positions)
+
+    async def test_reconcile_every_account(self):
+        self.b.exchange.api.positions = [{'symbol': 'R/USDT:USDT', 'contracts': 3.0, 'side': 'short', 'entryPrice': 5.0, 'markPrice': 5.0}]
+        corrected = await self.pool.reconcile()
+        self.assertEqual(corrected, 1)
+        self.assertEqual(self.b.context.position['R/USDT:USDT'].amount, -3)
+        self.assertNotIn('R/USDT:USDT', self.a.context.position)
+        self.assertEqual(self.pool.balances('future')['USDT'], 150)
+        self.assertEqual(self.pool.balances('spot')['USDT'], 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
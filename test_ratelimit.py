@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+from ratelimit import RateLimiter, TokenBucket, PRIORITY_CANCEL, PRIORITY_ORDER, PRIORITY_INFO
+
+
+LIMITS = {
+    'linear': {
+        'weight': (10, 1, 'x-mbx-used-weight-1m'),
+        'orders': [(5, 1, 'x-mbx-order-count-10s')],
+    },
+}
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_refill_and_sync(self):
+        bucket = TokenBucket(10, 1)
+        bucket.consume(10)
+        self.assertAlmostEqual(bucket.available(bucket.updated + 0.5), 5)
+
+        bucket.sync_used(8, now=bucket.updated)
+        self.assertAlmostEqual(bucket.available(bucket.updated), 2)
+
+        # 交易所报告的用量更少时不放松本地估计
+        bucket.sync_used(0, now=bucket.updated)
+        self.assertAlmostEqual(bucket.available(bucket.updated), 2)
+
+
+class RateLimiterTests(unittest.IsolatedAsyncioTestCase):
+    async def test_acquire_within_budget_is_immediate(self):
+        limiter = RateLimiter(LIMITS, reserve_ratio=0)
+        for _ in range(5):
+            await asyncio.wait_for(limiter.acquire('linear', orders=1, priority=PRIORITY_ORDER), 0.01)
+        self.assertLess(limiter.headroom('linear')['x-mbx-order-count-10s'], 0.01)
+
+    async def test_cancels_are_scheduled_before_orders_and_info(self):
+        limiter = RateLimiter(LIMITS, reserve_ratio=0)
+        limiter.budgets['linear'].weight.consume(10)
+        done = []
+
+        async def request(name, priority):
+            await limiter.acquire('linear', weight=2, priority=priority)
+            done.append(name)
+
+        tasks = [
+            asyncio.create_task(request('info', PRIORITY_INFO)),
+            asyncio.create_task(request('order', PRIORITY_ORDER)),
+            asyncio.create_task(request('cancel', PRIORITY_CANCEL)),
+        ]
+        await asyncio.wait_for(asyncio.gather(*tasks), 2)
+        self.assertEqual(done, ['cancel', 'order', 'info'])
+
+    async def test_sync_with_used_weight_headers(self):
+        limiter = RateLimiter(LIMITS, reserve_ratio=0)
+        limiter.sync('linear', {'X-MBX-USED-WEIGHT-1M': '9', 'Content-Type': 'application/json'})
+        self.assertAlmostEqual(limiter.headroom('linear')['x-mbx-used-weight-1m'], 0.1, places=1)
+
+    async def test_info_requests_keep_reserve(self):
+        limiter = RateLimiter(LIMITS, reserve_ratio=0.5)
+        limiter.budgets['linear'].weight.consume(6)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire('linear', priority=PRIORITY_INFO), 0.05)
+        await asyncio.wait_for(limiter.acquire('linear', priority=PRIORITY_CANCEL), 0.05)
+
+    async def test_block_after_ban(self):
+        limiter = RateLimiter(LIMITS, reserve_ratio=0)
+        limiter.block('linear', 0.1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire('linear', priority=PRIORITY_CANCEL), 0.05)
+        await asyncio.wait_for(limiter.acquire('linear', priority=PRIORITY_CANCEL), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+import json
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+
+import msgpack
+from aiohttp import web
+
+
+from entity import MarketDataStore
+from manager import NatsManager, ExchangeManager
+from redundancy import FeedArbiter, book_ticker_key, user_data_key
+from utils import user_data_stream
+
+
+class FeedArbiterTests(unittest.TestCase):
+    def test_first_arrival_wins(self):
+        arbiter = FeedArbiter(legs=2)
+        self.assertTrue(arbiter.accept(('BTC/USDT', 1), 'b', 100.0))
+        self.assertFalse(arbiter.accept(('BTC/USDT', 1), 'a', 103.0))
+        self.assertTrue(arbiter.accept(('BTC/USDT', 2), 'a', 104.0))
+        self.assertEqual(dict(arbiter.wins), {'b': 1, 'a': 1})
+        self.assertEqual(arbiter.lead['b'].last, 3.0)
+        self.assertEqual(arbiter.report()['b']['share'], 0.5)
+        # 所有腿都到齐后key被释放
+        self.assertNotIn(('BTC/USDT', 1), arbiter._seen)
+
+    def test_memory_is_bounded_when_a_leg_is_down(self):
+        arbiter = FeedArbiter(legs=2, max_keys=100)
+        for u in range(1000):
+            arbiter.accept(('BTC/USDT', u), 'a', float(u))
+        self.assertEqual(len(arbiter._seen), 100)
+
+    def test_ticks_without_sequence_pass_through(self):
+        arbiter = FeedArbiter(legs=2)
+        # A→B→A的报价回跳是真实行情，不能按内容当成重复
+        ticks = [{'s': 'BTC/USDT', 'a': a, 'b': 1.0, 'E': 1} for a in (1.1, 1.2, 1.1)]
+        self.assertEqual([arbiter.accept(book_ticker_key(tick), 'a', 100.0) for tick in ticks], [True, True, True])
+        self.assertEqual(arbiter.unkeyed, 3)
+        self.assertEqual(arbiter.duplicates, 0)
+
+    def test_keys(self):
+        self.assertEqual(book_ticker_key({'s': 'BTC/USDT', 'a': 1, 'b': 2, 'u': 9}), ('BTC/USDT', 9))
+        new = {'e': 'executionReport', 'i': 1, 't': -1, 'x': 'NEW', 'X': 'NEW'}
+        trade = {'e': 'executionReport', 'i': 1, 't': 7, 'x': 'TRADE', 'X': 'PARTIALLY_FILLED'}
+        self.assertNotEqual(user_data_key(new), user_data_key(trade))
+        linear = {'e': 'ORDER_TRADE_UPDATE', 'o': {'i': 1, 't': 7, 'x': 'TRADE', 'X': 'FILLED'}}
+        self.assertEqual(user_data_key(linear), ('linear', 1, 7, 'TRADE', 'FILLED'))
+
+    def test_account_updates_in_the_same_millisecond_are_kept(self):
+        arbiter = FeedArbiter(legs=2)
+        first = {'e': 'ACCOUNT_UPDATE', 'E': 1000, 'T': 999, 'a': {'m': 'ORDER', 'B': [{'a': 'USDT', 'wb': '70'}], 'P': []}}
+        second = {'e': 'ACCOUNT_UPDATE', 'E': 1000, 'T': 999, 'a': {'m': 'ORDER', 'B': [{'a': 'USDT', 'wb': '65'}], 'P': []}}
+        self.assertTrue(arbiter.accept(user_data_key(first), 'linear-0', 1.0))
+        self.assertTrue(arbiter.accept(user_data_key(second), 'linear-0', 1.0))
+        # 另一条腿上的副本仍按内容去重
+        self.assertFalse(arbiter.accept(user_data_key(dict(second)), 'linear-1', 2.0))
+
+
+class LocalNats:
+    """In-process stand-in for one NATS server and the client connected to it."""
+    def __init__(self):
+        self.subscriptions = []
+        self.alive = True
+
+    async def subscribe(self, subject, cb):
+        self.subscriptions.append((subject, cb))
+
+    async def publish(self, subject, data):
+        if not self.alive:
+            return
+        for pattern, cb in self.subscriptions:
+            if pattern == subject or (pattern.endswith('.*') and subject.rsplit('.', 1)[0] == pattern[:-2]):
+                await cb(SimpleNamespace(subject=subject, data=msgpack.packb(data)))
+
+
+class LocalNatsManager(NatsManager):
+    connect_retry_wait = 0.01
+
+    def __init__(self, servers, failures=0):
+        super().__init__(list(servers))
+        self.servers = servers
+        self.failures = failures
+
+    async def _connect(self, url):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError(url)
+        return self.servers[url]
+
+
+class RedundantNatsTests(unittest.IsolatedAsyncioTestCase):
+    async def test_first_copy_is_used_and_dead_leg_is_ignored(self):
+        servers = {'nats://a': LocalNats(), 'nats://b': LocalNats()}
+        manager = LocalNatsManager(servers)
+        await manager.subscribe()
+        await asyncio.sleep(0)
+        subject = 'binance.spot.bookTicker.REDUNDANTUSDT'
+
+        tick = {'s': 'REDUNDANT/USDT', 'a': 1.1, 'b': 1.0, 'u': 1}
+        await servers['nats://b'].publish(subject, tick)
+        await servers['nats://a'].publish(subject, tick)
+        self.assertEqual(manager._queue.qsize(), 1)
+
+        servers['nats://a'].alive = False
+        await servers['nats://b'].publish(subject, dict(tick, a=1.2, u=2))
+        await manager._queue.join()
+        self.assertEqual(MarketDataStore.quote['REDUNDANT/USDT'].ask, 1.2)
+
+        report = manager.report()
+        self.assertEqual(report['nats://b']['wins'], 2)
+        self.assertEqual(report['nats://a']['wins'], 0)
+
+    async def test_leg_retries_and_resubscribes(self):
+        servers = {'nats://a': LocalNats()}
+        manager = LocalNatsManager(servers, failures=2)
+        await asyncio.wait_for(manager.subscribe(), 1)
+        self.assertEqual(len(servers['nats://a'].subscriptions), 2)
+        await manager.subscribe_depth(SimpleNamespace(on_message=lambda data: None))
+        self.assertEqual(len(servers['nats://a'].subscriptions), 4)
+
+
+class LocalUserDataServer:
+    """listenKey REST endpoint and user data websocket that broadcasts to every open connection."""
+    def __init__(self):
+        self.sockets = []
+        self.connections = 0
+        self.keys = 0
+        self.kept_alive = []
+        app = web.Application()
+        app.router.add_post('/listenKey', self.listen_key)
+        app.router.add_put('/listenKey', self.keep_alive)
+        app.router.add_get('/ws/{key}', self.stream)
+        self.runner = web.AppRunner(app)
+
+    async def start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f'http://127.0.0.1:{port}/listenKey', f'ws://127.0.0.1:{port}/ws/'
+
+    async def listen_key(self, request):
+        # 每次申请都发新key，模拟旧key过期后重连
+        self.keys += 1
+        return web.json_response({'listenKey': f'local-{self.keys}'})
+
+    async def keep_alive(self, request):
+        self.kept_alive.append(request.query['listenKey'])
+        return web.json_response({'listenKey': request.query['listenKey']})
+
+    async def stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.sockets.append(ws)
+        async for _ in ws:
+            pass
+        return ws
+
+    async def broadcast(self, event):
+        for ws in list(self.sockets):
+            if not ws.closed:
+                await ws.send_str(json.dumps(event))
+
+
+class RedundantUserDataTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = LocalUserDataServer()
+        base_url, stream_url = await self.server.start()
+        self.exchange = ExchangeManager({'exchange_id': 'binance', 'apiKey': '', 'user_data_legs': 2})
+        self.tasks = [
+            asyncio.create_task(user_data_stream(
+                'linear', '', self.exchange._queue, leg=f'linear-{leg}', keep_alive=False,
+                base_url=base_url, stream_url=stream_url, reconnect_wait=0.01,
+            ))
+            for leg in range(2)
+        ]
+        self.tasks.append(asyncio.create_task(self.exchange._process_queue()))
+        self.updates = []
+        self.exchange._dispatch = lambda res: self.updates.append(res['o']['t'])
+        await self._wait_for(lambda: self.server.connections == 2)
+
+    async def asyncTearDown(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.server.runner.cleanup()
+
+    async def _wait_for(self, condition, timeout=2):
+        async def wait():
+            while not condition():
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(wait(), timeout)
+
+    def event(self, trade_id):
+        return {'e': 'ORDER_TRADE_UPDATE', 'o': {'i': 1, 't': trade_id, 'x': 'TRADE', 'X': 'PARTIALLY_FILLED'}}
+
+    async def test_duplicates_dispatched_once_and_dropped_leg_reconnects(self):
+        await self.server.broadcast(self.event(1))
+        await self._wait_for(lambda: self.exchange.user_data_arbiter.duplicates == 1)
+        self.assertEqual(self.updates, [1])
+
+        await self.server.sockets[0].close()
+        await self.server.broadcast(self.event(2))
+        await self._wait_for(lambda: self.updates == [1, 2])
+
+        await self._wait_for(lambda: self.server.connections == 3)
+        await self.server.broadcast(self.event(3))
+        await self._wait_for(lambda: self.updates == [1, 2, 3])
+        await self._wait_for(lambda: self.exchange.user_data_arbiter.duplicates >= 2)
+        self.assertEqual(sum(self.exchange.user_data_arbiter.wins.values()), 3)
+
+
+class ListenKeyKeepAliveTests(unittest.IsolatedAsyncioTestCase):
+    async def test_new_listen_key_is_kept_alive_after_reconnect(self):
+        server = LocalUserDataServer()
+        base_url, stream_url = await server.start()
+        task = asyncio.create_task(user_data_stream(
+            'linear', '', asyncio.Queue(), base_url=base_url, stream_url=stream_url, reconnect_wait=0.01,
+        ))
+        try:
+            await asyncio.wait_for(self._until(lambda: server.kept_alive == ['local-1'] and server.connections == 1), 2)
+            await server.sockets[0].close()
+            await asyncio.wait_for(self._until(lambda: server.kept_alive == ['local-1', 'local-2']), 2)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await server.runner.cleanup()
+
+    async def _until(self, condition):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
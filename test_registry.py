@@ -0,0 +1,58 @@
+import unittest
+from entity import OrderResponse
+from registry import OrderRegistry, INTENT_OPEN, INTENT_CLOSE
+
+
+def order_event(client_order_id, status, filled=0, id=42):
+    return OrderResponse(
+        id=id, symbol='BTC/USDT:USDT', status=status, side='sell', amount=1, filled=filled,
+        last_filled=0, remaining=0, client_order_id=client_order_id, average=0, price=0,
+    )
+
+
+class OrderRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = OrderRegistry()
+
+    def test_client_order_ids_are_unique_and_compact(self):
+        ids = {self.registry.new_client_order_id(f'COIN{i % 300}/USDT:USDT', INTENT_OPEN) for i in range(5000)}
+        self.assertEqual(len(ids), 5000)
+        self.assertTrue(all(len(cid) <= 36 for cid in ids))
+
+    def test_parse_client_order_id(self):
+        cid = self.registry.new_client_order_id('ETH/USDT:USDT', INTENT_CLOSE)
+        self.assertEqual(self.registry.parse_client_order_id(cid), {'symbol': 'ETH/USDT:USDT', 'intent': INTENT_CLOSE})
+        self.assertIsNone(self.registry.parse_client_order_id('web_manual'))
+
+    def test_state_transitions_and_eviction(self):
+        cid = self.registry.new_client_order_id('BTC/USDT:USDT')
+        record = self.registry.on_update(order_event(cid, 'new'))
+        self.assertEqual(record.status, 'new')
+        self.assertIs(self.registry.get(order_id='42'), record)
+
+        self.registry.on_update(order_event(cid, 'partially_filled', filled=0.4))
+        # 迟到的new事件不能让状态回退
+        self.registry.on_update(order_event(cid, 'new', filled=0))
+        self.assertEqual(record.status, 'partially_filled')
+        self.assertEqual(record.filled, 0.4)
+
+        self.registry.on_update(order_event(cid, 'filled', filled=1))
+        self.assertTrue(record.is_final)
+        self.registry.release(record)
+        self.assertEqual(len(self.registry), 0)
+        self.assertIsNone(self.registry.get(order_id=42))
+        self.assertIsNone(self.registry.on_update(order_event(cid, 'filled', filled=1)))
+
+    def test_unknown_orders_are_not_routed(self):
+        self.assertIsNone(self.registry.on_update(order_event('web_manual', 'new')))
+
+    def test_memory_is_bounded(self):
+        registry = OrderRegistry(max_orders=100)
+        for _ in range(1000):
+            registry.new_client_order_id('BTC/USDT:USDT')
+        self.assertEqual(len(registry), 100)
+        self.assertEqual(registry.evicted, 900)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import gc
+import asyncio
+import unittest
+
+
+from runtime import GCMonitor, Runtime, RuntimeProfile
+
+
+class GCMonitorTests(unittest.TestCase):
+    def test_collections_are_timed_per_generation(self):
+        monitor = GCMonitor()
+        monitor.install()
+        try:
+            gc.collect(0)
+            gc.collect(2)
+        finally:
+            monitor.uninstall()
+        self.assertNotIn(monitor._callback, gc.callbacks)
+        report = monitor.report()
+        self.assertGreaterEqual(report['gen0']['count'], 1)
+        self.assertGreaterEqual(report['gen2']['count'], 1)
+        self.assertGreater(report['gen2']['max'], 0)
+
+
+class RuntimeTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.thresholds = gc.get_threshold()
+
+    def tearDown(self):
+        gc.unfreeze()
+        gc.set_threshold(*self.thresholds)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            Runtime('fastest')
+
+    def test_apply_and_restore(self):
+        runtime = Runtime('low-latency')
+        runtime.apply()
+        self.assertEqual(gc.get_threshold(), runtime.profile.gc_thresholds)
+        runtime.freeze()
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.assertEqual(runtime.report()['gc']['gen2']['count'], 0)
+        runtime.restore()
+        self.assertEqual(gc.get_threshold(), self.thresholds)
+
+    def test_default_profile_changes_nothing(self):
+        runtime = Runtime()
+        runtime.apply()
+        runtime.freeze()
+        runtime.restore()
+        self.assertEqual(gc.get_threshold(), self.thresholds)
+        self.assertEqual(gc.get_freeze_count(), 0)
+
+    async def test_idle_collect_only_when_quiet(self):
+        runtime = Runtime(RuntimeProfile(gc_thresholds=(10000, 10, 10), idle_collect=True, idle_interval=0.01))
+        runtime.apply()
+        quiet = [False]
+        task = asyncio.create_task(runtime.run_idle_collect(lambda: quiet[0]))
+        try:
+            garbage = [[] for _ in range(6000)]
+            await asyncio.sleep(0.05)
+            self.assertEqual(runtime.idle_collections, 0)
+            quiet[0] = True
+            await asyncio.sleep(0.05)
+            self.assertGreaterEqual(runtime.idle_collections, 1)
+        finally:
+            task.cancel()
+            runtime.restore()
+        del garbage
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+
+
+from scheduler import ExecutionScheduler, PRIORITY_CLOSE, PRIORITY_OPEN, IDLE, QUEUED, RUNNING
+
+
+class ExecutionSchedulerTests(unittest.IsolatedAsyncioTestCase):
+    def action(self, name, log, release=None, fail=False):
+        async def run():
+            log.append(name)
+            if release is not None:
+                await release.wait()
+            if fail:
+                raise ValueError(name)
+        return run
+
+    async def test_concurrency_cap_and_close_before_open(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue_age=10)
+        release = asyncio.Event()
+        log = []
+        scheduler.submit('A', PRIORITY_OPEN, self.action('open A', log, release))
+        scheduler.submit('B', PRIORITY_OPEN, self.action('open B', log))
+        scheduler.submit('C', PRIORITY_CLOSE, self.action('close C', log))
+        await asyncio.sleep(0)
+        self.assertEqual(log, ['open A'])
+        self.assertEqual((scheduler.state('A'), scheduler.state('B'), scheduler.state('C')), (RUNNING, QUEUED, QUEUED))
+        # 同一symbol执行中不接受新动作
+        self.assertFalse(scheduler.submit('A', PRIORITY_CLOSE, self.action('close A', log)))
+
+        release.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        self.assertEqual(log, ['open A', 'close C', 'open B'])
+        self.assertEqual(len(scheduler), 0)
+
+    async def test_stale_and_expired_actions_are_dropped(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue_age=0.05)
+        release = asyncio.Event()
+        log = []
+        signal = {'B': True}
+        scheduler.submit('A', PRIORITY_OPEN, self.action('A', log, release))
+        scheduler.submit('B', PRIORITY_OPEN, self.action('B', log), lambda: not signal['B'])
+        signal['B'] = False
+        scheduler.submit('C', PRIORITY_OPEN, self.action('C', log))
+        await asyncio.sleep(0.1)
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(log, ['A'])
+        self.assertEqual(scheduler.state('B'), IDLE)
+        self.assertEqual(scheduler.state('C'), IDLE)
+
+    async def test_newer_signal_replaces_queued_action(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue_age=10)
+        release = asyncio.Event()
+        log = []
+        scheduler.submit('A', PRIORITY_OPEN, self.action('A', log, release))
+        scheduler.submit('B', PRIORITY_OPEN, self.action('open B', log))
+        scheduler.submit('B', PRIORITY_CLOSE, self.action('close B', log))
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(log, ['A', 'close B'])
+
+    async def test_replacement_signal_is_not_expired_by_queue_time(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue_age=0.05)
+        release = asyncio.Event()
+        log = []
+        scheduler.submit('A', PRIORITY_OPEN, self.action('A', log, release))
+        scheduler.submit('B', PRIORITY_OPEN, self.action('old B', log))
+        await asyncio.sleep(0.08)
+        # B排队已超过max_queue_age，但新信号刚到
+        scheduler.submit('B', PRIORITY_OPEN, self.action('new B', log))
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(log, ['A', 'new B'])
+
+    async def test_failed_action_releases_symbol(self):
+        scheduler = ExecutionScheduler(max_concurrent=2)
+        log = []
+        scheduler.submit('A', PRIORITY_OPEN, self.action('A', log, fail=True))
+        await asyncio.sleep(0.01)
+        self.assertEqual(scheduler.state('A'), IDLE)
+        self.assertTrue(scheduler.submit('A', PRIORITY_OPEN, self.action('A again', log)))
+        await asyncio.sleep(0.01)
+        self.assertEqual(log, ['A', 'A again'])
+
+    async def test_close_cancels_running_and_queued(self):
+        scheduler = ExecutionScheduler(max_concurrent=1)
+        log = []
+        scheduler.submit('A', PRIORITY_OPEN, self.action('A', log, asyncio.Event()))
+        scheduler.submit('B', PRIORITY_OPEN, self.action('B', log))
+        await asyncio.sleep(0)
+        await scheduler.close()
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(scheduler.running, {})
+        self.assertEqual(log, ['A'])
+
+
+if __name__ == '__main__':
+    unittest.main()
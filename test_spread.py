@@ -0,0 +1,41 @@
+import unittest
+
+
+from spread import SpreadGraph
+
+
+class SpreadGraphTests(unittest.TestCase):
+    def test_default_pair_registered_on_first_quote(self):
+        graph = SpreadGraph()
+        dependents = graph.dependents('BTC/USDT:USDT')
+        self.assertEqual([spread.name for spread in dependents], ['BTC/USDT'])
+        self.assertEqual((dependents[0].near, dependents[0].far), ('BTC/USDT', 'BTC/USDT:USDT'))
+        self.assertIs(graph.dependents('BTC/USDT')[0], dependents[0])
+        self.assertEqual(len(graph), 1)
+
+    def test_default_pair_follows_quote_asset(self):
+        graph = SpreadGraph()
+        spread = graph.dependents('ETH/USDC')[0]
+        self.assertEqual(spread.far, 'ETH/USDC:USDC')
+
+    def test_explicit_spreads_share_an_instrument(self):
+        graph = SpreadGraph(auto_pair=False)
+        graph.add('BTC-USDC/USDT', near='BTC/USDT', far='BTC/USDC')
+        graph.add('BTC/USDT-PERP', near='BTC/USDT', far='BTC/USDT:USDT')
+        self.assertEqual([spread.name for spread in graph.dependents('BTC/USDT')], ['BTC-USDC/USDT', 'BTC/USDT-PERP'])
+        self.assertEqual([spread.name for spread in graph.dependents('BTC/USDC')], ['BTC-USDC/USDT'])
+        self.assertEqual(graph.dependents('ETH/USDT'), ())
+
+        graph.remove('BTC-USDC/USDT')
+        self.assertEqual([spread.name for spread in graph.dependents('BTC/USDT')], ['BTC/USDT-PERP'])
+        self.assertEqual(graph.dependents('BTC/USDC'), [])
+
+    def test_explicit_spread_is_not_replaced_by_default_pair(self):
+        graph = SpreadGraph()
+        graph.add('SOL/USDT', near='SOL/USDT', far='SOL/USDC')
+        self.assertEqual([spread.far for spread in graph.dependents('SOL/USDT')], ['SOL/USDC'])
+        self.assertEqual(len(graph), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
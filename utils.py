@@ -44,29 +44,64 @@ async def keep_alive_listen_key(base_url: str, api_key: str, listen_key: str, ty
             logger.error(f"Error keeping alive {typ} listen key: {e}")
             
                   
-async def user_data_stream(typ: Literal['spot', 'linear', 'inverse'], api_key:str, queue: asyncio.Queue):
+async def user_data_stream(
+    typ: Literal['spot', 'linear', 'inverse'],
+    api_key:str,
+    queue: asyncio.Queue,
+    leg: str = None,
+    keep_alive: bool = True,
+    base_url: str = None,
+    stream_url: str = None,
+    reconnect_wait: float = 0.1,
+):
+    """
+    Put `(event, leg, recv_ts)` on `queue` for every user data event. The websocket is reopened
+    with a fresh listen key whenever it drops, waiting `reconnect_wait` seconds, doubled on each
+    consecutive failure up to 5 seconds. With `keep_alive` the current listen key is renewed, a
+    new key obtained on reconnect replaces the old keep-alive task.
+    """
     if typ == 'spot':
-        base_url = 'https://api.binance.com/api/v3/userDataStream'
-        stream_url = 'wss://stream.binance.com:9443/ws/'
+        default_base_url = 'https://api.binance.com/api/v3/userDataStream'
+        default_stream_url = 'wss://stream.binance.com:9443/ws/'
     elif typ == 'linear':
-        base_url = 'https://fapi.binance.com/fapi/v1/listenKey'
-        stream_url = 'wss://fstream.binance.com/ws/'
+        default_base_url = 'https://fapi.binance.com/fapi/v1/listenKey'
+        default_stream_url = 'wss://fstream.binance.com/ws/'
     elif typ == 'inverse':
-        base_url = 'https://dapi.binance.com/dapi/v1/listenKey'
-        stream_url = 'wss://dstream.binance.com/ws/'
+        default_base_url = 'https://dapi.binance.com/dapi/v1/listenKey'
+        default_stream_url = 'wss://dstream.binance.com/ws/'
+    base_url = base_url or default_base_url
+    stream_url = stream_url or default_stream_url
+    leg = leg or typ
     
-    listen_key = await get_listen_key(base_url, api_key)
-    ws_url = f'{stream_url}{listen_key}'
-    
-    
-    asyncio.create_task(keep_alive_listen_key(base_url, api_key, listen_key, typ))
-    # asyncio.create_task(keep_binance_listenkey_alive(api_key, listen_key))
-    
-    async with websockets.connect(ws_url) as ws:
+    keep_alive_task = None
+    kept_key = None
+    wait = reconnect_wait
+    try:
         while True:
-            message = await ws.recv()
-            res = json.loads(message)
-            await queue.put(res)
+            try:
+                listen_key = await get_listen_key(base_url, api_key)
+                # 重连可能拿到新的listen key，续期任务跟着换成新key
+                if keep_alive and listen_key != kept_key:
+                    if keep_alive_task is not None:
+                        keep_alive_task.cancel()
+                    keep_alive_task = asyncio.create_task(keep_alive_listen_key(base_url, api_key, listen_key, typ))
+                    kept_key = listen_key
+
+                async with websockets.connect(f'{stream_url}{listen_key}') as ws:
+                    logger.info(f'User data stream {leg} connected')
+                    wait = reconnect_wait
+                    async for message in ws:
+                        await queue.put((json.loads(message), leg, time.time() * 1000))
+                logger.error(f'User data stream {leg} closed')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'User data stream {leg} disconnected: {e}')
+            await asyncio.sleep(wait)
+            wait = min(wait * 2, 5)
+    finally:
+        if keep_alive_task is not None:
+            keep_alive_task.cancel()
 
 
 def parse_order_status(status: str):